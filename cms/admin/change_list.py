@@ -3,6 +3,7 @@ import bisect
 from cms.models import Title, Page, EmptyTitle
 from cms.utils import get_language_list
 from cms.utils.compat import DJANGO_1_5
+from cms.utils.compat.urls import unquote
 from cms.utils.conf import get_cms_setting
 from cms.utils.permissions import get_user_sites_queryset
 from django.contrib.admin.views.main import ChangeList, ALL_VAR, IS_POPUP_VAR, \
@@ -36,6 +37,137 @@ def cache_tree_children(queryset):
             parent._cached_children.append(obj)
 
 
+def cache_tree_permissions(request, pages, site):
+    """
+    Caches the permissions of the user on the given draft pages of the given
+    site, as used by the page tree, with a fixed number of queries.
+    """
+    if not get_cms_setting('PERMISSION'):
+        return
+    perm_edit_ids = Page.permissions.get_change_id_list(request.user, site)
+    perm_publish_ids = Page.permissions.get_publish_id_list(request.user, site)
+    perm_advanced_settings_ids = Page.permissions.get_advanced_settings_id_list(request.user, site)
+    restricted_ids = Page.permissions.get_restricted_id_list(site)
+    for page in pages:
+        page.permission_edit_cache = perm_edit_ids == Page.permissions.GRANT_ALL or page.pk in perm_edit_ids
+        page.permission_change_cache = page.permission_edit_cache
+        page.permission_publish_cache = perm_publish_ids == Page.permissions.GRANT_ALL or page.pk in perm_publish_ids
+        page.permission_advanced_settings_cache = perm_advanced_settings_ids == Page.permissions.GRANT_ALL or page.pk in perm_advanced_settings_ids
+        page.permission_user_cache = request.user
+        page.permission_restricted = page.pk in restricted_ids
+
+
+def cache_tree_titles(pages, site):
+    """
+    Fills the title caches of the given draft pages of the given site and of
+    their public pages (which must have been selected with them) with one
+    query. Languages without a title get an EmptyTitle on the draft pages.
+    """
+    ids = {}
+    for page in pages:
+        ids[page.pk] = page
+        page.title_cache = {}
+        page.all_languages = []
+        if page.publisher_public_id:
+            page.publisher_public.title_cache = {}
+            page.publisher_public.all_languages = []
+            ids[page.publisher_public_id] = page.publisher_public
+
+    titles = Title.objects.filter(page__in=ids)
+    insort = bisect.insort # local copy to avoid globals lookup in the loop
+    for title in titles:
+        page = ids[title.page_id]
+        page.title_cache[title.language] = title
+        if not title.language in page.all_languages:
+            insort(page.all_languages, title.language)
+    languages = get_language_list(site)
+    for page in pages:
+        for lang in languages:
+            if not lang in page.title_cache:
+                page.title_cache[lang] = EmptyTitle(lang)
+
+
+def get_open_nodes(request):
+    """
+    Returns the ids of the pages whose node the user opened in the page tree,
+    which jstree remembers in the djangocms_nodes_open cookie.
+    """
+    djangocms_nodes_open = request.COOKIES.get('djangocms_nodes_open', '')
+    raw_nodes = unquote(djangocms_nodes_open).split(',')
+    try:
+        return [int(c.split('page_', 1)[1]) for c in raw_nodes]
+    except (IndexError, ValueError):
+        return []
+
+
+def _get_tree_pages(request, site):
+    # like in the changelist, only the pages the user may change are part of
+    # the tree
+    pages = Page.objects.drafts().filter(site=site)
+    perm_edit_ids = Page.permissions.GRANT_ALL
+    if get_cms_setting('PERMISSION'):
+        perm_edit_ids = Page.permissions.get_change_id_list(request.user, site)
+        if perm_edit_ids != Page.permissions.GRANT_ALL:
+            pages = pages.filter(pk__in=perm_edit_ids)
+    return pages, perm_edit_ids
+
+
+def _cache_tree_nodes(request, site, pages, nodes):
+    if nodes:
+        parent_ids = set(pages.filter(parent__in=[page.pk for page in nodes]).values_list('parent_id', flat=True))
+    else:
+        parent_ids = set()
+    for page in nodes:
+        page.has_children = page.pk in parent_ids
+    cache_tree_permissions(request, nodes, site)
+    cache_tree_titles(nodes, site)
+
+
+def get_tree_level(request, site, node=None, offset=0, limit=None):
+    """
+    Returns one level of the page tree of the given site, the root pages or
+    the children of the page with the given id, and the number of pages on
+    that level, starting at offset and at most limit of them.
+
+    Like in the changelist, only the pages the user may change are part of
+    the tree, and a page is a root page if the user may not change its
+    parent. The pages come with their titles, the permissions of the user
+    and has_children set, all looked up with a fixed number of queries.
+    """
+    pages, perm_edit_ids = _get_tree_pages(request, site)
+    if node is not None:
+        level = pages.filter(parent=node)
+    elif perm_edit_ids == Page.permissions.GRANT_ALL:
+        level = pages.filter(parent__isnull=True)
+    else:
+        level = pages.exclude(parent__in=perm_edit_ids)
+    count = level.count()
+    level = level.order_by('tree_id', 'lft').select_related('publisher_public')
+    if limit is None:
+        level = list(level[offset:])
+    else:
+        level = list(level[offset:offset + limit])
+    _cache_tree_nodes(request, site, pages, level)
+    return level, count
+
+
+def get_tree_children(request, site, nodes):
+    """
+    Returns the children of the pages with the given ids, as lists by the id
+    of their parent, prepared like get_tree_level prepares a level. They are
+    looked up with a fixed number of queries however many nodes are given.
+    """
+    if not nodes:
+        return {}
+    pages = _get_tree_pages(request, site)[0]
+    children = list(pages.filter(parent__in=nodes).order_by('tree_id', 'lft').select_related('publisher_public'))
+    _cache_tree_nodes(request, site, pages, children)
+    by_parent = {}
+    for page in children:
+        by_parent.setdefault(page.parent_id, []).append(page)
+    return by_parent
+
+
 class CMSChangeList(ChangeList):
     """
     Renders a Changelist - In our case it looks like a tree - it's the list of
@@ -102,97 +234,36 @@ class CMSChangeList(ChangeList):
                 self.full_result_count = self.root_query_set.count()
 
     def set_items(self, request):
+        """
+        Fetches the pages the tree shows: the root pages and the children of
+        the nodes the user opened, whose children are loaded from the tree
+        view once they are opened. If the changelist is filtered, a flat
+        list of the matching pages.
+        """
         site = self.current_site()
-        # Get all the pages, ordered by tree ID (it's convenient to build the
-        # tree using a stack now)
-        pages = self.get_query_set(request).drafts().order_by('tree_id',  'lft').select_related('publisher_public')
-
-        # Get lists of page IDs for which the current user has
-        # "permission to..." on the current site.
-        if get_cms_setting('PERMISSION'):
-            perm_edit_ids = Page.permissions.get_change_id_list(request.user, site)
-            perm_publish_ids = Page.permissions.get_publish_id_list(request.user, site)
-            perm_advanced_settings_ids = Page.permissions.get_advanced_settings_id_list(request.user, site)
-            restricted_ids = Page.permissions.get_restricted_id_list(site)
-            if perm_edit_ids and perm_edit_ids != Page.permissions.GRANT_ALL:
-                pages = pages.filter(pk__in=perm_edit_ids)
-
-        root_pages = []
-        pages = list(pages)
-        all_pages = pages[:] # That is, basically, a copy.
-
-        # Unfortunately we cannot use the MPTT builtin code for pre-caching
-        # the children here, because MPTT expects the tree to be 'complete'
-        # and otherwise complaints about 'invalid item order'
-        cache_tree_children(pages)
-        ids = dict((page.id, page) for page in pages)
-
-        for page in pages:
-
-            children = list(page.get_children())
-
-            # If the parent page is not among the nodes shown, this node should
-            # be a "root node". The filtering for this has already been made, so
-            # using the ids dictionary means this check is constant time
-            page.root_node = page.parent_id not in ids
-
-            if get_cms_setting('PERMISSION'):
-                # caching the permissions
-                page.permission_edit_cache = perm_edit_ids == Page.permissions.GRANT_ALL or page.pk in perm_edit_ids
-                page.permission_publish_cache = perm_publish_ids == Page.permissions.GRANT_ALL or page.pk in perm_publish_ids
-                page.permission_advanced_settings_cache = perm_advanced_settings_ids == Page.permissions.GRANT_ALL or page.pk in perm_advanced_settings_ids
-                page.permission_user_cache = request.user
-                page.permission_restricted = page.pk in restricted_ids
-            if page.root_node or self.is_filtered():
-                page.last = True
-                if len(children):
-                    # TODO: WTF!?!
-                    # The last one is not the last... wait, what?
-                    # children should NOT be a queryset. If it is, check that
-                    # your django-mptt version is 0.5.1
-                    children[-1].last = False
-                page.menu_level = 0
-                root_pages.append(page)
-                if page.parent_id:
-                    page.get_cached_ancestors(ascending=True)
-                else:
-                    page.ancestors_ascending = []
-
-            # Because 'children' is the reverse-FK accessor for the 'parent'
-            # FK from Page->Page, we have to use wrong English here and set
-            # an attribute called 'childrens'. We are aware that this is WRONG
-            # but what should we do?
-
-            # If the queryset is filtered, do NOT set the 'childrens' attribute
-            # since *ALL* pages will be in the 'root_pages' list and therefore
-            # be displayed. (If the queryset is filtered, the result is not a
-            # tree but rather a flat list).
-            if self.is_filtered():
+        if self.is_filtered():
+            root_pages = list(self.get_query_set(request).order_by('tree_id', 'lft').select_related('publisher_public'))
+            for page in root_pages:
+                page.has_children = False
                 page.childrens = []
-            else:
-                page.childrens = children
-
-        for page in all_pages:
-            page.title_cache = {}
-            page.all_languages = []
-            if page.publisher_public_id:
-                page.publisher_public.title_cache = {}
-                page.publisher_public.all_languages = []
-                ids[page.publisher_public_id] = page.publisher_public
-
-        titles = Title.objects.filter(page__in=ids)
-        insort = bisect.insort # local copy to avoid globals lookup in the loop
-        for title in titles:
-            page = ids[title.page_id]
-            page.title_cache[title.language] = title
-            if not title.language in page.all_languages:
-                insort(page.all_languages, title.language)
-        site_id = self.current_site()
-        languages = get_language_list(site_id)
-        for page in all_pages:
-            for lang in languages:
-                if not lang in page.title_cache:
-                    page.title_cache[lang] = EmptyTitle(lang)
+                page.last = True
+            cache_tree_permissions(request, root_pages, site)
+            cache_tree_titles(root_pages, site)
+            self.root_pages = root_pages
+            return
+
+        root_pages = get_tree_level(request, site)[0]
+        # Because 'children' is the reverse-FK accessor for the 'parent'
+        # FK from Page->Page, we have to use wrong English here and set
+        # an attribute called 'childrens'.
+        children = get_tree_children(request, site, get_open_nodes(request))
+        for page in root_pages:
+            page.last = True
+        pages = root_pages[:]
+        while pages:
+            page = pages.pop()
+            page.childrens = children.get(page.pk, [])
+            pages.extend(page.childrens)
         self.root_pages = root_pages
 
     def get_items(self):
@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 from functools import wraps
+import json
 import sys
 from cms.admin.placeholderadmin import PlaceholderAdminMixin
 from cms.plugin_pool import plugin_pool
@@ -28,7 +29,7 @@ from cms.utils.conf import get_cms_setting
 from cms.utils.compat.dj import force_unicode
 from cms.utils.compat.urls import unquote
 from cms.utils.helpers import find_placeholder_relation
-from cms.admin.change_list import CMSChangeList
+from cms.admin.change_list import CMSChangeList, get_open_nodes, get_tree_level
 from cms.admin.dialog.views import get_copy_dialog
 from cms.admin.forms import (PageForm, AdvancedSettingsForm, PagePermissionForm,
                              PublicationDatesForm)
@@ -37,9 +38,10 @@ from cms.admin.views import revert_plugins
 from cms.models import Page, Title, CMSPlugin, PagePermission, EmptyTitle, GlobalPagePermission, \
     titlemodels, StaticPlaceholder
 from cms.models.managers import PagePermissionsPermissionManager
-from cms.utils import helpers, moderator, permissions, get_language_from_request, admin as admin_utils, copy_plugins
+from cms.utils import helpers, moderator, permissions, get_language_from_request, admin as admin_utils, copy_plugins, \
+    copy_pages
 from cms.utils.i18n import get_language_list, get_language_tuple, get_language_object, force_language
-from cms.utils.admin import jsonify_request
+from cms.utils.admin import jsonify_request, get_page_publish_state
 
 from cms.utils.permissions import has_global_page_permission, has_generic_permission
 from cms.utils.plugins import current_site
@@ -116,9 +118,11 @@ class PageAdmin(PlaceholderAdminMixin, ModelAdmin):
             pat(r'^([0-9]+)/delete-translation/$', self.delete_translation),
             pat(r'^([0-9]+)/move-page/$', self.move_page),
             pat(r'^([0-9]+)/copy-page/$', self.copy_page),
+            pat(r'^copy-page-status/([0-9a-f]+)/$', self.copy_page_status),
             pat(r'^([0-9]+)/copy-language/$', self.copy_language),
             pat(r'^([0-9]+)/dialog/copy/$', get_copy_dialog),  # copy dialog
             pat(r'^([0-9]+)/descendants/$', self.descendants),  # menu html for page descendants
+            pat(r'^tree/$', self.tree),  # json for one level of the page tree
             pat(r'^([0-9]+)/change-navigation/$', self.change_innavigation),
             pat(r'^([0-9]+)/jsi18n/$', self.redirect_jsi18n),
             pat(r'^([0-9]+)/permissions/$', self.get_permissions),
@@ -620,14 +624,8 @@ class PageAdmin(PlaceholderAdminMixin, ModelAdmin):
         # languages
         languages = get_language_list(site_id)
 
-        # parse the cookie that saves which page trees have
-        # been opened already and extracts the page ID
-        djangocms_nodes_open = request.COOKIES.get('djangocms_nodes_open', '')
-        raw_nodes = unquote(djangocms_nodes_open).split(',')
-        try:
-            open_menu_trees = [int(c.split('page_', 1)[1]) for c in raw_nodes]
-        except IndexError:
-            open_menu_trees = []
+        # the pages whose node has been opened already
+        open_menu_trees = get_open_nodes(request)
         context = {
             'title': cl.title,
             'is_popup': cl.is_popup,
@@ -903,6 +901,12 @@ class PageAdmin(PlaceholderAdminMixin, ModelAdmin):
                     kwargs = {
                         'copy_permissions': request.REQUEST.get('copy_permissions', False),
                     }
+                    threshold = get_cms_setting('PAGE_COPY_BACKGROUND_THRESHOLD')
+                    if threshold is not None and page.get_descendant_count() + 1 > threshold:
+                        # too many pages to copy them while the browser waits
+                        job_id = copy_pages.start_copy_job(page, target, site, position, user=request.user, **kwargs)
+                        status_url = reverse('admin:cms_page_copy_page_status', args=(job_id,))
+                        return jsonify_request(HttpResponse(status_url, status=202))
                     page.copy_page(target, site, position, **kwargs)
                     return jsonify_request(HttpResponse("ok"))
                 except ValidationError:
@@ -911,6 +915,16 @@ class PageAdmin(PlaceholderAdminMixin, ModelAdmin):
         context.update(extra_context or {})
         return HttpResponseRedirect('../../')
 
+    def copy_page_status(self, request, job_id):
+        """
+        Reports the progress of a page copy running in the background, see
+        cms.utils.copy_pages.get_copy_job.
+        """
+        state = copy_pages.get_copy_job(job_id)
+        if state is None:
+            raise Http404("No page copy found.")
+        return HttpResponse(json.dumps(state), content_type="application/json")
+
     @transaction.commit_on_success
     @create_revision()
     def publish_page(self, request, page_id, language):
@@ -1174,9 +1188,54 @@ class PageAdmin(PlaceholderAdminMixin, ModelAdmin):
         which is called by admin_utils.render_admin_menu_item.
         """
         page = get_object_or_404(Page, pk=page_id)
+        page.childrens, count = get_tree_level(request, page.site, node=page.pk)
         return admin_utils.render_admin_menu_item(request, page,
                                                   template="admin/cms/page/tree/lazy_menu.html")
 
+    def tree(self, request):
+        """
+        Get json for one level of the page tree: the root pages of the
+        current site or, with ?node=<page id>, the children of a page. The
+        level is paged through with ?offset= and ?limit= (list_per_page pages
+        by default), count is the number of pages on the level.
+
+        Each node comes with the titles and publish states of the page in
+        all languages and the permissions of the user on it, so the tree
+        can be loaded one opened node at a time. With ?html=1 it also comes
+        with its html, which the page tree inserts when a node is opened.
+        """
+        if not self.has_change_permission(request, None):
+            return HttpResponseForbidden(force_unicode(_("You do not have permission to change pages.")))
+        try:
+            node = int(request.GET['node']) if request.GET.get('node') else None
+            offset = max(int(request.GET.get('offset', 0)), 0)
+            limit = min(max(int(request.GET.get('limit', self.list_per_page)), 1), self.list_max_show_all)
+        except ValueError:
+            return HttpResponseBadRequest("invalid parameters")
+        site = current_site(request)
+        pages, count = get_tree_level(request, site, node, offset, limit)
+        languages = get_language_list(site.pk)
+        nodes = []
+        for page in pages:
+            nodes.append({
+                'id': page.pk,
+                'parent_id': page.parent_id,
+                'level': page.level,
+                'has_children': page.has_children,
+                'in_navigation': page.in_navigation,
+                'languages': page.all_languages,
+                'titles': dict((language, page.title_cache[language].title) for language in page.all_languages),
+                'publish_states': dict((language, get_page_publish_state(page, language)) for language in languages),
+                'can_change': page.has_change_permission(request),
+                'can_publish': page.has_publish_permission(request),
+                'can_change_advanced_settings': page.has_advanced_settings_permission(request),
+                'restricted': getattr(page, 'permission_restricted', False),
+            })
+            if request.GET.get('html'):
+                nodes[-1]['html'] = admin_utils.render_admin_tree_node(request, page, languages)
+        data = {'nodes': nodes, 'count': count, 'offset': offset, 'limit': limit}
+        return HttpResponse(json.dumps(data), content_type="application/json")
+
     def resolve(self, request):
         if not request.user.is_staff:
             return HttpResponse('/')
@@ -3,6 +3,7 @@ from cms.models.placeholderpluginmodel import PlaceholderReference
 from django.contrib.admin.helpers import AdminForm
 from django.utils.decorators import method_decorator
 from django.db import transaction
+from django.db.models import Q
 import json
 
 from django.views.decorators.clickjacking import xframe_options_sameorigin
@@ -13,7 +14,7 @@ from cms.models.pluginmodel import CMSPlugin
 from cms.plugin_pool import plugin_pool
 from cms.utils import get_cms_setting
 from cms.utils.compat.dj import force_unicode
-from cms.utils.plugins import requires_reload, has_reached_plugin_limit
+from cms.utils.plugins import requires_reload, has_reached_plugin_limit, update_plugin_positions
 from django.contrib.admin import ModelAdmin
 from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseForbidden
 from django.shortcuts import render_to_response, get_object_or_404
@@ -21,6 +22,7 @@ from django.template import RequestContext
 from django.template.defaultfilters import force_escape, escapejs
 from django.utils.translation import ugettext as _
 from django.conf import settings
+from django.utils import timezone
 from django.views.decorators.http import require_POST
 import warnings
 from django.template.response import TemplateResponse
@@ -412,6 +414,8 @@ class PlaceholderAdminMixin(object):
         -plugin_parent (optional)
         -plugin_order (array, optional)
         """
+        from cms.signals.plugins import mark_placeholder_changed
+
         plugin = CMSPlugin.objects.get(pk=int(request.POST['plugin_id']))
         placeholder = Placeholder.objects.get(pk=request.POST['placeholder_id'])
         parent_id = request.POST.get('plugin_parent', None)
@@ -424,45 +428,56 @@ class PlaceholderAdminMixin(object):
         order = request.POST.getlist("plugin_order[]")
         if not self.has_move_plugin_permission(request, plugin, placeholder):
             return HttpResponseForbidden(force_unicode(_("You have no permission to move this plugin")))
-        if plugin.parent_id != parent_id:
-            if parent_id:
-                parent = CMSPlugin.objects.get(pk=parent_id)
-                if parent.placeholder_id != placeholder.pk:
-                    return HttpResponseBadRequest(force_unicode('parent must be in the same placeholder'))
-                if parent.language != language:
-                    return HttpResponseBadRequest(force_unicode('parent must be in the same language as plugin_language'))
-            else:
-                parent = None
-            plugin.move_to(parent, position='last-child')
+        parent = None
+        if plugin.parent_id != parent_id and parent_id:
+            parent = CMSPlugin.objects.get(pk=parent_id)
+            if parent.placeholder_id != placeholder.pk:
+                return HttpResponseBadRequest(force_unicode('parent must be in the same placeholder'))
+            if parent.language != language:
+                return HttpResponseBadRequest(force_unicode('parent must be in the same language as plugin_language'))
         try:
             template = self.get_placeholder_template(request, placeholder)
             has_reached_plugin_limit(placeholder, plugin.plugin_type, plugin.language, template=template)
         except PluginLimitReached as er:
             return HttpResponseBadRequest(er)
-        plugin.save()
-        for child in plugin.get_descendants(include_self=True):
-            child.placeholder = placeholder
-            child.language = language
-            child.save()
-        plugins = CMSPlugin.objects.filter(parent=parent_id, placeholder=placeholder, language=language).order_by('position')
-        x = 0
-        for level_plugin in plugins:
-            if order:
-                x = 0
-                found = False
-                for pk in order:
-                    if level_plugin.pk == int(pk):
-                        level_plugin.position = x
-                        level_plugin.save()
-                        found = True
-                        break
-                    x += 1
-                if not found:
-                    return HttpResponseBadRequest('order parameter did not have all plugins of the same level in it')
-            else:
-                level_plugin.position = x
-                level_plugin.save()
-                x += 1
+        # the plugins on the level the plugin is moved to, itself included
+        level_plugin_ids = list(CMSPlugin.objects.filter(
+            parent=parent_id, placeholder=placeholder, language=language
+        ).exclude(pk=plugin.pk).order_by('position').values_list('pk', flat=True))
+        level_plugin_ids.append(plugin.pk)
+        if order:
+            order = [int(pk) for pk in order]
+            if not set(level_plugin_ids).issubset(order):
+                return HttpResponseBadRequest('order parameter did not have all plugins of the same level in it')
+            positions = dict((pk, order.index(pk)) for pk in level_plugin_ids)
+        else:
+            positions = dict((pk, position) for position, pk in enumerate(level_plugin_ids))
+
+        # move the plugin and its descendants and reorder the level with a
+        # fixed number of queries, without saving (and signalling) every plugin.
+        # The plugins whose rendering changes, the moved ones, the reordered
+        # level and the ancestors on both ends of the move, get a new
+        # changed_date.
+        now = timezone.now()
+        old_ancestor_ids = []
+        if plugin.parent_id != parent_id:
+            if plugin.parent_id:
+                old_ancestor_ids = list(plugin.get_ancestors().values_list('pk', flat=True))
+            plugin.move_to(parent, position='last-child')
+        plugin.get_descendants(include_self=True).update(
+            placeholder=placeholder, language=language, changed_date=now)
+        update_plugin_positions(positions, changed_date=now)
+        ancestors = Q(pk__in=old_ancestor_ids)
+        if parent_id:
+            ancestors |= Q(tree_id=plugin.tree_id, lft__lt=plugin.lft, rght__gt=plugin.rght)
+        if parent_id or old_ancestor_ids:
+            CMSPlugin.objects.filter(ancestors).update(changed_date=now)
+        mark_placeholder_changed(source_placeholder, plugin.language)
+        if source_placeholder.pk != placeholder.pk or plugin.language != language:
+            mark_placeholder_changed(placeholder, language)
+        plugin.placeholder = placeholder
+        plugin.language = language
+        plugin.position = positions[plugin.pk]
         self.post_move_plugin(request, source_placeholder, placeholder, plugin)
         json_response = {'reload': requires_reload(PLUGIN_MOVE_ACTION, [plugin])}
         return HttpResponse(json.dumps(json_response), content_type='application/json')
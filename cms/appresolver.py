@@ -1,6 +1,9 @@
 # -*- coding: utf-8 -*-
 from __future__ import with_statement
+from copy import copy
+from operator import itemgetter
 import sys
+import threading
 from cms.apphook_pool import apphook_pool
 from cms.utils.compat.type_checks import string_types
 from cms.utils.i18n import force_language, get_language_list
@@ -11,18 +14,169 @@ from django.conf.urls import patterns
 from django.contrib.sites.models import Site
 from django.core.exceptions import ImproperlyConfigured
 from django.core.urlresolvers import RegexURLResolver, Resolver404, reverse, \
-    RegexURLPattern
+    RegexURLPattern, clear_url_caches
 from django.utils.importlib import import_module
 from django.utils.translation import get_language
 
 APP_RESOLVERS = []
 
+# language -> path prefix -> (position in APP_RESOLVERS, resolver) of the
+# resolvers hooked under that prefix
+APP_RESOLVER_INDEX = {}
+
+# page id -> (path index generation, public page), local to this process
+_app_pages = {}
+
+# the generation of the apphook url patterns this process built them against
+_app_urls_generation = None
+_app_urls_lock = threading.Lock()
+
 
 def clear_app_resolvers():
-    global APP_RESOLVERS
+    global APP_RESOLVERS, APP_RESOLVER_INDEX
     APP_RESOLVERS = []
+    APP_RESOLVER_INDEX = {}
+    _app_pages.clear()
 
 
+def reload_app_patterns():
+    """
+    Rebuilds the app patterns of all url configurations of this process which
+    include them, so changed apphooks are picked up without restarting the
+    process. The patterns are built once, before any url configuration or the
+    resolver index is changed, so other threads keep resolving against the
+    old patterns until they are swapped.
+    """
+    global APP_RESOLVERS, APP_RESOLVER_INDEX, _app_urls_generation
+    old = set(id(resolver) for resolver in APP_RESOLVERS)
+    urlconfs = []
+    resolvers = []
+    for name, module in list(sys.modules.items()):
+        # not getattr, lazy modules may import on attribute access
+        urlpatterns = getattr(module, '__dict__', {}).get('urlpatterns')
+        if not isinstance(urlpatterns, list):
+            continue
+        resolvers.extend(pattern for pattern in urlpatterns
+                         if isinstance(pattern, RegexURLResolver) and id(pattern) not in old)
+        positions = [position for position, pattern in enumerate(urlpatterns) if id(pattern) in old]
+        if positions:
+            urlconfs.append((module, positions[0]))
+        elif name == 'cms.urls' and apphook_pool.get_apphooks():
+            # no page had an apphook when it was loaded
+            urlconfs.append((module, 0))
+    generation, app_patterns = build_app_patterns()
+    index = build_app_resolver_index(app_patterns)
+    new_urlpatterns = []
+    for module, position in urlconfs:
+        urlpatterns = [pattern for pattern in module.urlpatterns if id(pattern) not in old]
+        new_urlpatterns.append((module, urlpatterns[:position] + app_patterns + urlpatterns[position:]))
+    for module, urlpatterns in new_urlpatterns:
+        module.urlpatterns = urlpatterns
+    APP_RESOLVERS, APP_RESOLVER_INDEX = app_patterns, index
+    _app_urls_generation = generation
+    _app_pages.clear()
+    _clear_resolver_caches(resolvers)
+    clear_url_caches()
+
+
+def _clear_resolver_caches(resolvers, seen=None):
+    """
+    Drops the reverse lookups the given resolvers and the resolvers they
+    include cached per language, so the ones including the rebuilt url
+    configurations don't keep reversing to the old app patterns.
+    """
+    if seen is None:
+        seen = set()
+    for resolver in resolvers:
+        if id(resolver) in seen:
+            continue
+        seen.add(id(resolver))
+        resolver._reverse_dict = {}
+        resolver._namespace_dict = {}
+        resolver._app_dict = {}
+        if hasattr(resolver, '_populated'):
+            resolver._populated = False
+        _clear_resolver_caches([pattern for pattern in resolver.url_patterns
+                                if isinstance(pattern, RegexURLResolver)], seen)
+
+
+def check_app_urls(**kwargs):
+    """
+    Rebuilds the app patterns if apphooks changed in any process since they
+    were built. Connected to request_started, so every process picks the
+    change up with one of its next requests, without reading the cache on
+    every request.
+    """
+    from cms.cache.page import get_app_urls_generation
+    global _app_urls_generation
+
+    if _app_urls_generation is None:
+        # the patterns haven't been built yet
+        return
+    generation = get_app_urls_generation(_app_urls_generation)
+    if generation is None or generation == _app_urls_generation:
+        return
+    with _app_urls_lock:
+        if generation != _app_urls_generation:
+            # reload_app_patterns records the generation it builds against
+            _app_urls_generation = generation
+            reload_app_patterns()
+
+
+def build_app_resolver_index(resolvers):
+    """
+    Maps the path prefix every resolver is hooked under to the resolvers, per
+    language, keeping the order of the resolvers.
+    """
+    index = {}
+    for position, resolver in enumerate(resolvers):
+        for lang, prefix in resolver.url_prefixes_dict.items():
+            index.setdefault(lang, {}).setdefault(prefix, []).append((position, resolver))
+    return index
+
+
+def get_app_resolvers(path, index=None):
+    """
+    Returns the resolvers which may resolve the given path in the current
+    language: the ones hooked under one of its prefixes. Instead of trying
+    the patterns of every resolver, the prefixes of the path, which end at a
+    slash, are looked up in the index.
+    """
+    if index is None:
+        index = APP_RESOLVER_INDEX
+    prefixes = index.get(get_language())
+    if not prefixes:
+        return []
+    candidates = list(prefixes.get('', ()))
+    end = path.find('/')
+    while end != -1:
+        candidates.extend(prefixes.get(path[:end + 1], ()))
+        end = path.find('/', end + 1)
+    # in the order a resolver would have been tried without the index
+    candidates.sort(key=itemgetter(0))
+    return [resolver for position, resolver in candidates]
+
+
+def get_app_page(page_id):
+    """
+    Returns the public page with the given id. The page is kept in the memory
+    of this process until a public page or title changes.
+    """
+    from cms.cache.page import get_path_index_generation
+
+    generation = get_path_index_generation()
+    if generation is None:
+        return Page.objects.public().get(id=page_id)
+    try:
+        page_generation, page = _app_pages[page_id]
+    except KeyError:
+        page_generation = page = None
+    if page_generation != generation:
+        page = Page.objects.public().get(id=page_id)
+        _app_pages[page_id] = (generation, page)
+    # the page is changed while the request is processed
+    return copy(page)
+
 
 def applications_page_check(request, current_page=None, path=None):
     """Tries to find if given path was resolved over application.
@@ -38,11 +192,11 @@ def applications_page_check(request, current_page=None, path=None):
     for lang in get_language_list():
         if path.startswith(lang + "/"):
             path = path[len(lang + "/"):]
-    for resolver in APP_RESOLVERS:
+    for resolver in get_app_resolvers(path):
         try:
             page_id = resolver.resolve_page_id(path)
             # yes, it is application page
-            page = Page.objects.public().get(id=page_id)
+            page = get_app_page(page_id)
             # If current page was matched, then we have some override for content
             # from cms, but keep current page. Otherwise return page to which was application assigned.
             return page
@@ -56,6 +210,8 @@ class AppRegexURLResolver(RegexURLResolver):
     def __init__(self, *args, **kwargs):
         self.page_id = None
         self.url_patterns_dict = {}
+        # language -> the path all patterns of that language start with
+        self.url_prefixes_dict = {}
         super(AppRegexURLResolver, self).__init__(*args, **kwargs)
 
     @property
@@ -171,7 +327,22 @@ def get_patterns_for_title(path, title):
 
 def get_app_patterns():
     """
-    Get a list of patterns for all hooked apps.
+    Get a list of patterns for all hooked apps, see build_app_patterns, and
+    adds them to the resolvers applications_page_check tries.
+    """
+    global APP_RESOLVERS, APP_RESOLVER_INDEX, _app_urls_generation
+    generation, app_patterns = build_app_patterns()
+    resolvers = APP_RESOLVERS + app_patterns
+    APP_RESOLVERS, APP_RESOLVER_INDEX = resolvers, build_app_resolver_index(resolvers)
+    _app_urls_generation = generation
+    return app_patterns
+
+
+def build_app_patterns():
+    """
+    Returns the generation of the apphook url patterns they are built against
+    and a list of patterns for all hooked apps, without changing the patterns
+    this process resolves with.
 
     How this works:
 
@@ -184,8 +355,11 @@ def get_app_patterns():
     All 'normal' patterns from the urlconf get re-written by prefixing them with
     the title path and then included into the cms url patterns.
     """
+    from cms.cache.page import get_app_urls_generation
     from cms.models import Title
 
+    # read before the titles, so changes made meanwhile trigger another rebuild
+    generation = get_app_urls_generation()
     try:
         current_site = Site.objects.get_current()
     except Site.DoesNotExist:
@@ -214,19 +388,22 @@ def get_app_patterns():
         app = apphook_pool.get_apphook(title.page.application_urls)
         app_ns = app.app_name, title.page.application_namespace
         with force_language(title.language):
-            hooked_applications[title.page_id][title.language] = (app_ns, get_patterns_for_title(path, title))
+            hooked_applications[title.page_id][title.language] = (app_ns, path, get_patterns_for_title(path, title))
         included.append(mix_id)
         # Build the app patterns to be included in the cms urlconfs
     app_patterns = []
     for page_id in hooked_applications.keys():
         resolver = None
         for lang in hooked_applications[page_id].keys():
-            (app_ns, inst_ns), current_patterns = hooked_applications[page_id][lang]
+            (app_ns, inst_ns), path, current_patterns = hooked_applications[page_id][lang]
             if not resolver:
                 resolver = AppRegexURLResolver(r'', 'app_resolver', app_name=app_ns, namespace=inst_ns)
                 resolver.page_id = page_id
             extra_patterns = patterns('', *current_patterns)
             resolver.url_patterns_dict[lang] = extra_patterns
+            # like get_patterns_for_title
+            if path and not path.endswith('/'):
+                path += '/'
+            resolver.url_prefixes_dict[lang] = path
         app_patterns.append(resolver)
-        APP_RESOLVERS.append(resolver)
-    return app_patterns
+    return generation, app_patterns
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+from contextlib import contextmanager
+from threading import local
+
+_deferred = local()
+
+
+def get_deferred_invalidations():
+    """
+    Returns the invalidations collected by the innermost
+    deferred_invalidation block of this thread, None outside of one.
+    """
+    return getattr(_deferred, 'invalidations', None)
+
+
+def new_invalidations():
+    return {'tags': set(), 'menus': set(), 'page_cache': False, 'path_index': False}
+
+
+def merge_invalidations(invalidations, other):
+    invalidations['tags'].update(other['tags'])
+    invalidations['menus'].update(other['menus'])
+    invalidations['page_cache'] = invalidations['page_cache'] or other['page_cache']
+    invalidations['path_index'] = invalidations['path_index'] or other['path_index']
+
+
+@contextmanager
+def deferred_invalidation(replay=True):
+    """
+    Collects the invalidations of the page cache, the menus and the page path
+    index requested in the block instead of doing them right away, and does
+    each of them once when the block is left. Meant for bulk operations which
+    would otherwise invalidate the same caches over and over again.
+
+    With replay=False nothing is invalidated when the block is left, the
+    yielded invalidations have to be passed on to run_invalidations.
+    """
+    outer = get_deferred_invalidations()
+    invalidations = _deferred.invalidations = new_invalidations()
+    try:
+        yield invalidations
+    finally:
+        _deferred.invalidations = outer
+        if outer is not None:
+            merge_invalidations(outer, invalidations)
+        elif replay:
+            run_invalidations(invalidations)
+
+
+def run_invalidations(invalidations):
+    from cms.cache.page import invalidate_path_index, invalidate_tags
+    from cms.views import invalidate_cms_page_cache
+    from menus.menu_pool import menu_pool
+
+    if invalidations['page_cache']:
+        invalidate_cms_page_cache()
+    elif invalidations['tags']:
+        invalidate_tags(invalidations['tags'])
+    if (None, None) in invalidations['menus']:
+        menu_pool.clear(all=True)
+    else:
+        for site_id, language in invalidations['menus']:
+            menu_pool.clear(site_id, language)
+    if invalidations['path_index']:
+        invalidate_path_index()
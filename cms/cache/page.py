@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+import time
+
+from cms.utils import get_cms_setting
+from cms.utils.compat import DJANGO_1_5
+
+
+def get_page_tag(page_id):
+    return 'page:%s' % page_id
+
+
+def get_placeholder_tag(placeholder_id):
+    return 'placeholder:%s' % placeholder_id
+
+
+def get_static_placeholder_tag(code):
+    return 'static_placeholder:%s' % code
+
+
+def get_apphook_tag(application_urls):
+    return 'apphook:%s' % application_urls
+
+
+def get_tag_cache_key(tag):
+    return "%s:page_cache_tag:%s" % (get_cms_setting('CACHE_PREFIX'), tag)
+
+
+def _new_tag_version():
+    # Not a counter: if a tag key gets evicted it must never come back with a
+    # value an old cache entry was stored against.
+    return int(time.time() * 1000000)
+
+
+def get_tag_versions(tags):
+    """
+    Returns a dictionary mapping each of the given tags to its current
+    version. Tags unknown to the cache get a fresh version.
+    """
+    from django.core.cache import cache
+    keys = dict((get_tag_cache_key(tag), tag) for tag in tags)
+    if not keys:
+        return {}
+    cached = cache.get_many(list(keys))
+    versions = {}
+    missing = {}
+    for key, tag in keys.items():
+        if key in cached:
+            versions[tag] = cached[key]
+        else:
+            versions[tag] = missing[key] = _new_tag_version()
+    if missing:
+        cache.set_many(missing, get_cms_setting('CACHE_DURATIONS')['content'])
+    return versions
+
+
+def invalidate_tags(tags):
+    """
+    Invalidates every cached page which was rendered with one of the given
+    tags, leaving all other cached pages untouched.
+    """
+    from django.core.cache import cache
+    from cms.cache import get_deferred_invalidations
+    deferred = get_deferred_invalidations()
+    if deferred is not None:
+        deferred['tags'].update(tags)
+        return
+    version = _new_tag_version()
+    keys = dict((get_tag_cache_key(tag), version) for tag in tags)
+    if keys:
+        cache.set_many(keys, get_cms_setting('CACHE_DURATIONS')['content'])
+
+
+def get_response_tags(request, page):
+    """
+    Collects the tags of everything the page cache entry for this request
+    depends on: the page itself, its apphook and all (static) placeholders
+    rendered while processing the request.
+    """
+    tags = set()
+    if page:
+        tags.add(get_page_tag(page.pk))
+        if page.application_urls:
+            tags.add(get_apphook_tag(page.application_urls))
+    for placeholder in getattr(request, 'placeholders', []):
+        if placeholder and placeholder.pk:
+            tags.add(get_placeholder_tag(placeholder.pk))
+    for static_placeholder in getattr(request, 'static_placeholders', []):
+        tags.add(get_static_placeholder_tag(static_placeholder.code))
+    return tags
+
+
+PAGE_CACHE_STATS = ('hit', 'miss', 'stale')
+
+# memcached interprets timeouts longer than 30 days as timestamps
+STATS_TIMEOUT = 60 * 60 * 24 * 30
+
+
+def get_stats_cache_key(name):
+    return "%s:page_cache_stats:%s" % (get_cms_setting('CACHE_PREFIX'), name)
+
+
+def incr_page_cache_stat(name):
+    from django.core.cache import cache
+    key = get_stats_cache_key(name)
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, STATS_TIMEOUT):
+            cache.incr(key)
+
+
+def get_page_cache_stats():
+    """
+    Returns the number of page cache hits, misses and stale responses served
+    by all processes sharing the cache since the counters were last reset.
+    """
+    from django.core.cache import cache
+    keys = dict((get_stats_cache_key(name), name) for name in PAGE_CACHE_STATS)
+    cached = cache.get_many(list(keys))
+    return dict((name, cached.get(key, 0)) for key, name in keys.items())
+
+
+def reset_page_cache_stats():
+    from django.core.cache import cache
+    cache.delete_many([get_stats_cache_key(name) for name in PAGE_CACHE_STATS])
+
+
+def get_path_index_cache_key():
+    return "%s:page_path_index_generation" % get_cms_setting('CACHE_PREFIX')
+
+
+def get_path_index_generation():
+    """
+    Returns the generation of the page path index every process has to build
+    its in-memory index against, or None if the cache can't store one.
+    """
+    from django.core.cache import cache
+    key = get_path_index_cache_key()
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, _new_tag_version(), get_cms_setting('CACHE_DURATIONS')['menus'])
+        # another process may have won the race
+        generation = cache.get(key)
+    return generation
+
+
+def invalidate_path_index():
+    """
+    Makes every process rebuild its page path index on the next request.
+    """
+    from django.core.cache import cache
+    from cms.cache import get_deferred_invalidations
+    deferred = get_deferred_invalidations()
+    if deferred is not None:
+        deferred['path_index'] = True
+        return
+    cache.set(get_path_index_cache_key(), _new_tag_version(), get_cms_setting('CACHE_DURATIONS')['menus'])
+
+
+# the generation of the apphook url patterns only changes when apphooks do,
+# there is no point in every process rebuilding its patterns when it expires.
+# Before Django 1.6 a timeout of None means the default timeout, so use one of
+# a year there, which the memcached backend turns into a timestamp.
+if DJANGO_1_5:
+    APP_URLS_TIMEOUT = 60 * 60 * 24 * 365
+else:
+    APP_URLS_TIMEOUT = None
+
+
+# seconds the generation of the apphook url patterns read from the cache is
+# trusted by a process before reading it again
+APP_URLS_CHECK_INTERVAL = 5
+
+# the generation last read from the cache and when to read it again, local to
+# this process
+_app_urls_local = {'generation': None, 'expires': 0}
+
+
+def get_app_urls_cache_key():
+    return "%s:apphook_urls_generation" % get_cms_setting('CACHE_PREFIX')
+
+
+def get_app_urls_generation(default=None):
+    """
+    Returns the generation of the apphook url patterns every process has to
+    build its patterns against, or None if the cache can't store one. The
+    cache is read at most every APP_URLS_CHECK_INTERVAL seconds. If it lost
+    the generation, default (a new generation if None) is stored, so a cache
+    miss alone doesn't make the processes rebuild their patterns.
+    """
+    from django.core.cache import cache
+    now = time.time()
+    if _app_urls_local['generation'] is not None and now < _app_urls_local['expires']:
+        return _app_urls_local['generation']
+    key = get_app_urls_cache_key()
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, default or _new_tag_version(), APP_URLS_TIMEOUT)
+        # another process may have won the race
+        generation = cache.get(key)
+    _app_urls_local.update(generation=generation, expires=now + APP_URLS_CHECK_INTERVAL)
+    return generation
+
+
+def invalidate_app_urls():
+    """
+    Makes every process rebuild its apphook url patterns on the next request,
+    this one right away and the others within APP_URLS_CHECK_INTERVAL seconds.
+    """
+    from django.core.cache import cache
+    generation = _new_tag_version()
+    cache.set(get_app_urls_cache_key(), generation, APP_URLS_TIMEOUT)
+    _app_urls_local.update(generation=generation, expires=time.time() + APP_URLS_CHECK_INTERVAL)
@@ -64,3 +64,30 @@ def clear_permission_cache():
     else:
         cache.set(get_cache_version_key(), 2,
                 get_cms_setting('CACHE_DURATIONS')['permissions'])
+
+
+def get_view_restrictions_cache_key(site_id):
+    return "%s:permission:view_restrictions:%s" % (
+        get_cms_setting('CACHE_PREFIX'), site_id)
+
+
+def get_view_restrictions_cache(site_id):
+    from django.core.cache import cache
+    return cache.get(get_view_restrictions_cache_key(site_id), version=get_cache_version())
+
+
+def set_view_restrictions_cache(site_id, value):
+    from django.core.cache import cache
+    cache.set(get_view_restrictions_cache_key(site_id), value,
+            get_cms_setting('CACHE_DURATIONS')['permissions'],
+            version=get_cache_version())
+
+
+def clear_view_restrictions_cache(site_id):
+    """
+    Cleans the view restrictions of the given site and of all sites.
+    Changes to the page tree clean them through clear_permission_cache.
+    """
+    from django.core.cache import cache
+    cache.delete_many([get_view_restrictions_cache_key(site_id), get_view_restrictions_cache_key(None)],
+            version=get_cache_version())
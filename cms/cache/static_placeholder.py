@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+from django.conf import settings
+from django.utils.encoding import force_text
+from django.utils.timezone import get_current_timezone_name
+
+from cms.cache.page import get_static_placeholder_tag, get_tag_versions
+from cms.utils import get_cms_setting
+
+# code -> (version, static placeholder fields, public placeholder fields),
+# local to this process
+_static_placeholders = {}
+
+
+def get_static_placeholder_cache_key(code, version):
+    return "%s:static_placeholder:%s:%s" % (get_cms_setting('CACHE_PREFIX'), code, version)
+
+
+def get_static_placeholder_content_cache_key(code, version, language):
+    cache_key = "%s:static_placeholder_content:%s:%s:%s" % (
+        get_cms_setting('CACHE_PREFIX'), code, version, language)
+    if settings.USE_TZ:
+        tz_name = force_text(get_current_timezone_name(), errors='ignore')
+        cache_key += '.%s' % tz_name.encode('ascii', 'ignore').decode('ascii').replace(' ', '_')
+    return cache_key
+
+
+def _get_fields(obj):
+    return dict((field.attname, getattr(obj, field.attname)) for field in obj._meta.local_fields)
+
+
+def get_static_placeholder(code):
+    """
+    Returns the static placeholder with the given code, with its public
+    placeholder, creating both if they don't exist yet. The static
+    placeholder is looked up in the memory of this process or the cache until
+    it gets published, changed or deleted. Every call returns new instances,
+    so they may be changed while rendering.
+
+    The returned static placeholder knows the version it was cached with as
+    cache_version.
+    """
+    from django.core.cache import cache
+    from cms.models import Placeholder, StaticPlaceholder
+
+    tag = get_static_placeholder_tag(code)
+    version = get_tag_versions([tag])[tag]
+    try:
+        local_version, fields, public_fields = _static_placeholders[code]
+    except KeyError:
+        local_version = fields = public_fields = None
+    if local_version != version:
+        key = get_static_placeholder_cache_key(code, version)
+        cached = cache.get(key)
+        if cached is None:
+            static_placeholder, __ = StaticPlaceholder.objects.select_related('public').get_or_create(
+                code=code, defaults={'name': code, 'creation_method': StaticPlaceholder.CREATION_BY_TEMPLATE})
+            cached = (_get_fields(static_placeholder), _get_fields(static_placeholder.public))
+            cache.set(key, cached, get_cms_setting('CACHE_DURATIONS')['content'])
+        fields, public_fields = cached
+        _static_placeholders[code] = (version, fields, public_fields)
+    static_placeholder = StaticPlaceholder(**fields)
+    static_placeholder.public = Placeholder(**public_fields)
+    # static placeholders never belong to a page
+    static_placeholder.public.page = None
+    static_placeholder.cache_version = version
+    return static_placeholder
+
+
+def get_static_placeholder_content(static_placeholder, language):
+    """
+    Returns the cached public content of a static placeholder returned by
+    get_static_placeholder in the given language, None if there is none.
+    """
+    from django.core.cache import cache
+    return cache.get(get_static_placeholder_content_cache_key(
+        static_placeholder.code, static_placeholder.cache_version, language))
+
+
+def set_static_placeholder_content(static_placeholder, language, content):
+    from django.core.cache import cache
+    cache.set(get_static_placeholder_content_cache_key(
+        static_placeholder.code, static_placeholder.cache_version, language),
+        content, get_cms_setting('CACHE_DURATIONS')['content'])
+
+
+def invalidate_static_placeholders(codes):
+    """
+    Drops the static placeholders with the given codes and their content from
+    the caches of all processes.
+    """
+    from cms.cache.page import invalidate_tags
+    invalidate_tags([get_static_placeholder_tag(code) for code in codes])
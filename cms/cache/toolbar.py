@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+from django.conf import settings
+
+from cms.utils import get_cms_setting
+
+
+def get_user_settings_cache_key(user_id):
+    return "%s:toolbar_user_settings:%s" % (get_cms_setting('CACHE_PREFIX'), user_id)
+
+
+def get_log_entry_cache_key(user_id):
+    return "%s:toolbar_log_entry:%s" % (get_cms_setting('CACHE_PREFIX'), user_id)
+
+
+def _is_valid_language(language):
+    if settings.USE_I18N:
+        return language in dict(settings.LANGUAGES)
+    return language == settings.LANGUAGE_CODE
+
+
+def get_user_settings(user, language):
+    """
+    Returns the toolbar language and the id of the clipboard placeholder of a
+    staff user, creating the settings of the user with the given language if
+    they have none yet. Cached until the settings of the user change.
+    """
+    from django.core.cache import cache
+    from cms.models import Placeholder, UserSettings
+
+    key = get_user_settings_cache_key(user.pk)
+    cached = cache.get(key)
+    if cached is not None and _is_valid_language(cached[0]):
+        return cached
+    try:
+        user_settings = UserSettings.objects.get(user=user)
+    except UserSettings.DoesNotExist:
+        user_settings = UserSettings(language=language, user=user)
+        placeholder = Placeholder(slot="clipboard")
+        placeholder.save()
+        user_settings.clipboard = placeholder
+        user_settings.save()
+    if not _is_valid_language(user_settings.language):
+        user_settings.language = language
+        user_settings.save()
+    cached = (user_settings.language, user_settings.clipboard_id)
+    cache.set(key, cached, get_cms_setting('CACHE_DURATIONS')['permissions'])
+    return cached
+
+
+def invalidate_user_settings(user_id):
+    from django.core.cache import cache
+    cache.delete(get_user_settings_cache_key(user_id))
+
+
+def set_latest_log_entry(user_id, log_entry_id):
+    """
+    Remembers the latest object the user added or changed in the admin, until
+    pop_latest_log_entry picks it up.
+    """
+    from django.core.cache import cache
+    cache.set(get_log_entry_cache_key(user_id), log_entry_id, get_cms_setting('CACHE_DURATIONS')['permissions'])
+
+
+def pop_latest_log_entry(user_id):
+    """
+    Returns the id of the log entry set_latest_log_entry remembered for the
+    user, None if there is none, and forgets it.
+    """
+    from django.core.cache import cache
+    key = get_log_entry_cache_key(user_id)
+    log_entry_id = cache.get(key)
+    if log_entry_id is not None:
+        cache.delete(key)
+    return log_entry_id
@@ -14,7 +14,7 @@ from cms.toolbar_pool import toolbar_pool
 from cms.utils.permissions import get_user_sites_queryset, has_page_change_permission
 from django.conf import settings
 from django.core.urlresolvers import reverse
-from django.utils.translation import ugettext_lazy as _
+from django.utils.translation import ugettext_lazy as _, ungettext
 from django.contrib import admin
 from django.contrib.auth.models import User
 from menus.utils import DefaultLanguageChanger
@@ -66,6 +66,8 @@ class PlaceholderToolbar(CMSToolbar):
                         break
             if not added and placeholders:
                 self.add_structure_mode()
+        if settings.DEBUG and self.toolbar.is_staff:
+            self.add_plugin_query_count()
 
     def add_structure_mode(self):
         switcher = self.toolbar.add_button_list('Mode Switcher', side=self.toolbar.RIGHT,
@@ -75,6 +77,12 @@ class PlaceholderToolbar(CMSToolbar):
         switcher.add_button(_("Structure"), '?build', active=self.toolbar.build_mode,
                             disabled=not self.toolbar.build_mode)
 
+    def add_plugin_query_count(self):
+        count = getattr(self.request, 'plugin_query_count', 0)
+        name = ungettext("%(count)d plugin query", "%(count)d plugin queries", count) % {'count': count}
+        self.toolbar.add_link_item(name, '#', disabled=True, side=self.toolbar.RIGHT,
+                                   extra_classes=['cms_toolbar-item-plugin-queries'])
+
 
 @toolbar_pool.register
 class BasicToolbar(CMSToolbar):
@@ -68,16 +68,62 @@ class ExtensionPool(object):
 
     def _copy_page_extensions(self, draft_page, public_page, language):
         for extension in self.page_extensions:
-            for instance in extension.objects.filter(extended_object=draft_page):
+            for instance in extension.objects.filter(extended_object=draft_page).select_related('public_extension'):
                 instance.copy_to_public(public_page, language)
 
     def _copy_title_extensions(self, draft_page, public_page, language):
         draft_title = draft_page.title_set.get(language=language)
         public_title = draft_title.publisher_public
         for extension in self.title_extensions:
-            for instance in extension.objects.filter(extended_object=draft_title):
+            for instance in extension.objects.filter(extended_object=draft_title).select_related('public_extension'):
                 instance.copy_to_public(public_title, language)
 
+    def _prefetch(self, extensions, objects):
+        objects = dict((obj.pk, obj) for obj in objects)
+        if not objects:
+            return
+        for extension in extensions:
+            # where the reverse one to one descriptor looks for the extension
+            cache_name = extension._meta.get_field('extended_object').related.get_cache_name()
+            for obj in objects.values():
+                setattr(obj, cache_name, None)
+            for instance in extension.objects.filter(extended_object__in=list(objects)):
+                setattr(objects[instance.extended_object_id], cache_name, instance)
+
+    def prefetch_page_extensions(self, pages):
+        """
+        Looks up the registered page extensions of the given pages with one
+        query per extension model and attaches them to the pages, so
+        page.<extension name> doesn't query the database, neither for pages
+        without an extension.
+        """
+        self._prefetch(self.page_extensions, pages)
+
+    def prefetch_title_extensions(self, titles):
+        """
+        Like prefetch_page_extensions, for the registered title extensions of
+        the given titles.
+        """
+        self._prefetch(self.title_extensions, titles)
+
+    def get_extensions(self, page, title=None):
+        """
+        Returns the registered page extensions of the given page and title
+        extensions of the given title which exist, by their name on the page
+        (or title), as prefetched by prefetch_page_extensions and
+        prefetch_title_extensions.
+        """
+        extensions = {}
+        for extension_set, obj in ((self.page_extensions, page), (self.title_extensions, title)):
+            if obj is None:
+                continue
+            for extension in extension_set:
+                related = extension._meta.get_field('extended_object').related
+                instance = getattr(obj, related.get_cache_name(), None)
+                if instance is not None:
+                    extensions[related.get_accessor_name()] = instance
+        return extensions
+
     def _remove_orphaned_page_extensions(self):
         for extension in self.page_extensions:
             extension.objects.filter(
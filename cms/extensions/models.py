@@ -24,7 +24,8 @@ class BaseExtension(models.Model):
         pass
 
     def copy_to_public(self, public_object, language):
-        this = self.__class__.objects.get(pk=self.pk)  # get a copy of this instance
+        # a copy of this instance, without looking it up again
+        this = self.__class__(**dict((field.attname, getattr(self, field.attname)) for field in self._meta.fields))
         public_extension = self.public_extension  # get the public version of this instance if any
 
         this.extended_object = public_object  # set the new public object
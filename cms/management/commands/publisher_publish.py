@@ -1,52 +1,193 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import
+from collections import defaultdict
+from optparse import make_option
+import multiprocessing
+import os
+import time
+
 from django.core.management.base import NoArgsCommand, CommandError
+from django.db import connections, transaction
 from django.utils.translation import activate
 from cms.utils.compat.dj import force_unicode
 
+# print the rate every so many pages
+PROGRESS_INTERVAL = 500
+
+
 class Command(NoArgsCommand):
+    option_list = NoArgsCommand.option_list + (
+        make_option('--jobs', type='int', dest='jobs', default=1,
+                    help='Number of processes publishing independent page trees at the same time.'),
+        make_option('--checkpoint', dest='checkpoint', default=None,
+                    help='File the ids of the published pages are written to. Pages listed in it are '
+                         'skipped, so an interrupted run can be resumed by passing the same file again.'),
+    )
+
     def handle_noargs(self, **options):
         """Create published public version of all published drafts.
         """
-        self.publish_pages()
-        
-    def publish_pages(self):
+        self.publish_pages(jobs=options.get('jobs') or 1, checkpoint=options.get('checkpoint'))
+
+    def publish_pages(self, jobs=1, checkpoint=None):
+        from cms.cache import deferred_invalidation
         from cms.compat import get_user_model
         from cms.models import Page
         from cms.utils.permissions import set_current_user
-        
+
         # thread locals middleware needs to know, who are we - login as a first
         # super user
-        
+
         try:
             user = get_user_model().objects.filter(is_active=True, is_staff=True, is_superuser=True)[0]
         except IndexError:
             raise CommandError("No super user found, create one using `manage.py createsuperuser`.")
-        
+
         set_current_user(user) # set him as current user
 
-        qs = Page.objects.drafts().filter(title_set__published=True)
-        pages_total, pages_published = qs.count(), 0
-        
+        done = set()
+        if checkpoint and os.path.exists(checkpoint):
+            with open(checkpoint) as checkpoint_file:
+                done = set(int(line) for line in checkpoint_file if line.strip())
+        # parents are published before their children, so these don't have
+        # to wait for them
+        pages = Page.objects.drafts().filter(title_set__published=True).distinct().order_by(
+            'tree_id', 'lft').values_list('pk', 'parent')
+        roots, descendants = [], []
+        for pk, parent_id in pages:
+            if pk not in done:
+                (descendants if parent_id else roots).append(pk)
+        self.pages_total, self.pages_published, self.count = len(roots) + len(descendants), 0, 0
+        self.checkpoint = open(checkpoint, 'a') if checkpoint else None
+        self.started = time.time()
+
         print(u"\nPublishing public drafts....\n")
-        output_language = None
-        for i, page in enumerate(qs):
-            m = " "
-            add = True
-            for lang in page.title_set.filter(published=True).values_list("language", flat=True):
-                if not output_language:
-                    output_language = lang
-                if not page.publish(lang):
-                    add = False
-            # we may need to activate the first (main) language for proper page title rendering
-            activate(output_language)
-            if add:
-                pages_published += 1
-                m = "*"
-            print(u"%d.\t%s  %s [%d]" % (i + 1, m, force_unicode(page), page.id))
-        
+        try:
+            # each publish invalidates the page cache, the menus and the path
+            # index, once for all pages is enough
+            with deferred_invalidation() as invalidations:
+                # publishing a root page for the first time renumbers the
+                # trees after it, so roots are never published in parallel
+                for pk in roots:
+                    self.report(publish_page(pk))
+                if jobs > 1:
+                    trees, descendants = self.split_trees(descendants)
+                    self.publish_trees(trees, jobs, user, invalidations)
+                for pk in descendants:
+                    self.report(publish_page(pk))
+        finally:
+            if self.checkpoint:
+                self.checkpoint.close()
+        elapsed = time.time() - self.started
+
         print(u"\n")
         print(u"=" * 40)
-        print(u"Total:     %s" % pages_total)
-        print(u"Published: %s" % pages_published)
-        
+        print(u"Total:     %s" % self.pages_total)
+        print(u"Published: %s" % self.pages_published)
+        print(u"Pages/s:   %.1f" % (self.count / elapsed if elapsed else 0))
+
+    def split_trees(self, pks):
+        """
+        Groups the pages by tree. A tree can be published next to the others
+        if the public versions of its pages all belong to one public tree no
+        other tree has public pages in. Returns the page ids of these trees
+        and the ids of the pages which have to be published one by one.
+        """
+        from cms.models import Page
+
+        public_trees = defaultdict(set)
+        owners = defaultdict(set)
+        for tree_id, public_tree_id in Page.objects.drafts().filter(
+                publisher_public__isnull=False).values_list('tree_id', 'publisher_public__tree_id').distinct():
+            public_trees[tree_id].add(public_tree_id)
+            owners[public_tree_id].add(tree_id)
+        tree_ids = dict(Page.objects.drafts().values_list('pk', 'tree_id'))
+        trees = defaultdict(list)
+        serial = []
+        for pk in pks:
+            tree_id = tree_ids[pk]
+            if len(public_trees[tree_id]) <= 1 and all(
+                    owners[public_tree_id] == set([tree_id]) for public_tree_id in public_trees[tree_id]):
+                trees[tree_id].append(pk)
+            else:
+                serial.append(pk)
+        return list(trees.values()), serial
+
+    def get_pool(self, jobs, user):
+        """
+        Returns the pool of worker processes publishing the trees.
+        """
+        # the workers must not share the connections of this process
+        for connection in connections.all():
+            connection.close()
+        return multiprocessing.Pool(jobs, init_worker, (user, multiprocessing.Lock(), multiprocessing.Value('i', 0)))
+
+    def publish_trees(self, trees, jobs, user, invalidations):
+        from cms.cache import merge_invalidations
+
+        pool = self.get_pool(jobs, user)
+        try:
+            # biggest trees first, so no worker is left with one at the end
+            for results, tree_invalidations in pool.imap_unordered(
+                    publish_tree, sorted(trees, key=len, reverse=True)):
+                merge_invalidations(invalidations, tree_invalidations)
+                for result in results:
+                    self.report(result)
+            pool.close()
+        except:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+
+    def report(self, result):
+        pk, label, published = result
+        self.count += 1
+        m = " "
+        if published:
+            self.pages_published += 1
+            m = "*"
+        print(u"%d.\t%s  %s [%d]" % (self.count, m, label, pk))
+        if self.checkpoint:
+            self.checkpoint.write("%d\n" % pk)
+            self.checkpoint.flush()
+        if not self.count % PROGRESS_INTERVAL:
+            print(u"%d of %d pages, %.1f pages/s" % (
+                self.count, self.pages_total, self.count / (time.time() - self.started)))
+
+
+def publish_page(pk):
+    """
+    Publishes every published language of the draft page pk in one
+    transaction. Returns the page id, its title and whether it got published.
+    """
+    from cms.models import Page
+
+    published = True
+    with transaction.commit_on_success():
+        page = Page.objects.get(pk=pk)
+        languages = list(page.title_set.filter(published=True).values_list("language", flat=True))
+        for lang in languages:
+            if not page.publish(lang):
+                published = False
+    # we may need to activate the main language for proper page title rendering
+    if languages:
+        activate(languages[0])
+    return pk, force_unicode(page), published
+
+
+def init_worker(user, lock, last_tree_id):
+    from cms.utils.copy_plugins import share_tree_ids
+    from cms.utils.permissions import set_current_user
+
+    set_current_user(user)
+    # plugin trees are numbered by the workers at the same time
+    share_tree_ids(lock, last_tree_id)
+
+
+def publish_tree(pks):
+    from cms.cache import deferred_invalidation
+
+    with deferred_invalidation(replay=False) as invalidations:
+        results = [publish_page(pk) for pk in pks]
+    return results, invalidations
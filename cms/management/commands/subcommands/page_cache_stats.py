@@ -0,0 +1,15 @@
+# -*- coding: utf-8 -*-
+from cms.cache.page import get_page_cache_stats, reset_page_cache_stats, PAGE_CACHE_STATS
+from django.core.management.base import BaseCommand
+
+
+class PageCacheStatsCommand(BaseCommand):
+    args = '[reset]'
+    help = 'Prints the number of page cache hits, misses and stale responses. Pass "reset" to reset the counters.'
+
+    def handle(self, *args, **options):
+        stats = get_page_cache_stats()
+        for name in PAGE_CACHE_STATS:
+            self.stdout.write(u'%s %s\n' % (name, stats[name]))
+        if args and args[0] == 'reset':
+            reset_page_cache_stats()
@@ -1,9 +1,13 @@
 # -*- coding: utf-8 -*-
+from bisect import bisect_right
 from collections import defaultdict
 from cms.apphook_pool import apphook_pool
+from cms.cache.permissions import get_view_restrictions_cache, set_view_restrictions_cache
 from cms.compat import get_user_model, user_related_query_name, user_related_name
+from cms.extensions import extension_pool
 from cms.models.permissionmodels import (ACCESS_DESCENDANTS,
     ACCESS_PAGE_AND_DESCENDANTS, ACCESS_CHILDREN, ACCESS_PAGE_AND_CHILDREN, ACCESS_PAGE)
+from cms.models.pagemodel import Page
 from cms.models.permissionmodels import PagePermission, GlobalPagePermission
 from cms.models.titlemodels import Title
 from cms.utils import get_language_from_request
@@ -15,11 +19,116 @@ from cms.utils.plugins import current_site
 from menus.base import Menu, NavigationNode, Modifier
 from menus.menu_pool import menu_pool
 
+from django.contrib.auth.models import Group
 from django.contrib.sites.models import Site
 from django.db.models.query_utils import Q
 from django.utils.translation import get_language
 
 
+def _build_view_restrictions(site_id):
+    """
+    Collects the pages affected by view permissions using the MPTT fields of
+    the pages, fetching the pages of the trees containing restricted pages
+    with descendants in one query instead of the children or descendants of
+    every permission.
+    """
+    restricted = set()
+    users = defaultdict(set)
+    groups = defaultdict(set)
+    page_permissions = PagePermission.objects.filter(can_view=True)
+    if site_id:
+        page_permissions = page_permissions.filter(page__site=site_id)
+    page_permissions = list(page_permissions.values_list(
+        'page_id', 'page__publisher_public_id', 'page__tree_id', 'page__lft', 'page__rght', 'page__level',
+        'grant_on', 'user_id', 'group_id'))
+    # only the trees of pages with descendants the permission applies to
+    tree_ids = set(perm[2] for perm in page_permissions if perm[4] - perm[3] > 1 and perm[6] in [
+        ACCESS_CHILDREN, ACCESS_PAGE_AND_CHILDREN, ACCESS_DESCENDANTS, ACCESS_PAGE_AND_DESCENDANTS])
+    trees = defaultdict(list)
+    if tree_ids:
+        pages = Page.objects.filter(tree_id__in=tree_ids).order_by('tree_id', 'lft')
+        for tree_id, lft, rght, level, pk, public_id in pages.values_list(
+                'tree_id', 'lft', 'rght', 'level', 'pk', 'publisher_public_id'):
+            trees[tree_id].append((lft, rght, level, pk, public_id))
+    tree_lfts = dict((tree_id, [page[0] for page in pages]) for tree_id, pages in trees.items())
+
+    for page_id, public_id, tree_id, lft, rght, level, grant_on, user_id, group_id in page_permissions:
+        page_ids = set()
+        if grant_on in [ACCESS_PAGE, ACCESS_PAGE_AND_CHILDREN, ACCESS_PAGE_AND_DESCENDANTS]:
+            page_ids.add(page_id)
+            page_ids.add(public_id)
+        if tree_id in trees and grant_on in [
+                ACCESS_CHILDREN, ACCESS_PAGE_AND_CHILDREN, ACCESS_DESCENDANTS, ACCESS_PAGE_AND_DESCENDANTS]:
+            children_only = grant_on in [ACCESS_CHILDREN, ACCESS_PAGE_AND_CHILDREN]
+            pages = trees[tree_id]
+            # descendants are the pages following the page in the tree until
+            # the right boundary of the page
+            for index in range(bisect_right(tree_lfts[tree_id], lft), len(pages)):
+                descendant_lft, descendant_rght, descendant_level, descendant_id, descendant_public_id = pages[index]
+                if descendant_lft > rght:
+                    break
+                if children_only and descendant_level != level + 1:
+                    continue
+                page_ids.add(descendant_id)
+                page_ids.add(descendant_public_id)
+        page_ids.discard(None)
+        # a permission makes its page restricted, whatever it grants access to
+        restricted.add(page_id)
+        restricted |= page_ids
+        if user_id:
+            users[user_id] |= page_ids
+        if group_id:
+            groups[group_id] |= page_ids
+    return {
+        'restricted': restricted,
+        'users': dict(users),
+        'groups': dict(groups),
+    }
+
+
+def get_view_restrictions(site=None):
+    """
+    Returns the view restrictions of the pages of ``site`` (of all sites if
+    None) as a dictionary holding:
+
+    - ``restricted``: the ids of the pages affected by view permissions
+    - ``users``: the ids of the restricted pages granted to each user id
+    - ``groups``: the ids of the restricted pages granted to each group id
+
+    They are cached until a page or a page permission changes.
+    """
+    site_id = site and site.pk or None
+    restrictions = get_view_restrictions_cache(site_id)
+    if restrictions is None:
+        restrictions = _build_view_restrictions(site_id)
+        set_view_restrictions_cache(site_id, restrictions)
+    return restrictions
+
+
+def get_user_group_ids(request):
+    """
+    Returns the ids of the groups of the request's user, fetched once per
+    request.
+    """
+    if not hasattr(request, '_cms_user_group_ids'):
+        query = dict()
+        query[user_related_query_name] = request.user
+        request._cms_user_group_ids = set(Group.objects.filter(**query).values_list('pk', flat=True))
+    return request._cms_user_group_ids
+
+
+def get_granted_pages(request, restrictions):
+    """
+    Returns the ids of the restricted pages the request's user was granted
+    view access to, directly or through their groups.
+    """
+    granted = set(restrictions['users'].get(request.user.pk, ()))
+    if restrictions['groups']:
+        for group_id in get_user_group_ids(request):
+            granted |= restrictions['groups'].get(group_id, set())
+    return granted
+
+
 def get_visible_pages(request, pages, site=None):
     """
      This code is basically a many-pages-at-once version of
@@ -33,34 +142,8 @@ def get_visible_pages(request, pages, site=None):
     is_setting_public_staff = public_for == 'staff'
     is_auth_user = request.user.is_authenticated()
     visible_page_ids = []
-    restricted_pages = defaultdict(list)
-    page_permissions = PagePermission.objects.filter(can_view=True).select_related(
-            'page', 'group__' + user_related_query_name)
-
-    for perm in page_permissions:
-
-        # collect the pages that are affected by permissions
-        if site and perm.page.site_id != site.pk:
-            continue
-        if perm is not None and perm not in restricted_pages[perm.page.pk]:
-            # affective restricted pages gathering
-            # using mptt functions 
-            # add the page with the perm itself
-            if perm.grant_on in [ACCESS_PAGE, ACCESS_PAGE_AND_CHILDREN, ACCESS_PAGE_AND_DESCENDANTS]:
-                restricted_pages[perm.page.pk].append(perm)
-                restricted_pages[perm.page.publisher_public_id].append(perm)
-                # add children
-            if perm.grant_on in [ACCESS_CHILDREN, ACCESS_PAGE_AND_CHILDREN]:
-                child_ids = perm.page.get_children().values_list('id', 'publisher_public_id')
-                for id, public_id in child_ids:
-                    restricted_pages[id].append(perm)
-                    restricted_pages[public_id].append(perm)
-            # add descendants
-            elif perm.grant_on in [ACCESS_DESCENDANTS, ACCESS_PAGE_AND_DESCENDANTS]:
-                child_ids = perm.page.get_descendants().values_list('id', 'publisher_public_id')
-                for id, public_id in child_ids:
-                    restricted_pages[id].append(perm)
-                    restricted_pages[public_id].append(perm)
+    restrictions = get_view_restrictions(site)
+    restricted_pages = restrictions['restricted']
 
     # anonymous
     # no restriction applied at all
@@ -93,6 +176,8 @@ def get_visible_pages(request, pages, site=None):
             not restricted_pages and
             not global_view_perms):
             return []
+        if not global_view_perms:
+            granted_pages = get_granted_pages(request, restrictions)
 
 
     def has_global_perm():
@@ -102,31 +187,13 @@ def get_visible_pages(request, pages, site=None):
 
     has_global_perm.cache = -1
 
-    def has_permission_membership(page):
-        """
-        PagePermission user group membership tests
-        """
-        user_pk = request.user.pk
-        page_pk = page.pk
-        has_perm = False
-        for perm in restricted_pages[page_pk]:
-            if perm.user_id == user_pk:
-                has_perm = True
-            if not perm.group_id:
-                continue
-            user_set = getattr(perm.group, user_related_name)
-            group_user_ids = user_set.values_list('pk', flat=True)
-            if user_pk in group_user_ids:
-                has_perm = True
-        return has_perm
-
     for page in pages:
         to_add = False
         # default to false, showing a restricted page is bad
         # explicitly check all the conditions
         # of settings and permissions
         is_restricted = page.pk in restricted_pages
-        # restricted_pages contains as key any page.pk that is
+        # restricted_pages contains any page.pk that is
         # affected by a permission grant_on
         if is_auth_user:
             # a global permission was given to the request's user
@@ -142,7 +209,7 @@ def get_visible_pages(request, pages, site=None):
                 # authenticated staff user, no restriction and public for staff
                 to_add = True
             # check group and user memberships to restricted pages
-            elif is_restricted and has_permission_membership(page):
+            elif is_restricted and page.pk in granted_pages:
                 to_add = True
             elif has_global_perm():
                 to_add = True
@@ -155,6 +222,30 @@ def get_visible_pages(request, pages, site=None):
     return visible_page_ids
 
 
+def get_view_permission_profile(request, site):
+    """
+    Returns a string identifying everything get_visible_pages takes into
+    account about the request's user: users sharing a profile see the same
+    pages.
+    """
+    user = request.user
+    if not user.is_authenticated():
+        return 'anonymous'
+    query = dict()
+    query['group__' + user_related_query_name] = user
+    global_page_perm_q = Q(
+        Q(user=user) | Q(**query)
+    ) & Q(can_view=True) & Q(Q(sites__in=[site.pk]) | Q(sites__isnull=True))
+    if GlobalPagePermission.objects.filter(global_page_perm_q).exists():
+        grants = 'global'
+    elif user.has_perm('cms.view_page'):
+        grants = 'view_page'
+    else:
+        granted_pages = get_granted_pages(request, get_view_restrictions(site))
+        grants = ','.join(str(page_id) for page_id in sorted(granted_pages))
+    return 'staff=%s:draft=%s:grants=%s' % (user.is_staff, use_draft(request), grants)
+
+
 def page_to_node(page, home, cut):
     """
     Transform a CMS page into a navigation node.
@@ -276,11 +367,22 @@ class CMSMenu(Menu):
             page = ids[title.page_id]
             page.title_cache[title.language] = title
 
+        menu_extensions = get_cms_setting('MENU_EXTENSIONS')
+        if menu_extensions:
+            extension_pool.prefetch_page_extensions(actual_pages)
+            extension_pool.prefetch_title_extensions(titles)
+
         for page in actual_pages:
             if page.title_cache:
-                nodes.append(page_to_node(page, home, home_cut))
+                node = page_to_node(page, home, home_cut)
+                if menu_extensions:
+                    node.attr['extensions'] = extension_pool.get_extensions(page, page.get_title_obj(lang))
+                nodes.append(node)
         return nodes
 
+    def get_cache_vary(self, request):
+        return get_view_permission_profile(request, Site.objects.get_current())
+
 
 menu_pool.register_menu(CMSMenu)
 
@@ -292,6 +394,9 @@ class NavExtender(Modifier):
         exts = []
         # rearrange the parent relations
         home = None
+        namespaces = defaultdict(list)
+        for node in nodes:
+            namespaces[node.namespace].append(node)
         for node in nodes:
             if node.attr.get("is_home", False):
                 home = node
@@ -300,8 +405,8 @@ class NavExtender(Modifier):
                 for ext in extenders:
                     if not ext in exts:
                         exts.append(ext)
-                    for extnode in nodes:
-                        if extnode.namespace == ext and not extnode.parent_id:# if home has nav extenders but home is not visible
+                    for extnode in namespaces[ext]:
+                        if not extnode.parent_id:# if home has nav extenders but home is not visible
                             if node.attr.get("is_home", False) and not node.visible:
                                 extnode.parent_id = None
                                 extnode.parent_namespace = None
@@ -311,13 +416,11 @@ class NavExtender(Modifier):
                                 extnode.parent_namespace = node.namespace
                                 extnode.parent = node
                                 node.children.append(extnode)
-        removed = []
+        removed = set()
         # find all not assigned nodes
         for menu in menu_pool.menus.items():
             if hasattr(menu[1], 'cms_enabled') and menu[1].cms_enabled and not menu[0] in exts:
-                for node in nodes:
-                    if node.namespace == menu[0]:
-                        removed.append(node)
+                removed.update(namespaces[menu[0]])
         if breadcrumb:
         # if breadcrumb and home not in navigation add node
             if breadcrumb and home and not home.visible:
@@ -327,8 +430,8 @@ class NavExtender(Modifier):
                 else:
                     home.selected = False
                     # remove all nodes that are nav_extenders and not assigned
-        for node in removed:
-            nodes.remove(node)
+        if removed:
+            nodes = [node for node in nodes if node not in removed]
         return nodes
 
 
@@ -428,22 +531,28 @@ class SoftRootCutter(Modifier):
                 nodes = [selected] + nodes
             else:
                 # if it's not a soft root, walk ancestors (upwards!)
-                nodes = self.find_ancestors_and_remove_children(selected, nodes)
+                removed = set()
+                nodes = self.find_ancestors_and_remove_children(selected, nodes, removed)
+                if removed:
+                    nodes = [node for node in nodes if node not in removed]
         return nodes
 
-    def find_and_remove_children(self, node, nodes):
+    def find_and_remove_children(self, node, removed):
         for child in node.children:
             if child.attr.get("soft_root", False):
-                self.remove_children(child, nodes)
-        return nodes
+                self.remove_children(child, removed)
 
-    def remove_children(self, node, nodes):
+    def remove_children(self, node, removed):
+        """
+        Detaches the children of node, collecting all its descendants in
+        removed so they can be filtered out of the nodes in one go.
+        """
         for child in node.children:
-            nodes.remove(child)
-            self.remove_children(child, nodes)
+            removed.add(child)
+            self.remove_children(child, removed)
         node.children = []
 
-    def find_ancestors_and_remove_children(self, node, nodes):
+    def find_ancestors_and_remove_children(self, node, nodes, removed):
         """
         Check ancestors of node for soft roots
         """
@@ -453,14 +562,14 @@ class SoftRootCutter(Modifier):
                 node.parent.parent = None
                 nodes = [node.parent] + nodes
             else:
-                nodes = self.find_ancestors_and_remove_children(node.parent, nodes)
+                nodes = self.find_ancestors_and_remove_children(node.parent, nodes, removed)
         else:
             for newnode in nodes:
                 if newnode != node and not newnode.parent:
-                    self.find_and_remove_children(newnode, nodes)
+                    self.find_and_remove_children(newnode, removed)
         for child in node.children:
             if child != node:
-                self.find_and_remove_children(child, nodes)
+                self.find_and_remove_children(child, removed)
         return nodes
 
 
@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 from cms.appresolver import applications_page_check
+from cms.utils.identity_map import PageIdentityMap
 from django.utils.functional import SimpleLazyObject
 
 
@@ -18,4 +19,5 @@ def get_page(request):
 class CurrentPageMiddleware(object):
     def process_request(self, request):
         request.current_page = SimpleLazyObject(lambda: get_page(request))
+        request._page_identity_map = PageIdentityMap(request)
         return None
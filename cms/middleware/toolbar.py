@@ -2,10 +2,10 @@
 """
 Edit Toolbar middleware
 """
+from cms.cache.toolbar import pop_latest_log_entry
 from cms.plugin_pool import plugin_pool
 from cms.toolbar.toolbar import CMSToolbar
 from cms.utils.i18n import force_language
-from django.contrib.admin.models import LogEntry
 from menus.menu_pool import menu_pool
 from django.http import HttpResponse
 from django.template.loader import render_to_string
@@ -65,8 +65,6 @@ class ToolbarMiddleware(object):
                 request.session['cms_build'] = False
         if 'build' in request.GET and not request.session.get('cms_build', False):
             request.session['cms_build'] = True
-        if request.user.is_staff:
-            request.session['cms_log_entries'] = LogEntry.objects.filter(user=request.user).count()
         request.toolbar = CMSToolbar(request)
 
     def process_view(self, request, view_func, view_args, view_kwarg):
@@ -86,10 +84,9 @@ class ToolbarMiddleware(object):
         if found:
             add_never_cache_headers(response)
         if hasattr(request, 'user') and request.user.is_staff:
-            count = LogEntry.objects.filter(user=request.user).count()
-            if request.session.get('cms_log_entries', 0) < count:
-                request.session['cms_log_entries'] = count
-                log = LogEntry.objects.filter(user=request.user)[0]
-                if log.action_flag == 1 or log.action_flag == 2:
-                    request.session['cms_log_latest'] = log.pk
+            # remembered when the log entry was written, see
+            # cms.signals.toolbar
+            log_entry_id = pop_latest_log_entry(request.user.pk)
+            if log_entry_id is not None:
+                request.session['cms_log_latest'] = log_entry_id
         return response
@@ -15,7 +15,7 @@ from cms.utils.compat import DJANGO_1_5
 from cms.utils.compat.dj import force_unicode, python_2_unicode_compatible
 from cms.utils.compat.metaclasses import with_metaclass
 from cms.utils.conf import get_cms_setting
-from cms.utils.copy_plugins import copy_plugins_to
+from cms.utils.copy_plugins import sync_plugins
 from cms.utils.helpers import reversion_register
 from django.contrib.sites.models import Site
 from django.core.urlresolvers import reverse
@@ -237,25 +237,37 @@ class Page(with_metaclass(PageMetaClass, MPTTModel)):
     def _copy_contents(self, target, language):
         """
         Copy all the plugins to a new page.
+
+        Only the plugins which changed since they were last published (or
+        reverted) are written, see cms.utils.copy_plugins.sync_plugins.
         :param target: The page where the new content should be stored
         """
-        # TODO: Make this into a "graceful" copy instead of deleting and overwriting
-        # copy the placeholders (and plugins on those placeholders!)
         from cms.plugin_pool import plugin_pool
 
         plugin_pool.set_plugin_meta()
-        CMSPlugin.objects.filter(placeholder__page=target, language=language).delete()
+        target_placeholders = dict((ph.slot, ph) for ph in target.placeholders.all())
+        placeholders = {}
         for ph in self.placeholders.all():
-            plugins = ph.get_plugins_list(language)
             try:
-                ph = target.placeholders.get(slot=ph.slot)
-            except Placeholder.DoesNotExist:
-                ph.pk = None  # make a new instance
-                ph.save()
-                target.placeholders.add(ph)
-                # update the page copy
-            if plugins:
-                copy_plugins_to(plugins, ph)
+                placeholders[ph.pk] = target_placeholders[ph.slot]
+            except KeyError:
+                target_ph = Placeholder(slot=ph.slot, default_width=ph.default_width)
+                target_ph.save()
+                target.placeholders.add(target_ph)
+                placeholders[ph.pk] = target_ph
+        plugins = list(CMSPlugin.objects.filter(placeholder__in=list(placeholders), language=language).order_by(
+            'tree_id', 'lft'))
+        target_plugins = list(CMSPlugin.objects.filter(placeholder__page=target, language=language))
+        if self.publisher_is_draft:
+            # public plugins remember the draft plugin they were published from
+            matches = dict((plugin.lineage_id, plugin.pk) for plugin in target_plugins if plugin.lineage_id)
+            sync_plugins(plugins, target_plugins, placeholders, language, matches, set_lineage=True)
+        else:
+            matches = dict((plugin.pk, plugin.lineage_id) for plugin in plugins if plugin.lineage_id)
+            plugins_ziplist = sync_plugins(plugins, target_plugins, placeholders, language, matches)
+            for draft_plugin, plugin in plugins_ziplist:
+                if plugin.lineage_id != draft_plugin.pk:
+                    CMSPlugin.objects.filter(pk=plugin.pk).update(lineage_id=draft_plugin.pk)
 
     def _copy_attributes(self, target):
         """
@@ -278,7 +290,7 @@ class Page(with_metaclass(PageMetaClass, MPTTModel)):
         target.xframe_options = self.xframe_options
 
     def copy_page(self, target, site, position='first-child',
-                  copy_permissions=True):
+                  copy_permissions=True, progress=None):
         """
         Copy a page [ and all its descendants to a new location ]
         Doesn't checks for add page permissions anymore, this is done in PageAdmin.
@@ -289,122 +301,14 @@ class Page(with_metaclass(PageMetaClass, MPTTModel)):
 
         Note for issue #1166: when copying pages there is no need to check for
         conflicting URLs as pages are copied unpublished.
-        """
-
-        page_copy = None
 
-        pages = [self] + list(self.get_descendants().order_by('-rght'))
-
-        site_reverse_ids = Page.objects.filter(site=site, reverse_id__isnull=False).values_list('reverse_id', flat=True)
+        The copies are inserted in bulk, progress is called with the number
+        of pages copied so far and the number of pages to copy, see
+        cms.utils.copy_pages. Returns the copy of this page.
+        """
+        from cms.utils.copy_pages import copy_pages
 
-        if target:
-            target.old_pk = -1
-            if position == "first-child":
-                tree = [target]
-            elif target.parent_id:
-                tree = [target.parent]
-            else:
-                tree = []
-        else:
-            tree = []
-        if tree:
-            tree[0].old_pk = tree[0].pk
-
-        first = True
-        # loop over all affected pages (self is included in descendants)
-        for page in pages:
-            titles = list(page.title_set.all())
-            # get all current placeholders (->plugins)
-            placeholders = list(page.placeholders.all())
-            origin_id = page.id
-            # create a copy of this page by setting pk = None (=new instance)
-            page.old_pk = page.pk
-            page.pk = None
-            page.level = None
-            page.rght = None
-            page.lft = None
-            page.tree_id = None
-            page.publisher_public_id = None
-            page.is_home = False
-            # only set reverse_id on standard copy
-            if page.reverse_id in site_reverse_ids:
-                page.reverse_id = None
-            if first:
-                first = False
-                if tree:
-                    page.parent = tree[0]
-                else:
-                    page.parent = None
-                page.insert_at(target, position)
-            else:
-                count = 1
-                found = False
-                for prnt in tree:
-                    if prnt.old_pk == page.parent_id:
-                        page.parent = prnt
-                        tree = tree[0:count]
-                        found = True
-                        break
-                    count += 1
-                if not found:
-                    page.parent = None
-            tree.append(page)
-            page.site = site
-
-            page.save()
-
-            # copy permissions if necessary
-            if get_cms_setting('PERMISSION') and copy_permissions:
-                from cms.models.permissionmodels import PagePermission
-
-                for permission in PagePermission.objects.filter(page__id=origin_id):
-                    permission.pk = None
-                    permission.page = page
-                    permission.save()
-
-            # copy titles of this page
-            draft_titles = {}
-            public_titles = []
-            for title in titles:
-                if title.publisher_is_draft:
-                    title.pk = None  # setting pk = None creates a new instance
-                    title.page = page
-                    if title.publisher_public_id:
-                        draft_titles[title.publisher_public_id] = title
-                        title.publisher_public = None
-                        # create slug-copy for standard copy
-                    title.published = False
-                    title.slug = page_utils.get_available_slug(title)
-                    title.save()
-                else:
-                    public_titles.append(title)
-            for title in public_titles:
-                draft_title = draft_titles[title.pk]
-                title.pk = None  # setting pk = None creates a new instance
-                title.page = page
-                title.slug = page_utils.get_available_slug(title)
-                title.publisher_public_id = draft_title.pk
-                title.save()
-                draft_title.publisher_public = title
-                draft_title.save()
-
-            # copy the placeholders (and plugins on those placeholders!)
-            for ph in placeholders:
-                plugins = ph.get_plugins_list()
-                try:
-                    ph = page.placeholders.get(slot=ph.slot)
-                except Placeholder.DoesNotExist:
-                    ph.pk = None  # make a new instance
-                    ph.save()
-                    page.placeholders.add(ph)
-                    # update the page copy
-                    page_copy = page
-                if plugins:
-                    copy_plugins_to(plugins, ph)
-
-        # invalidate the menu for this site
-        menu_pool.clear(site_id=site.pk)
-        return page_copy  # return the page_copy or None
+        return copy_pages(self, target, site, position, copy_permissions, progress)
 
     def save(self, no_signals=False, commit=True, **kwargs):
         """
@@ -553,8 +457,10 @@ class Page(with_metaclass(PageMetaClass, MPTTModel)):
             if self.publisher_public_id:
                 # Ensure we have up to date mptt properties
                 public_page = Page.objects.get(pk=self.publisher_public_id)
+                old_cache_state = public_page._get_cache_state(language)
             else:
                 public_page = Page(created_by=self.created_by)
+                old_cache_state = None
             if not self.publication_date:
                 self.publication_date = now()
             self._copy_attributes(public_page)
@@ -585,6 +491,9 @@ class Page(with_metaclass(PageMetaClass, MPTTModel)):
 
             self.publisher_public = public_page
             published = True
+            # only content of this page changed, unless something shown on
+            # other pages (menus, links) changed as well
+            invalidate_all = old_cache_state != public_page._get_cache_state(language)
         else:
             # Nothing left to do
             pass
@@ -632,11 +541,32 @@ class Page(with_metaclass(PageMetaClass, MPTTModel)):
 
         cms_signals.post_publish.send(sender=Page, instance=self, language=language)
 
-        from cms.views import invalidate_cms_page_cache
-        invalidate_cms_page_cache()
+        if invalidate_all:
+            from cms.views import invalidate_cms_page_cache
+            invalidate_cms_page_cache()
+        else:
+            from cms.cache.page import get_page_tag, invalidate_tags
+            invalidate_tags([get_page_tag(self.publisher_public_id)])
 
         return published
 
+    def _get_cache_state(self, language):
+        """
+        Returns the state of this page which is rendered on other pages too
+        (menus, breadcrumbs, links). Used by publish to find out if only the
+        cached responses of this page have to be invalidated.
+        """
+        from cms.models.titlemodels import Title
+
+        titles = list(Title.objects.filter(page=self, language=language).values_list(
+            'title', 'menu_title', 'slug', 'path', 'redirect', 'published'))
+        return (
+            titles, self.parent_id, self.tree_id, self.lft, self.rght, self.in_navigation, self.soft_root,
+            self.reverse_id, self.navigation_extenders, self.login_required, self.limit_visibility_in_menu,
+            self.publication_date, self.publication_end_date, self.application_urls,
+            self.application_namespace,
+        )
+
     def unpublish(self, language):
         """
         Removes this page from the public site
@@ -666,8 +596,14 @@ class Page(with_metaclass(PageMetaClass, MPTTModel)):
         self.save()
         self.mark_descendants_pending(language)
 
-        from cms.views import invalidate_cms_page_cache
-        invalidate_cms_page_cache()
+        if self.in_navigation:
+            # the page disappears from the menus of all other pages
+            from cms.views import invalidate_cms_page_cache
+            invalidate_cms_page_cache()
+        else:
+            from cms.cache.page import get_page_tag, invalidate_tags
+            page_ids = public_page.get_descendants(include_self=True).values_list('pk', flat=True)
+            invalidate_tags([get_page_tag(page_id) for page_id in page_ids])
 
         from cms.signals import post_unpublish
         post_unpublish.send(sender=Page, instance=self, language=language)
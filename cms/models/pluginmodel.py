@@ -80,6 +80,8 @@ class CMSPlugin(with_metaclass(PluginModelBase, MPTTModel)):
     lft = models.PositiveIntegerField(db_index=True, editable=False)
     rght = models.PositiveIntegerField(db_index=True, editable=False)
     tree_id = models.PositiveIntegerField(db_index=True, editable=False)
+    # the pk of the draft plugin a public plugin was published from
+    lineage_id = models.PositiveIntegerField(blank=True, null=True, db_index=True, editable=False)
     child_plugin_instances = None
     translatable_content_excluded_fields = []
 
@@ -244,7 +246,7 @@ class CMSPlugin(with_metaclass(PluginModelBase, MPTTModel)):
 
     def set_base_attr(self, plugin):
         for attr in ['parent_id', 'placeholder', 'language', 'plugin_type', 'creation_date', 'level', 'lft', 'rght',
-            'position', 'tree_id']:
+            'position', 'tree_id', 'lineage_id']:
             setattr(plugin, attr, getattr(self, attr))
 
     def copy_plugin(self, target_placeholder, target_language, parent_cache):
@@ -310,6 +312,16 @@ class CMSPlugin(with_metaclass(PluginModelBase, MPTTModel)):
         """
         pass
 
+    @classmethod
+    def copy_relations_bulk(cls, new_old_ziplist):
+        """
+        Handle copying of the relations of all plugins of this model copied
+        at once by copy_plugins_to. Calls copy_relations on every copy, plugins
+        with many relations can override it to copy them in a few queries.
+        """
+        for new_instance, old_instance in new_old_ziplist:
+            new_instance.copy_relations(old_instance)
+
     def has_change_permission(self, request):
         page = self.placeholder.page if self.placeholder else None
         if page:
@@ -1,12 +1,11 @@
 import uuid
 from cms.utils.compat.dj import python_2_unicode_compatible
-from cms.utils.copy_plugins import copy_plugins_to
+from cms.utils.copy_plugins import sync_plugins
 
 from django.db import models
 from django.utils.translation import ugettext_lazy as _
 
 from cms.models.fields import PlaceholderField
-from cms.models.pluginmodel import CMSPlugin
 
 
 
@@ -55,11 +54,14 @@ class StaticPlaceholder(models.Model):
 
     def publish(self, request, language, force=False):
         if force or self.has_publish_permission(request):
-            CMSPlugin.objects.filter(placeholder=self.public, language=language).delete()
             plugins = self.draft.get_plugins_list(language=language)
-            copy_plugins_to(plugins, self.public)
+            public_plugins = self.public.get_plugins_list(language=language)
+            matches = dict((plugin.lineage_id, plugin.pk) for plugin in public_plugins if plugin.lineage_id)
+            sync_plugins(plugins, public_plugins, {self.draft.pk: self.public}, language, matches, set_lineage=True)
             self.dirty = False
             self.save()
+            from cms.cache.static_placeholder import invalidate_static_placeholders
+            invalidate_static_placeholders([self.code])
             return True
         return False
 
@@ -10,7 +10,6 @@ from cms.constants import PLUGIN_MOVE_ACTION, PLUGIN_COPY_ACTION
 from cms.utils import get_cms_setting
 from cms.utils.compat import DJANGO_1_4
 from cms.utils.compat.metaclasses import with_metaclass
-from cms.utils.placeholder import get_placeholder_conf
 from cms.utils.compat.dj import force_unicode, python_2_unicode_compatible
 from cms.exceptions import SubClassNeededError, Deprecated
 from cms.models import CMSPlugin
@@ -267,38 +266,24 @@ class CMSPluginBase(with_metaclass(CMSPluginBaseMetaclass, admin.ModelAdmin)):
         return fieldsets
 
     def get_child_classes(self, slot, page):
-        template = None
-        if page:
-            template = page.template
-
-        ## config overrides..
-        ph_conf = get_placeholder_conf('child_classes', slot, template, default={})
-        child_classes = ph_conf.get(self.__class__.__name__, None)
-        
+        from cms.plugin_pool import plugin_pool
+        child_classes = plugin_pool.get_render_plan(self.__class__, slot, page)['child_classes']
         if child_classes:
             return child_classes
-        if self.child_classes:
-            return self.child_classes
-        else:
-            from cms.plugin_pool import plugin_pool
-            installed_plugins = plugin_pool.get_all_plugins(slot, page)
-            return [cls.__name__ for cls in installed_plugins]
+        installed_plugins = plugin_pool.get_all_plugins(slot, page)
+        return [cls.__name__ for cls in installed_plugins]
 
     def get_parent_classes(self, slot, page):
-        template = None
-        if page:
-            template = page.template
+        from cms.plugin_pool import plugin_pool
+        return plugin_pool.get_render_plan(self.__class__, slot, page)['parent_classes']
 
-        ## config overrides..
-        ph_conf = get_placeholder_conf('parent_classes', slot, template, default={})
-        parent_classes = ph_conf.get(self.__class__.__name__, None)
-        
-        if parent_classes:
-            return parent_classes
-        elif self.parent_classes:
-            return self.parent_classes
-        else:
-            return None
+    def get_cache_vary(self, context, instance, placeholder):
+        """
+        Returns a string for everything besides the plugin instance itself and
+        the language the output of this plugin depends on, for example the
+        width from the context. Different values are cached separately.
+        """
+        return ''
 
     def get_action_options(self):
         return self.action_options
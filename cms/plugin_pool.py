@@ -11,6 +11,7 @@ from cms.utils.django_load import load, get_subclasses
 from cms.utils.helpers import reversion_register
 from cms.utils.placeholder import get_placeholder_conf
 from cms.utils.compat.dj import force_unicode
+from cms.utils.conf import get_cms_setting
 from django.conf import settings
 from django.core.exceptions import ImproperlyConfigured
 from django.conf.urls import url, patterns, include
@@ -26,6 +27,10 @@ class PluginPool(object):
         self.plugins = {}
         self.discovered = False
         self.patched = False
+        # render plans and plugin lists computed from the registered plugins
+        # and CMS_PLACEHOLDER_CONF, local to this process
+        self._render_plans = {}
+        self._render_plans_conf = None
 
     def discover_plugins(self):
         if self.discovered:
@@ -80,6 +85,7 @@ class PluginPool(object):
 
         plugin.value = plugin_name
         self.plugins[plugin_name] = plugin
+        self._render_plans = {}
         from cms.signals import pre_save_plugins, post_delete_plugins, pre_delete_plugins
 
         signals.pre_save.connect(pre_save_plugins, sender=plugin.model,
@@ -110,6 +116,7 @@ class PluginPool(object):
                 'The plugin %r is not registered' % plugin
             )
         del self.plugins[plugin_name]
+        self._render_plans = {}
 
     def set_plugin_meta(self):
         """
@@ -170,16 +177,52 @@ class PluginPool(object):
 
         self.patched = True
 
+    def _get_render_plans(self):
+        conf = get_cms_setting('PLACEHOLDER_CONF')
+        if conf is not self._render_plans_conf:
+            self._render_plans = {}
+            self._render_plans_conf = conf
+        return self._render_plans
+
+    def get_render_plan(self, plugin, slot, page):
+        """
+        Returns the child and parent classes configured for the given plugin
+        class in the given placeholder slot of the given page, in
+        CMS_PLACEHOLDER_CONF or on the plugin class, None if there are none.
+
+        Computed once per plugin class, slot and template, until a plugin
+        gets (un)registered or CMS_PLACEHOLDER_CONF gets changed.
+        """
+        template = page.template if page else None
+        plans = self._get_render_plans()
+        key = ('plan', plugin, slot, template)
+        if key not in plans:
+            child_classes = get_placeholder_conf('child_classes', slot, template, default={}).get(plugin.__name__)
+            parent_classes = get_placeholder_conf('parent_classes', slot, template, default={}).get(plugin.__name__)
+            plans[key] = {
+                'child_classes': child_classes or plugin.child_classes or None,
+                'parent_classes': parent_classes or plugin.parent_classes or None,
+            }
+        return plans[key]
+
     def get_all_plugins(self, placeholder=None, page=None, setting_key="plugins", include_page_only=True):
         self.discover_plugins()
         self.set_plugin_meta()
-        plugins = list(self.plugins.values())
-        plugins.sort(key=lambda obj: force_unicode(obj.name))
-        final_plugins = []
         if page:
             template = page.get_template()
         else:
             template = None
+        plans = self._get_render_plans()
+        key = ('plugins', placeholder, template, setting_key, include_page_only)
+        if key not in plans:
+            plans[key] = self._get_all_plugins(placeholder, template, setting_key, include_page_only)
+        # a copy, callers may change it
+        return list(plans[key])
+
+    def _get_all_plugins(self, placeholder, template, setting_key, include_page_only):
+        plugins = list(self.plugins.values())
+        plugins.sort(key=lambda obj: force_unicode(obj.name))
+        final_plugins = []
         allowed_plugins = get_placeholder_conf(
             setting_key,
             placeholder,
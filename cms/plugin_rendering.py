@@ -1,14 +1,20 @@
 # -*- coding: utf-8 -*-
+import hashlib
 from cms.models.placeholdermodel import Placeholder
 from cms.plugin_processors import (plugin_meta_context_processor, mark_safe_plugin_processor)
 from cms.utils import get_language_from_request
 from cms.utils.compat.type_checks import string_types
 from cms.utils.conf import get_cms_setting
 from cms.utils.django_load import iterload_objects
-from cms.utils.placeholder import get_placeholder_conf
+from cms.utils.placeholder import get_placeholder_conf, restore_sekizai_context
+from django.conf import settings
+from django.core.cache import cache
 from django.template import Template, Context
 from django.template.loader import render_to_string
+from django.utils.encoding import force_text
 from django.utils.safestring import mark_safe
+from django.utils.timezone import get_current_timezone_name
+from sekizai.helpers import Watcher
 
 
 # these are always called before all other plugin context processors
@@ -21,6 +27,21 @@ DEFAULT_PLUGIN_PROCESSORS = (
     mark_safe_plugin_processor,
 )
 
+# processor paths -> processors, local to this process
+_standard_processors = {}
+
+
+def get_standard_processors(setting):
+    """
+    Returns the processors listed in the given setting (PLUGIN_PROCESSORS or
+    PLUGIN_CONTEXT_PROCESSORS), imported once per process for every list of
+    paths the setting is set to.
+    """
+    paths = tuple(get_cms_setting(setting))
+    if paths not in _standard_processors:
+        _standard_processors[paths] = list(iterload_objects(paths))
+    return _standard_processors[paths]
+
 
 class PluginContext(Context):
     """
@@ -36,7 +57,7 @@ class PluginContext(Context):
             processors = []
         for processor in DEFAULT_PLUGIN_CONTEXT_PROCESSORS:
             self.update(processor(instance, placeholder, self))
-        for processor in iterload_objects(get_cms_setting('PLUGIN_CONTEXT_PROCESSORS')):
+        for processor in get_standard_processors('PLUGIN_CONTEXT_PROCESSORS'):
             self.update(processor(instance, placeholder, self))
         for processor in processors:
             self.update(processor(instance, placeholder, self))
@@ -55,7 +76,7 @@ def render_plugin(context, instance, placeholder, template, processors=None, cur
         content = template.render(context)
     else:
         content = ''
-    for processor in iterload_objects(get_cms_setting('PLUGIN_PROCESSORS')):
+    for processor in get_standard_processors('PLUGIN_PROCESSORS'):
         content = processor(instance, placeholder, content, context)
     for processor in processors:
         content = processor(instance, placeholder, content, context)
@@ -75,15 +96,98 @@ def render_plugins(plugins, context, placeholder, processors=None):
     """
     out = []
     total = len(plugins)
+    # plugins are never cached in edit mode, where the toolbar processors are used
+    use_cache = not processors and get_cms_setting('PLACEHOLDER_CACHE')
     for index, plugin in enumerate(plugins):
         plugin._render_meta.total = total
         plugin._render_meta.index = index
         context.push()
-        out.append(plugin.render_plugin(context, placeholder, processors=processors))
+        if use_cache:
+            out.append(render_cached_plugin(plugin, context, placeholder))
+        else:
+            out.append(plugin.render_plugin(context, placeholder, processors=processors))
         context.pop()
     return out
 
 
+def get_plugin_tree_changed_date(plugin):
+    """
+    Returns the newest changed_date of the plugin and its children, or None if
+    the plugin or any of its children must not be cached.
+    """
+    try:
+        plugin_class = plugin.get_plugin_class()
+    except KeyError:
+        return None
+    if not plugin_class.cache:
+        return None
+    if plugin.child_plugin_instances is None:
+        # the children were not loaded, so they could have changed
+        return None if plugin_class.allow_children else plugin.changed_date
+    changed_date = plugin.changed_date
+    for child in plugin.child_plugin_instances:
+        child_changed_date = get_plugin_tree_changed_date(child)
+        if child_changed_date is None:
+            return None
+        changed_date = max(changed_date, child_changed_date)
+    return changed_date
+
+
+def get_plugin_tree_structure(plugin):
+    """
+    Returns the position of the plugin among the plugins rendered with it and
+    the pk, parent and position of each of its descendants in render order,
+    so deleting, moving or reordering children changes the cache key even if
+    no changed_date does.
+    """
+    structure = [plugin._render_meta.index, plugin._render_meta.total]
+
+    def add_children(parent):
+        for child in parent.child_plugin_instances or ():
+            structure.append((child.pk, child.parent_id, child.position))
+            add_children(child)
+
+    add_children(plugin)
+    return structure
+
+
+def get_plugin_cache_key(plugin, changed_date, vary, structure=None):
+    cache_key = '%srender_plugin:%s.%s.%s' % (
+        get_cms_setting("CACHE_PREFIX"), plugin.pk, plugin.language, changed_date.strftime('%Y%m%d%H%M%S%f'))
+    if structure is None:
+        structure = get_plugin_tree_structure(plugin)
+    cache_key += '.%s' % hashlib.md5(force_text(structure).encode('utf-8')).hexdigest()
+    if vary:
+        cache_key += '.%s' % hashlib.md5(force_text(vary).encode('utf-8')).hexdigest()
+    if settings.USE_TZ:
+        tz_name = force_text(get_current_timezone_name(), errors='ignore')
+        cache_key += '.%s' % tz_name.encode('ascii', 'ignore').decode('ascii').replace(' ', '_')
+    return cache_key
+
+
+def render_cached_plugin(plugin, context, placeholder):
+    """
+    Renders a single plugin, reusing its output from the cache as long as
+    neither the plugin nor any of its children changed and its children are
+    the same, in the same order. Plugins with
+    ``cache = False`` (or such children) are always rendered.
+    """
+    changed_date = get_plugin_tree_changed_date(plugin)
+    if changed_date is None:
+        return plugin.render_plugin(context, placeholder)
+    vary = plugin.get_plugin_class_instance().get_cache_vary(context, plugin, placeholder)
+    cache_key = get_plugin_cache_key(plugin, changed_date, vary)
+    cached_value = cache.get(cache_key)
+    if cached_value is not None:
+        restore_sekizai_context(context, cached_value['sekizai'])
+        return mark_safe(cached_value['content'])
+    watcher = Watcher(context)
+    content = plugin.render_plugin(context, placeholder)
+    cache.set(cache_key, {'content': force_text(content), 'sekizai': watcher.get_changes()},
+              get_cms_setting('CACHE_DURATIONS')['content'])
+    return content
+
+
 def render_placeholder(placeholder, context_to_copy, name_fallback="Placeholder", lang=None, default=None):
     """
     Renders plugins for a placeholder on the given page using shallow copies of the
@@ -95,7 +199,7 @@ def render_placeholder(placeholder, context_to_copy, name_fallback="Placeholder"
     context = context_to_copy
     context.push()
     request = context['request']
-    if not hasattr(request, 'placeholder'):
+    if not hasattr(request, 'placeholders'):
         request.placeholders = []
     request.placeholders.append(placeholder)
     if hasattr(placeholder, 'content_cache'):
@@ -121,8 +225,8 @@ def render_placeholder(placeholder, context_to_copy, name_fallback="Placeholder"
         processors = (toolbar_plugin_processor,)
     else:
         processors = None
-    if get_cms_setting('PLACEHOLDER_CACHE'):
-        from django.core.cache import cache
+    use_cache = get_cms_setting('PLACEHOLDER_CACHE')
+    if use_cache:
         cache_key = placeholder.get_cache_key(lang)
         if not edit and placeholder and not hasattr(placeholder, 'cache_checked'):
             cached_value = cache.get(cache_key)
@@ -170,7 +274,7 @@ def render_placeholder(placeholder, context_to_copy, name_fallback="Placeholder"
     context['placeholder'] = toolbar_content
     context['edit'] = edit
     result = render_to_string("cms/toolbar/content.html", context)
-    if placeholder and not edit and placeholder.cache_placeholder:
+    if use_cache and not edit and placeholder.cache_placeholder:
         cache.set(cache_key, result, get_cms_setting('CACHE_DURATIONS')['content'])
     context.pop()
     return result
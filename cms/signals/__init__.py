@@ -1,17 +1,21 @@
 # -*- coding: utf-8 -*-
+from cms.appresolver import check_app_urls
 from cms.signals.apphook import debug_server_restart
 from cms.signals.page import pre_save_page, post_save_page, pre_delete_page, post_delete_page, post_moved_page
-from cms.signals.permissions import post_save_user, post_save_user_group, pre_save_user, pre_delete_user, pre_save_group, pre_delete_group, pre_save_pagepermission, pre_delete_pagepermission, pre_save_globalpagepermission, pre_delete_globalpagepermission
-from cms.signals.placeholder import pre_delete_placeholder_ref, post_delete_placeholder_ref
+from cms.signals.permissions import post_save_user, post_save_user_group, pre_save_user, pre_delete_user, pre_save_group, pre_delete_group, pre_save_pagepermission, pre_delete_pagepermission, post_save_pagepermission, post_delete_pagepermission, pre_save_globalpagepermission, pre_delete_globalpagepermission
+from cms.signals.placeholder import pre_delete_placeholder_ref, post_delete_placeholder_ref, post_delete_static_placeholder
 from cms.signals.plugins import post_delete_plugins, pre_save_plugins, pre_delete_plugins
 from cms.signals.reversion_signals import post_revision
 from cms.signals.title import pre_save_title, post_save_title, pre_delete_title, post_delete_title
+from cms.signals.toolbar import post_save_log_entry, post_save_user_settings, post_delete_user_settings
 from cms.utils.conf import get_cms_setting
+from django.core.signals import request_started
 from django.db.models import signals
 from django.dispatch import Signal
 
-from cms.models import Page, Title, CMSPlugin, PagePermission, GlobalPagePermission, PageUser, PageUserGroup, PlaceholderReference
+from cms.models import Page, Title, CMSPlugin, PagePermission, GlobalPagePermission, PageUser, PageUserGroup, PlaceholderReference, StaticPlaceholder, UserSettings
 from django.conf import settings
+from django.contrib.admin.models import LogEntry
 from django.contrib.auth.models import User, Group
 
 #################### Our own signals ###################
@@ -30,6 +34,9 @@ urls_need_reloading = Signal(providing_args=[])
 if settings.DEBUG:
     urls_need_reloading.connect(debug_server_restart)
 
+# rebuild the app patterns of this process once apphooks changed in any process
+request_started.connect(check_app_urls, dispatch_uid='cms_check_app_urls')
+
 ######################### plugins #######################
 
 signals.pre_delete.connect(pre_delete_plugins, sender=CMSPlugin, dispatch_uid='cms_pre_delete_plugin')
@@ -57,9 +64,24 @@ signals.pre_delete.connect(pre_delete_placeholder_ref, sender=PlaceholderReferen
                            dispatch_uid='cms_pre_delete_placeholder_ref')
 signals.post_delete.connect(post_delete_placeholder_ref, sender=PlaceholderReference,
                             dispatch_uid='cms_post_delete_placeholder_ref')
+signals.post_delete.connect(post_delete_static_placeholder, sender=StaticPlaceholder,
+                            dispatch_uid='cms_post_delete_static_placeholder')
+
+######################## toolbar ########################
+
+signals.post_save.connect(post_save_log_entry, sender=LogEntry, dispatch_uid='cms_post_save_log_entry')
+signals.post_save.connect(post_save_user_settings, sender=UserSettings, dispatch_uid='cms_post_save_user_settings')
+signals.post_delete.connect(post_delete_user_settings, sender=UserSettings,
+                            dispatch_uid='cms_post_delete_user_settings')
 
 ###################### permissions #######################
 
+# the menu reads the view restrictions whether or not permissions are in use
+signals.post_save.connect(post_save_pagepermission, sender=PagePermission,
+                          dispatch_uid='cms_post_save_pagepermission')
+signals.post_delete.connect(post_delete_pagepermission, sender=PagePermission,
+                            dispatch_uid='cms_post_delete_pagepermission')
+
 if get_cms_setting('PERMISSION'):
     # only if permissions are in use
     signals.pre_save.connect(pre_save_user, sender=User, dispatch_uid='cms_pre_save_user')
@@ -48,6 +48,9 @@ def apphook_post_title_checker(instance, **kwargs):
         new_values = (
             instance.published, instance.page.application_urls, instance.page.application_namespace, instance.path)
         if old_values != new_values:
+            from cms.cache.page import get_apphook_tag, invalidate_tags
+            invalidate_tags(get_apphook_tag(application_urls) for application_urls in
+                            set([old_title.page.application_urls, instance.page.application_urls]) if application_urls)
             request_finished.connect(trigger_restart, dispatch_uid=DISPATCH_UID)
 
 
@@ -78,9 +81,12 @@ logger = logging.getLogger(__name__)
 
 
 def trigger_restart(**kwargs):
+    from cms.cache.page import invalidate_app_urls
     from cms.signals import urls_need_reloading
 
     request_finished.disconnect(trigger_restart, dispatch_uid=DISPATCH_UID)
+    # all processes rebuild their app patterns with their next request
+    invalidate_app_urls()
     urls_need_reloading.send(sender=None)
 
 
@@ -1,8 +1,9 @@
 # -*- coding: utf-8 -*-
+from cms.cache.page import invalidate_path_index
 from cms.cache.permissions import clear_permission_cache
 from cms.exceptions import NoHomeFound
 from cms.signals.apphook import apphook_post_delete_page_checker, apphook_post_page_checker
-from cms.signals.title import update_title, update_title_paths
+from cms.signals.title import update_descendant_paths, update_title_paths
 from django.core.exceptions import ObjectDoesNotExist
 
 from cms.models import Page
@@ -23,12 +24,10 @@ def post_save_page(instance, **kwargs):
     if not kwargs.get('raw'):
         instance.rescan_placeholders()
     update_home(instance)
+    if not instance.publisher_is_draft:
+        invalidate_path_index()
     if instance.old_page is None or instance.old_page.parent_id != instance.parent_id or instance.is_home != instance.old_page.is_home:
-        for page in instance.get_descendants(include_self=True):
-            for title in page.title_set.all().select_related('page'):
-                update_title(title)
-                title._publisher_keep_state = True
-                title.save()
+        update_descendant_paths(instance, include_self=True)
     if (instance.old_page is None and instance.application_urls) or (instance.old_page and (
                 instance.old_page.application_urls != instance.application_urls or instance.old_page.application_namespace != instance.application_namespace)):
         if instance.publisher_public_id and instance.publisher_is_draft:
@@ -57,12 +56,15 @@ def pre_delete_page(instance, **kwargs):
 
 def post_delete_page(instance, **kwargs):
     update_home(instance, **kwargs)
+    invalidate_path_index()
     apphook_post_delete_page_checker(instance)
 
 
 def post_moved_page(instance, **kwargs):
     update_title_paths(instance, **kwargs)
     update_home(instance, **kwargs)
+    if not instance.publisher_is_draft:
+        invalidate_path_index()
 
 
 def update_home(instance, **kwargs):
@@ -1,8 +1,10 @@
 # -*- coding: utf-8 -*-
 
-from cms.cache.permissions import clear_user_permission_cache, clear_permission_cache
+from cms.cache.permissions import clear_user_permission_cache, clear_permission_cache, \
+    clear_view_restrictions_cache
 from cms.models import PageUser, PageUserGroup
 from cms.compat import user_related_name
+from django.core.exceptions import ObjectDoesNotExist
 from menus.menu_pool import menu_pool
 
 
@@ -79,6 +81,24 @@ def pre_delete_pagepermission(instance, **kwargs):
     _clear_users_permissions(instance)
 
 
+def _clear_view_restrictions(instance):
+    try:
+        site_id = instance.page.site_id
+    except ObjectDoesNotExist:
+        # deleted together with its page, which cleans the permission cache
+        return
+    clear_view_restrictions_cache(site_id)
+    menu_pool.clear(site_id)
+
+
+def post_save_pagepermission(instance, raw, **kwargs):
+    _clear_view_restrictions(instance)
+
+
+def post_delete_pagepermission(instance, **kwargs):
+    _clear_view_restrictions(instance)
+
+
 def pre_save_globalpagepermission(instance, raw, **kwargs):
     _clear_users_permissions(instance)
     menu_pool.clear(all=True)
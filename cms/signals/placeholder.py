@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+from cms.cache.static_placeholder import invalidate_static_placeholders
 from cms.models import Placeholder
 
 
@@ -8,3 +9,7 @@ def pre_delete_placeholder_ref(instance, **kwargs):
 
 def post_delete_placeholder_ref(instance, **kwargs):
     Placeholder.objects.filter(pk=instance.placeholder_ref_id_later).delete()
+
+
+def post_delete_static_placeholder(instance, **kwargs):
+    invalidate_static_placeholders([instance.code])
@@ -1,10 +1,31 @@
 # -*- coding: utf-8 -*-
+from django.db.models import Q
+
+from cms.cache.page import get_placeholder_tag, invalidate_tags
+from cms.cache.static_placeholder import invalidate_static_placeholders
 from cms.constants import PUBLISHER_STATE_DIRTY
 from cms.models import CMSPlugin, Title, Page, StaticPlaceholder, Placeholder
 
 
-def pre_save_plugins(**kwargs):
+def mark_placeholder_changed(placeholder, language):
+    """
+    Invalidates the cached content of a placeholder in a language and marks
+    the page or static placeholder it belongs to as changed.
+    """
     from django.core.cache import cache
+    cache.delete(placeholder.get_cache_key(language))
+    invalidate_tags([get_placeholder_tag(placeholder.pk)])
+    attached_model = placeholder._get_attached_model()
+    if attached_model == Page:
+        Title.objects.filter(page=placeholder.page, language=language).update(
+            publisher_state=PUBLISHER_STATE_DIRTY)
+    if attached_model == StaticPlaceholder:
+        StaticPlaceholder.objects.filter(draft=placeholder).update(dirty=True)
+        invalidate_static_placeholders(StaticPlaceholder.objects.filter(
+            Q(draft=placeholder) | Q(public=placeholder)).values_list('code', flat=True))
+
+
+def pre_save_plugins(**kwargs):
     plugin = kwargs['instance']
     placeholder = None
     if plugin.placeholder:
@@ -15,13 +36,7 @@ def pre_save_plugins(**kwargs):
     elif plugin.placeholder_id:
         placeholder = Placeholder.objects.get(pk=plugin.placeholder_id)
     if placeholder:
-        cache.delete(placeholder.get_cache_key(plugin.language))
-        attached_model = placeholder._get_attached_model()
-        if attached_model == Page:
-            Title.objects.filter(page=plugin.placeholder.page, language=plugin.language).update(
-                publisher_state=PUBLISHER_STATE_DIRTY)
-        if attached_model == StaticPlaceholder:
-            StaticPlaceholder.objects.filter(draft=placeholder).update(dirty=True)
+        mark_placeholder_changed(placeholder, plugin.language)
     if plugin.pk:
         try:
             old_plugin = CMSPlugin.objects.get(pk=plugin.pk)
@@ -37,7 +52,6 @@ def pre_save_plugins(**kwargs):
 
 
 def pre_delete_plugins(**kwargs):
-    from django.core.cache import cache
     plugin = kwargs['instance']
     if hasattr(plugin, '_no_reorder'):
         return
@@ -48,13 +62,7 @@ def pre_delete_plugins(**kwargs):
         except Placeholder.DoesNotExist:
             pass
     if placeholder:
-        cache.delete(placeholder.get_cache_key(plugin.language))
-        attached_model = placeholder._get_attached_model()
-        if attached_model == Page:
-            Title.objects.filter(page=plugin.placeholder.page, language=plugin.language).update(
-                publisher_state=PUBLISHER_STATE_DIRTY)
-        if attached_model == StaticPlaceholder:
-            StaticPlaceholder.objects.filter(draft=plugin.placeholder_id).update(dirty=True)
+        mark_placeholder_changed(placeholder, plugin.language)
 
 
 def post_delete_plugins(**kwargs):
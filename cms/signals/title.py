@@ -1,15 +1,22 @@
 # -*- coding: utf-8 -*-
+from django.core.signals import request_finished
+from django.db import connections, router, transaction
 
-from cms.models import Title
-from cms.signals.apphook import apphook_pre_title_checker, apphook_post_title_checker, apphook_post_delete_title_checker
+from cms.cache.page import get_apphook_tag, get_page_tag, invalidate_tags, invalidate_path_index
+from cms.models import Page, Title
+from cms.signals.apphook import (apphook_pre_title_checker, apphook_post_title_checker,
+                                 apphook_post_delete_title_checker, trigger_restart, DISPATCH_UID)
+from cms.utils.compat import DJANGO_1_5
+from cms.utils.i18n import get_fallback_languages
 from menus.menu_pool import menu_pool
 
+BATCH_SIZE = 100
+
 
 def update_title_paths(instance, **kwargs):
     """Update child pages paths in case when page was moved.
     """
-    for title in instance.title_set.all():
-        title.save()
+    update_descendant_paths(instance, include_self=True)
 
 
 def update_title(title):
@@ -26,6 +33,95 @@ def update_title(title):
                 title.path = (u'%s/%s' % (parent_title.path, slug)).lstrip("/")
 
 
+def update_descendant_paths(page, include_self=False):
+    """
+    Recomputes the paths of the titles of all descendants of page (and of page
+    itself if include_self is set) in one pass over the tree. Only the paths
+    which changed are written, without saving the titles one by one, and the
+    caches are invalidated once for the whole subtree.
+    """
+    paths = {}
+    if include_self and page.parent_id:
+        for language, path in Title.objects.filter(page=page.parent_id).values_list('language', 'path'):
+            paths[page.parent_id, language] = path
+    # the tree fields of the given instance may be stale after a move
+    tree_id, lft, rght = Page.objects.filter(pk=page.pk).values_list('tree_id', 'lft', 'rght')[0]
+    titles = Title.objects.filter(
+        page__tree_id=tree_id,
+        page__lft__gte=lft,
+        page__rght__lte=rght,
+    ).order_by('page__lft').values_list(
+        'pk', 'page', 'page__parent', 'page__is_home', 'page__application_urls', 'publisher_is_draft',
+        'language', 'slug', 'path', 'has_url_overwrite'
+    )
+    fallbacks = {}
+    changed = []
+    # parents come before their children, so their paths are up to date
+    # when the paths of the children are built from them
+    for (pk, page_id, parent_id, is_home, application_urls, publisher_is_draft,
+         language, slug, path, has_url_overwrite) in titles:
+        if page_id != page.pk or include_self:
+            if is_home:
+                new_path = ''
+            elif has_url_overwrite:
+                new_path = path
+            else:
+                new_path = slug
+                if parent_id:
+                    parent_path = paths.get((parent_id, language))
+                    if parent_path is None:
+                        if language not in fallbacks:
+                            fallbacks[language] = get_fallback_languages(language, site_id=page.site_id)
+                        for fallback in fallbacks[language]:
+                            if (parent_id, fallback) in paths:
+                                parent_path = paths[parent_id, fallback]
+                                break
+                    if parent_path is not None:
+                        new_path = (u'%s/%s' % (parent_path, slug)).lstrip("/")
+            if new_path != path:
+                changed.append((pk, page_id, application_urls, publisher_is_draft, new_path))
+                path = new_path
+        paths[page_id, language] = path
+    if not changed:
+        return
+    _update_paths([(pk, new_path) for pk, page_id, application_urls, publisher_is_draft, new_path in changed])
+    public = [(page_id, application_urls) for pk, page_id, application_urls, publisher_is_draft, new_path in changed
+              if not publisher_is_draft]
+    if public:
+        menu_pool.clear(page.site_id)
+        invalidate_path_index()
+        tags = set(get_page_tag(page_id) for page_id, application_urls in public)
+        apphooks = set(get_apphook_tag(application_urls) for page_id, application_urls in public if application_urls)
+        invalidate_tags(tags | apphooks)
+        if apphooks:
+            request_finished.connect(trigger_restart, dispatch_uid=DISPATCH_UID)
+
+
+def _update_paths(paths):
+    """
+    Writes the given (pk, path) pairs with one UPDATE per batch of titles.
+    """
+    using = router.db_for_write(Title)
+    connection = connections[using]
+    table = connection.ops.quote_name(Title._meta.db_table)
+    column = connection.ops.quote_name(Title._meta.get_field('path').column)
+    pk_column = connection.ops.quote_name(Title._meta.pk.column)
+    cursor = connection.cursor()
+    for start in range(0, len(paths), BATCH_SIZE):
+        batch = paths[start:start + BATCH_SIZE]
+        params = []
+        for pk, path in batch:
+            params.extend([pk, path])
+        params.extend(pk for pk, path in batch)
+        cursor.execute("UPDATE %s SET %s = CASE %s %s END WHERE %s IN (%s)" % (
+            table, column, pk_column, " ".join(["WHEN %s THEN %s"] * len(batch)),
+            pk_column, ", ".join(["%s"] * len(batch))
+        ), params)
+    if DJANGO_1_5:
+        # like QuerySet.update does outside of managed transactions
+        transaction.commit_unless_managed(using=using)
+
+
 def pre_save_title(instance, raw, **kwargs):
     """Save old state to instance and setup path
     """
@@ -56,26 +152,14 @@ def pre_save_title(instance, raw, **kwargs):
 
 def post_save_title(instance, raw, created, **kwargs):
     # Update descendants only if path changed
-    prevent_descendants = hasattr(instance, 'tmp_prevent_descendant_update')
-    if instance.path != getattr(instance, 'tmp_path', None) and not prevent_descendants:
-        descendant_titles = Title.objects.filter(
-            page__lft__gt=instance.page.lft,
-            page__rght__lt=instance.page.rght,
-            page__tree_id__exact=instance.page.tree_id,
-            language=instance.language,
-            has_url_overwrite=False, # TODO: what if child has no url overwrite?
-        ).order_by('page__tree_id', 'page__parent', 'page__lft')
-
-        for descendant_title in descendant_titles:
-            descendant_title.path = ''  # just reset path
-            descendant_title.tmp_prevent_descendant_update = True
-            descendant_title._publisher_keep_state = True
-            descendant_title.save()
-            # remove temporary attributes
+    if instance.path != getattr(instance, 'tmp_path', None):
+        # titles in other languages may fall back to this one for their path
+        update_descendant_paths(instance.page)
     if hasattr(instance, 'tmp_path'):
         del instance.tmp_path
-    if prevent_descendants:
-        del instance.tmp_prevent_descendant_update
+    if not instance.publisher_is_draft:
+        invalidate_tags([get_page_tag(instance.page_id)])
+        invalidate_path_index()
     apphook_post_title_checker(instance, **kwargs)
 
 
@@ -96,4 +180,7 @@ def pre_delete_title(instance, **kwargs):
 
 
 def post_delete_title(instance, **kwargs):
-    apphook_post_delete_title_checker(instance, **kwargs)
\ No newline at end of file
+    if not instance.publisher_is_draft:
+        invalidate_tags([get_page_tag(instance.page_id)])
+        invalidate_path_index()
+    apphook_post_delete_title_checker(instance, **kwargs)
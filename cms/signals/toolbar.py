@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+from django.contrib.admin.models import ADDITION, CHANGE
+
+from cms.cache.toolbar import invalidate_user_settings, pop_latest_log_entry, set_latest_log_entry
+
+
+def post_save_log_entry(instance, created, **kwargs):
+    if not created:
+        return
+    if instance.action_flag in (ADDITION, CHANGE):
+        set_latest_log_entry(instance.user_id, instance.pk)
+    else:
+        pop_latest_log_entry(instance.user_id)
+
+
+def post_save_user_settings(instance, **kwargs):
+    invalidate_user_settings(instance.user_id)
+
+
+def post_delete_user_settings(instance, **kwargs):
+    invalidate_user_settings(instance.user_id)
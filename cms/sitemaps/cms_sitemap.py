@@ -1,7 +1,11 @@
 # -*- coding: utf-8 -*-
+from django.conf import settings
 from django.contrib.sitemaps import Sitemap
-from django.utils import translation
-from cms.models import Title
+from django.core.urlresolvers import reverse
+from django.db.models import Max
+from django.utils.encoding import iri_to_uri
+from cms.models import CMSPlugin, Title
+from cms.utils.i18n import force_language
 
 
 def from_iterable(iterables):
@@ -18,19 +22,45 @@ class CMSSitemap(Sitemap):
     priority = 0.5
 
     def items(self):
-        all_titles = Title.objects.public().filter(page__login_required=False)
+        # instances may be reused for many requests, the dates and urls are
+        # only remembered while the sitemap is built once
+        self._plugin_dates = None
+        self._roots = {}
+        all_titles = Title.objects.public().filter(page__login_required=False).select_related('page').order_by(
+            'page__tree_id', 'page__lft', 'language')
         return all_titles
 
+    def get_plugin_dates(self):
+        """
+        Returns the date the newest plugin of each public page was changed,
+        by page id, looked up with one query for all pages.
+        """
+        if getattr(self, '_plugin_dates', None) is None:
+            self._plugin_dates = dict(CMSPlugin.objects.filter(
+                placeholder__page__publisher_is_draft=False, placeholder__page__login_required=False
+            ).values_list('placeholder__page').annotate(changed_date=Max('changed_date')))
+        return self._plugin_dates
+
     def lastmod(self, title):
-        modification_dates = [title.page.changed_date, title.page.publication_date]
-        plugins_for_placeholder = lambda placeholder: placeholder.get_plugins()
-        plugins = from_iterable(map(plugins_for_placeholder, title.page.placeholders.all()))
-        plugin_modification_dates = map(lambda plugin: plugin.changed_date, plugins)
-        modification_dates.extend(plugin_modification_dates)
-        return max(modification_dates)
+        modification_dates = [title.page.changed_date, title.page.publication_date,
+                              self.get_plugin_dates().get(title.page_id)]
+        return max(date for date in modification_dates if date)
+
+    def get_root(self, language):
+        # the url of the pages root in each language, cms.urls puts the urls
+        # of all other pages below it
+        if not hasattr(self, '_roots'):
+            self._roots = {}
+        if language not in self._roots:
+            with force_language(language):
+                self._roots[language] = reverse('pages-root')
+        return self._roots[language]
 
     def location(self, title):
-        translation.activate(title.language)
-        url = title.page.get_absolute_url(title.language)
-        translation.deactivate()
+        url = self.get_root(title.language)
+        if title.page.is_home:
+            return url
+        url += iri_to_uri(title.path or title.slug)
+        if settings.APPEND_SLASH:
+            url += '/'
         return url
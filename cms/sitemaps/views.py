@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+from django.contrib.sites.models import get_current_site
+from django.core.paginator import EmptyPage, PageNotAnInteger
+from django.core.urlresolvers import reverse
+from django.http import Http404, HttpResponse
+from django.utils.encoding import force_text
+from django.utils.html import escape
+
+from cms.cache.page import get_path_index_generation
+from cms.utils import get_cms_setting
+from cms.utils.compat import DJANGO_1_4
+
+if DJANGO_1_4:
+    # an iterator passed to HttpResponse is streamed as well
+    StreamingHttpResponse = HttpResponse
+else:
+    from django.http import StreamingHttpResponse
+
+CONTENT_TYPE = 'application/xml'
+
+URLSET_START = u'<?xml version="1.0" encoding="UTF-8"?>\n' \
+               u'<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+URLSET_END = u'</urlset>\n'
+
+
+def get_sitemap_cache_key(generation, domain, protocol, section, page):
+    return "%s:sitemap:%s:%s:%s:%s:%s" % (get_cms_setting('CACHE_PREFIX'), generation, protocol, domain,
+                                          section or '', page)
+
+
+def _get(sitemap, name, item):
+    attr = getattr(sitemap, name, None)
+    if callable(attr):
+        return attr(item)
+    return attr
+
+
+def _render_urls(pages, domain, protocol):
+    yield URLSET_START
+    for sitemap, page in pages:
+        for item in page.object_list:
+            url = [u'<url><loc>%s://%s%s</loc>' % (protocol, escape(domain), escape(_get(sitemap, 'location', item)))]
+            lastmod = _get(sitemap, 'lastmod', item)
+            if lastmod:
+                url.append(u'<lastmod>%s</lastmod>' % lastmod.strftime('%Y-%m-%d'))
+            changefreq = _get(sitemap, 'changefreq', item)
+            if changefreq:
+                url.append(u'<changefreq>%s</changefreq>' % escape(changefreq))
+            priority = _get(sitemap, 'priority', item)
+            if priority is not None:
+                url.append(u'<priority>%s</priority>' % escape(force_text(priority)))
+            url.append(u'</url>\n')
+            yield u''.join(url)
+    yield URLSET_END
+
+
+def _cache_content(content, cache_key):
+    from django.core.cache import cache
+    chunks = []
+    for chunk in content:
+        chunks.append(chunk)
+        yield chunk
+    # only complete sitemaps end up in the cache
+    cache.set(cache_key, u''.join(chunks), get_cms_setting('CACHE_DURATIONS')['content'])
+
+
+def sitemap(request, sitemaps, section=None):
+    """
+    Renders the urls of the given sitemaps (of one section of them) like
+    django.contrib.sitemaps.views.sitemap, a page (?p=) at a time. The urls
+    are streamed to the client while they are looked up, and the rendered
+    sitemap is cached until a public page changes.
+    """
+    from django.core.cache import cache
+
+    if section is not None:
+        if section not in sitemaps:
+            raise Http404("No sitemap available for section: %r" % section)
+        sections = [sitemaps[section]]
+    else:
+        sections = [sitemaps[name] for name in sorted(sitemaps)]
+    page_number = request.GET.get("p", 1)
+    site = get_current_site(request)
+    protocol = 'https' if request.is_secure() else 'http'
+
+    generation = get_path_index_generation()
+    if generation is not None:
+        cache_key = get_sitemap_cache_key(generation, site.domain, protocol, section, page_number)
+        content = cache.get(cache_key)
+        if content is not None:
+            return HttpResponse(content, content_type=CONTENT_TYPE)
+
+    # check the page number before starting the response
+    pages = []
+    for site_map in sections:
+        if callable(site_map):
+            site_map = site_map()
+        try:
+            pages.append((site_map, site_map.paginator.page(page_number)))
+        except EmptyPage:
+            raise Http404("Page %s empty" % page_number)
+        except PageNotAnInteger:
+            raise Http404("No page '%s'" % page_number)
+    content = _render_urls(pages, site.domain, protocol)
+    if generation is not None:
+        content = _cache_content(content, cache_key)
+    return StreamingHttpResponse(content, content_type=CONTENT_TYPE)
+
+
+def index(request, sitemaps, sitemap_url_name='cms.sitemaps.views.sitemap'):
+    """
+    Renders a sitemap index with the url of every page of every section of
+    the given sitemaps, like django.contrib.sitemaps.views.index.
+    """
+    site = get_current_site(request)
+    protocol = 'https' if request.is_secure() else 'http'
+    content = [u'<?xml version="1.0" encoding="UTF-8"?>\n'
+               u'<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n']
+    for section in sorted(sitemaps):
+        site_map = sitemaps[section]
+        if callable(site_map):
+            site_map = site_map()
+        url = '%s://%s%s' % (protocol, site.domain, reverse(sitemap_url_name, kwargs={'section': section}))
+        urls = [url] + ['%s?p=%s' % (url, page) for page in range(2, site_map.paginator.num_pages + 1)]
+        for url in urls:
+            content.append(u'<sitemap><loc>%s</loc></sitemap>\n' % escape(url))
+    content.append(u'</sitemapindex>\n')
+    return HttpResponse(u''.join(content), content_type=CONTENT_TYPE)
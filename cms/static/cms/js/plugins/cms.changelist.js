@@ -471,14 +471,7 @@ $(document).ready(function () {
                 jtarget.addClass("loading");
                 var pageId = $(jtarget).attr("id").split("page_")[1];
 
-                $.get(admin_base_url + "cms/page/" + pageId + "/descendants/", {}, function(r, status) {
-                    jtarget.children('ul').append(r);
-                    // show move targets if needed
-                    if($('span.move-target-container:visible').length > 0) {
-                        jtarget.children('ul').find('a.move-target, span.move-target-container, span.line').show();
-                    };
-                    reCalc();
-                });
+                loadChildren(jtarget, pageId, 0);
             }else{
                 reCalc();
             }
@@ -573,6 +566,10 @@ $(document).ready(function () {
             if(status==200) {
                 // reload tree
                 window.location = window.location.href;
+            }else if(status==202) {
+                // big trees are copied in the background, the response is
+                // the url reporting the progress of the copy
+                pollCopyStatus(item_id, response);
             }else{
                 alert(response);
                 moveError($('#page_'+item_id + " div.col1:eq(0)"),response);
@@ -580,6 +577,48 @@ $(document).ready(function () {
         });
     }
 
+    function loadChildren(jtarget, pageId, offset) {
+        // the tree view returns the children a page at a time
+        $.getJSON(admin_base_url + "cms/page/tree/", { node: pageId, offset: offset, html: 1 }, function(data) {
+            var children = jtarget.children('ul');
+            $.each(data.nodes, function(i, node) {
+                children.append(node.html);
+            });
+            offset += data.nodes.length;
+            if(data.nodes.length && offset < data.count) {
+                loadChildren(jtarget, pageId, offset);
+                return;
+            }
+            children.children('li').removeClass('last').last().addClass('last');
+            // show move targets if needed
+            if($('span.move-target-container:visible').length > 0) {
+                children.find('a.move-target, span.move-target-container, span.line').show();
+            };
+            reCalc();
+        }).fail(function() {
+            jtarget.removeClass("loading");
+            moveError(jtarget.find("div.col1:eq(0)"));
+        });
+    }
+
+    function pollCopyStatus(item_id, url) {
+        $.getJSON(url, function(state) {
+            if(!state.finished) {
+                $('#page_'+item_id + " div.col1:eq(0)").attr('title', state.done + ' / ' + state.total);
+                setTimeout(function() { pollCopyStatus(item_id, url); }, 1000);
+            }else if(state.error) {
+                alert(state.error);
+                moveError($('#page_'+item_id + " div.col1:eq(0)"), state.error);
+            }else{
+                // reload tree
+                window.location = window.location.href;
+            }
+        }).fail(function() {
+            // the copy is unknown, e.g. to a process not sharing the cache
+            moveError($('#page_'+item_id + " div.col1:eq(0)"));
+        });
+    }
+
     function mark_copy_node(id){
         $('a.move-target, span.move-target-container, span.line').show();
         $('#page_'+id).addClass("selected");
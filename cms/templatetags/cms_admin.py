@@ -6,7 +6,7 @@ from classytags.core import Options, Tag
 from classytags.helpers import InclusionTag
 from cms.constants import PUBLISHER_STATE_PENDING
 from cms.utils import get_cms_setting
-from cms.utils.admin import get_admin_menu_item_context
+from cms.utils.admin import get_admin_menu_item_context, get_page_publish_state
 from cms.utils.permissions import get_any_page_view_permissions
 from django import template
 from django.conf import settings
@@ -60,6 +60,15 @@ class ShowAdminMenu(InclusionTag):
 register.tag(ShowAdminMenu)
 
 
+PUBLISH_STATE_TEXTS = {
+    "dirty": _("unpublished changes"),
+    "published": _("published"),
+    "unpublishedparent": _("unpublished parent"),
+    "unpublished": _("unpublished"),
+    "empty": _("no content"),
+}
+
+
 class TreePublishRow(Tag):
     name = "tree_publish_row"
     options = Options(
@@ -68,26 +77,8 @@ class TreePublishRow(Tag):
     )
 
     def render_tag(self, context, page, language):
-        if page.is_published(language) and page.publisher_public_id and page.publisher_public.is_published(language):
-            if page.is_dirty(language):
-                cls = "dirty"
-                text = _("unpublished changes")
-            else:
-                cls = "published"
-                text = _("published")
-        else:
-
-            if language in page.languages:
-                if page.publisher_public_id and page.publisher_public.get_publisher_state(
-                    language) == PUBLISHER_STATE_PENDING:
-                    cls = "unpublishedparent"
-                    text = _("unpublished parent")
-                else:
-                    cls = "unpublished"
-                    text = _("unpublished")
-            else:
-                cls = "empty"
-                text = _("no content")
+        cls = get_page_publish_state(page, language)
+        text = PUBLISH_STATE_TEXTS[cls]
         return mark_safe('<span class="%s" title="%s"></span>' % (cls, force_unicode(text)))
 
 
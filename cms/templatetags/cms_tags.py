@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+from collections import defaultdict
 from copy import copy
 from itertools import chain
 from datetime import datetime
@@ -8,30 +9,33 @@ from classytags.core import Options, Tag
 from classytags.helpers import InclusionTag, AsTag
 from classytags.parser import Parser
 from cms import __version__
+from cms.cache.static_placeholder import (get_static_placeholder, get_static_placeholder_content,
+                                          set_static_placeholder_content)
 from cms.exceptions import PlaceholderNotFound
 from cms.models import Page, Placeholder as PlaceholderModel, CMSPlugin, StaticPlaceholder
 from cms.plugin_pool import plugin_pool
 from cms.plugin_rendering import render_placeholder
-from cms.utils.plugins import get_plugins, assign_plugins
+from cms.utils.plugins import get_plugins, assign_plugins, get_placeholders
 from cms.utils import get_language_from_request, get_cms_setting, get_site_id
 from cms.utils.compat.type_checks import string_types, int_types
 from cms.utils.i18n import force_language
+from cms.utils.identity_map import get_identity_map
 from cms.utils.moderator import use_draft
 from cms.utils.page_resolver import get_page_queryset
-from cms.utils.placeholder import validate_placeholder_name, get_toolbar_plugin_struct
+from cms.utils.placeholder import validate_placeholder_name, get_toolbar_plugin_struct, restore_sekizai_context
 from django import template
 from django.conf import settings
 from django.contrib.sites.models import Site
 from django.core.mail import mail_managers
 from django.core.urlresolvers import reverse
 from django.template.loader import render_to_string
-from django.utils.encoding import smart_text
+from django.utils.encoding import force_text, smart_text
 from django.utils.html import escape
 from django.utils.http import urlencode
 from django.utils.safestring import mark_safe
 from django.utils.translation import ugettext_lazy as _, get_language
 import re
-from sekizai.helpers import Watcher, get_varname
+from sekizai.helpers import Watcher
 from sekizai.templatetags.sekizai_tags import SekizaiParser, RenderBlock
 
 register = template.Library()
@@ -83,6 +87,10 @@ def _get_page_by_untyped_arg(page_lookup, request, site_id):
         raise TypeError('The page_lookup argument can be either a Dictionary, Integer, Page, or String.')
     page_lookup.update({'site': site_id})
     try:
+        if request and set(page_lookup) == set(['pk', 'site']) and isinstance(page_lookup['pk'], int_types):
+            return get_identity_map(request).get_by_pk(page_lookup['pk'], site_id)
+        if request and set(page_lookup) == set(['reverse_id', 'site']):
+            return get_identity_map(request).get_by_reverse_id(page_lookup['reverse_id'], site_id)
         if 'pk' in page_lookup:
             page = Page.objects.all().get(**page_lookup)
             if request and use_draft(request):
@@ -149,41 +157,106 @@ register.tag(PageUrl)
 register.tag('page_id_url', PageUrl)
 
 
-def _get_placeholder(current_page, page, context, name):
+class PrefetchPages(Tag):
+    """
+    Looks up the pages with the given lookup arguments (pks or reverse_ids)
+    with one query for all of them, so the page_url, page_attribute and
+    show_placeholder tags using them later on don't query one page at a
+    time. Renders nothing.
+
+    lookups -- a list of pks and reverse_ids
+    site -- the site of the pages, the current site if omitted
+    """
+    name = 'prefetch_pages'
+    options = Options(
+        Argument('lookups'),
+        Argument('site', required=False, default=None),
+    )
+
+    def render_tag(self, context, lookups, site):
+        request = context.get('request', False)
+        if request and lookups:
+            get_identity_map(request).prefetch(lookups, get_site_id(site))
+        return ''
+
+
+register.tag(PrefetchPages)
+
+
+def _get_placeholders(current_page, pages, context):
+    """
+    Looks up the placeholders of those of the given pages not looked up yet
+    while rendering current_page, with one query for all of them, and fetches
+    the plugins of the placeholders whose content isn't cached with one
+    query per template and plugin type. Missing placeholders are created,
+    like Page.rescan_placeholders does.
+
+    Returns the {page pk: {slot: placeholder}} cache of current_page.
+    """
     from django.core.cache import cache
     placeholder_cache = getattr(current_page, '_tmp_placeholders_cache', {})
-    if page.pk in placeholder_cache:
-        placeholder = placeholder_cache[page.pk].get(name, None)
-        if placeholder:
-            return placeholder
-    placeholder_cache[page.pk] = {}
-    placeholders = page.rescan_placeholders().values()
+    pages = [page for page in pages if page.pk not in placeholder_cache]
+    if not pages:
+        return placeholder_cache
+    found = defaultdict(dict)
+    relations = Page.placeholders.through.objects.filter(page__in=[page.pk for page in pages])
+    for relation in relations.select_related('placeholder'):
+        found[relation.page_id][relation.placeholder.slot] = relation.placeholder
+    placeholders = []
+    templates = {}
+    for page in pages:
+        template = page.get_template()
+        placeholder_cache[page.pk] = {}
+        for slot in get_placeholders(template):
+            placeholder = found[page.pk].get(slot)
+            if placeholder is None:
+                placeholder = PlaceholderModel.objects.create(slot=slot)
+                page.placeholders.add(placeholder)
+            placeholder.page = page
+            placeholder_cache[page.pk][slot] = placeholder
+            placeholders.append(placeholder)
+            templates[placeholder.pk] = template
     fetch_placeholders = []
     request = context['request']
     if not get_cms_setting('PLACEHOLDER_CACHE') or (hasattr(request, 'toolbar') and request.toolbar.edit_mode):
         fetch_placeholders = placeholders
     else:
+        cache_keys = dict((placeholder.pk, placeholder.get_cache_key(get_language())) for placeholder in placeholders)
+        cached = cache.get_many(list(cache_keys.values()))
         for placeholder in placeholders:
-            cache_key = placeholder.get_cache_key(get_language())
-            content = cache.get(cache_key)
+            content = cached.get(cache_keys[placeholder.pk])
             if not content is None:
                 placeholder.content_cache = content
             else:
                 fetch_placeholders.append(placeholder)
             placeholder.cache_checked = True
-    if fetch_placeholders:
-        assign_plugins(context['request'], fetch_placeholders, page.get_template(),  get_language())
-    for placeholder in placeholders:
-        placeholder_cache[page.pk][placeholder.slot] = placeholder
-        placeholder.page = page
+    by_template = defaultdict(list)
+    for placeholder in fetch_placeholders:
+        by_template[templates[placeholder.pk]].append(placeholder)
+    for template, template_placeholders in by_template.items():
+        assign_plugins(request, template_placeholders, template, get_language())
     current_page._tmp_placeholders_cache = placeholder_cache
-    placeholder = placeholder_cache[page.pk].get(name, None)
+    return placeholder_cache
+
+
+def _get_placeholder(current_page, page, context, name):
+    placeholder = _get_placeholders(current_page, [page], context)[page.pk].get(name, None)
     if page.application_urls and not placeholder:
         raise PlaceholderNotFound(
             '"%s" placeholder not found in an apphook application. Please use a static placeholder instead.' % name)
     return placeholder
 
 
+def _register_placeholder(request, placeholder):
+    """
+    Remembers a placeholder served from the placeholder cache, so the page
+    cache knows the page depends on it.
+    """
+    if not hasattr(request, 'placeholders'):
+        request.placeholders = []
+    request.placeholders.append(placeholder)
+
+
 def get_placeholder_content(context, request, current_page, name, inherit, default):
     from django.core.cache import cache
     edit_mode = getattr(request, 'toolbar', None) and getattr(request.toolbar, 'edit_mode')
@@ -192,18 +265,22 @@ def get_placeholder_content(context, request, current_page, name, inherit, defau
     # mistakenly edit/delete them. This is a fix for issue #1303. See the discussion
     # there for possible enhancements
     if inherit and not edit_mode:
-        pages = chain([current_page], current_page.get_cached_ancestors(ascending=True))
+        pages = list(chain([current_page], current_page.get_cached_ancestors(ascending=True)))
+        # the placeholders and plugins of all pages at once
+        _get_placeholders(current_page, pages, context)
     for page in pages:
         placeholder = _get_placeholder(current_page, page, context, name)
         if placeholder is None:
             continue
         if not edit_mode and get_cms_setting('PLACEHOLDER_CACHE'):
             if hasattr(placeholder, 'content_cache'):
+                _register_placeholder(request, placeholder)
                 return mark_safe(placeholder.content_cache)
             if not hasattr(placeholder, 'cache_checked'):
                 cache_key = placeholder.get_cache_key(get_language())
                 cached_value = cache.get(cache_key)
                 if not cached_value is None:
+                    _register_placeholder(request, placeholder)
                     return mark_safe(cached_value)
         if not get_plugins(request, placeholder, page.get_template()):
             continue
@@ -468,15 +545,6 @@ class CleanAdminListFilter(InclusionTag):
         return {'title': spec.title(), 'choices': unique_choices}
 
 
-def _restore_sekizai(context, changes):
-    varname = get_varname()
-    sekizai_container = context[varname]
-    for key, values in changes.items():
-        sekizai_namespace = sekizai_container[key]
-        for value in values:
-            sekizai_namespace.append(value)
-
-
 def _show_placeholder_for_page(context, placeholder_name, page_lookup, lang=None,
                                site=None, cache_result=True):
     """
@@ -504,7 +572,7 @@ def _show_placeholder_for_page(context, placeholder_name, page_lookup, lang=None
         cache_key = _clean_key('%s_placeholder:%s' % (base_key, placeholder_name))
         cached_value = cache.get(cache_key)
         if isinstance(cached_value, dict): # new style
-            _restore_sekizai(context, cached_value['sekizai'])
+            restore_sekizai_context(context, cached_value['sekizai'])
             return {'content': mark_safe(cached_value['content'])}
         elif isinstance(cached_value, string_types): # old style
             return {'content': mark_safe(cached_value)}
@@ -968,26 +1036,44 @@ class StaticPlaceholderNode(Tag):
             if nodelist:
                 return nodelist.render(context)
             return ''
-            # TODO: caching?
         request = context.get('request', False)
         if not request:
             if nodelist:
                 return nodelist.render(context)
             return ''
+        edit_mode = request.toolbar.edit_mode
         if isinstance(code, StaticPlaceholder):
             static_placeholder = code
-        else:
+        elif edit_mode:
+            # the toolbar needs to know whether the draft is dirty
             static_placeholder, __ = StaticPlaceholder.objects.get_or_create(code=code, defaults={'name': code,
                 'creation_method': StaticPlaceholder.CREATION_BY_TEMPLATE})
+        else:
+            # the static placeholder and its content are cached per process,
+            # so its plugins are only fetched once after it changes
+            static_placeholder = get_static_placeholder(code)
         if not hasattr(request, 'static_placeholders'):
             request.static_placeholders = []
         request.static_placeholders.append(static_placeholder)
-        if request.toolbar.edit_mode:
+        if edit_mode:
             placeholder = static_placeholder.draft
         else:
             placeholder = static_placeholder.public
         placeholder.is_static = True
+        use_cache = (not edit_mode and get_cms_setting('PLACEHOLDER_CACHE') and
+                     hasattr(static_placeholder, 'cache_version'))
+        if use_cache:
+            language = get_language_from_request(request)
+            cached_value = get_static_placeholder_content(static_placeholder, language)
+            if cached_value is not None:
+                _register_placeholder(request, placeholder)
+                restore_sekizai_context(context, cached_value['sekizai'])
+                return mark_safe(cached_value['content'])
+            watcher = Watcher(context)
         content = render_placeholder(placeholder, context, name_fallback=code, default=nodelist)
+        if use_cache and placeholder.cache_placeholder:
+            set_static_placeholder_content(static_placeholder, language,
+                                           {'content': force_text(content), 'sekizai': watcher.get_changes()})
         return content
 
 
@@ -1009,7 +1095,7 @@ class RenderPlaceholder(Tag):
             return ''
         if not placeholder:
             return ''
-        if not hasattr(request, 'placeholder'):
+        if not hasattr(request, 'placeholders'):
             request.placeholders = []
         request.placeholders.append(placeholder)
         return safe(placeholder.render(context, width, lang=language))
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+Micro benchmarks for the performance sensitive parts of django CMS.
+
+Every function named ``benchmark_<name>`` in this module can be run with
+``python develop.py benchmark [<name>...]``.
+"""
+from __future__ import print_function
+import random
+import time
+
+
+def _report(label, seconds, count):
+    print("  %-24s %8.3fs %12.0f/s" % (label, seconds, count / max(seconds, 1e-9)))
+
+
+def benchmark_menu_tree(sizes=(1000, 10000, 100000)):
+    """
+    Builds menus of random trees with their nodes in random order.
+    """
+    from menus.base import NavigationNode
+    from menus.menu_pool import _build_nodes_inner_for_one_menu
+
+    print("Menu tree build (nodes per second):")
+    for size in sizes:
+        nodes = []
+        for index in range(1, size + 1):
+            parent_id = random.randint(0, index - 1) or None
+            nodes.append(NavigationNode(str(index), '/%s/' % index, index, parent_id))
+        random.shuffle(nodes)
+        start = time.time()
+        _build_nodes_inner_for_one_menu(nodes, 'Benchmark')
+        _report("%s nodes" % size, time.time() - start, size)
+
+
+def benchmark_app_resolvers(sizes=(10, 100, 1000), lookups=1000):
+    """
+    Resolves random paths below pages with apphooks to the ids of these pages,
+    trying every resolver and looking the resolvers up by path prefix.
+    """
+    from django.conf.urls import patterns, url
+    from django.core.urlresolvers import Resolver404
+    from cms.appresolver import (AppRegexURLResolver, build_app_resolver_index, get_app_resolvers,
+                                 recurse_patterns)
+    from cms.utils.i18n import force_language
+
+    view = lambda request: None
+    app_patterns = patterns('',
+                            url(r'^$', view),
+                            url(r'^(?P<pk>\d+)/$', view),
+                            url(r'^archive/(?P<year>\d{4})/$', view))
+
+    def resolve(resolvers, path):
+        for resolver in resolvers:
+            try:
+                return resolver.resolve_page_id(path)
+            except Resolver404:
+                pass
+
+    print("Apphook resolution (paths per second):")
+    with force_language('en'):
+        for size in sizes:
+            resolvers = []
+            for page_id in range(1, size + 1):
+                prefix = 'section-%s/app-%s/' % (page_id % 10, page_id)
+                resolver = AppRegexURLResolver(r'', 'app_resolver')
+                resolver.page_id = page_id
+                resolver.url_patterns_dict['en'] = patterns('', *recurse_patterns(prefix, app_patterns, page_id))
+                resolver.url_prefixes_dict['en'] = prefix
+                resolvers.append(resolver)
+            index = build_app_resolver_index(resolvers)
+            paths = ['section-%s/app-%s/%s/' % (page_id % 10, page_id, page_id)
+                     for page_id in (random.randint(1, size) for __ in range(lookups))]
+            start = time.time()
+            for path in paths:
+                resolve(resolvers, path)
+            _report("%s apphooks, all" % size, time.time() - start, lookups)
+            start = time.time()
+            for path in paths:
+                resolve(get_app_resolvers(path, index), path)
+            _report("%s apphooks, indexed" % size, time.time() - start, lookups)
@@ -24,6 +24,10 @@ class SampleAppMenu(Menu):
         except NoReverseMatch:
             pass
         return nodes
+
+    def get_cache_vary(self, request):
+        # the same nodes for all users
+        return ''
     
 menu_pool.register_menu(SampleAppMenu)
 
@@ -41,6 +45,10 @@ class StaticMenu(CMSAttachMenu):
         nodes.append(n4)
         return nodes
 
+    def get_cache_vary(self, request):
+        # the same nodes for all users
+        return ''
+
 menu_pool.register_menu(StaticMenu)
     
 class StaticMenu2(CMSAttachMenu):
@@ -57,5 +65,9 @@ class StaticMenu2(CMSAttachMenu):
         nodes.append(n4)
         return nodes
 
+    def get_cache_vary(self, request):
+        # the same nodes for all users
+        return ''
+
 menu_pool.register_menu(StaticMenu2)
     
@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 from cms.compat import get_user_model
 from cms.models import Page
+from cms.signals.apphook import trigger_restart, DISPATCH_UID
 from cms.test_utils.util.context_managers import (UserLoginContext,
     SettingsOverride)
 from django.conf import settings
@@ -8,6 +9,7 @@ from django.contrib.auth.models import AnonymousUser, Permission
 from django.contrib.sites.models import Site
 from django.core.cache import cache
 from django.core.exceptions import ObjectDoesNotExist
+from django.core.signals import request_finished
 from django.core.urlresolvers import reverse
 from django.template.context import Context
 from django.test import testcases
@@ -95,6 +97,9 @@ class BaseCMSTestCase(object):
         # Needed to clean the menu keys cache, see menu.menu_pool.clear()
         menu_pool.clear()
         cache.clear()
+        # apphook changes made without a request would otherwise reload the
+        # apphook urls after the first request of the next test
+        request_finished.disconnect(trigger_restart, dispatch_uid=DISPATCH_UID)
         super(BaseCMSTestCase, self)._post_teardown()
         set_current_user(None)
 
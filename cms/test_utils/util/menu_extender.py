@@ -19,4 +19,8 @@ class TestMenu(CMSAttachMenu):
         nodes.append(n4)
         return nodes
 
+    def get_cache_vary(self, request):
+        # the same nodes for all users
+        return ''
+
 menu_pool.register_menu(TestMenu)
@@ -23,18 +23,21 @@ from cms.test_utils import testcases as base
 from cms.test_utils.testcases import CMSTestCase, URL_CMS_PAGE_DELETE, URL_CMS_PAGE, URL_CMS_TRANSLATION_DELETE
 from cms.test_utils.util.context_managers import SettingsOverride
 from cms.utils import get_cms_setting
-from cms.utils.compat import DJANGO_1_4
+from cms.utils.compat import DJANGO_1_4, DJANGO_1_5
+from django.conf import settings
 from django.contrib import admin
 from django.contrib.admin.models import LogEntry
 from django.contrib.admin.sites import site
 from django.contrib.auth.models import Permission, AnonymousUser
 from django.contrib.sites.models import Site
+from django.core.cache import cache
 from django.core.urlresolvers import reverse
 from django.http import (Http404, HttpResponseBadRequest, HttpResponseForbidden, HttpResponse)
 from django.utils.datastructures import MultiValueDictKeyError
 from django.utils.encoding import smart_str
 from django.utils import timezone
 from cms.utils.compat.dj import force_unicode
+from menus.menu_pool import menu_pool
 
 
 class AdminTestsBase(CMSTestCase):
@@ -72,6 +75,16 @@ class AdminTestsBase(CMSTestCase):
             gpp.sites = Site.objects.all()
         return admin, normal_guy
 
+    def _clear_cache(self, user):
+        """
+        Clears the cache and the menus, and logs user in again, as the test
+        sessions are stored in the cache.
+        """
+        cache.clear()
+        menu_pool.clear()
+        username = getattr(user, get_user_model().USERNAME_FIELD)
+        self.assertTrue(self.client.login(username=username, password=username))
+
 
 class AdminTestCase(AdminTestsBase):
     def test_permissioned_page_list(self):
@@ -499,6 +512,113 @@ class AdminTestCase(AdminTestsBase):
         # but not any further down the tree
         self.assertNotContains(response, 'id="page_%s"' % third_level_page.pk)
 
+    def test_changelist_open_nodes(self):
+        admin = self.get_superuser()
+        first_level_page = create_page('level1', 'nav_playground.html', 'en')
+        second_level_page = create_page('level2', "nav_playground.html", "en",
+                                        created_by=admin, published=True, parent=first_level_page)
+        third_level_page = create_page('level3', "nav_playground.html", "en",
+                                       created_by=admin, published=True, parent=second_level_page)
+        url = reverse('admin:cms_%s_changelist' % Page._meta.module_name)
+        cache.clear()
+        menu_pool.clear()
+
+        with self.login_user_context(admin):
+            # only the root pages and the children of opened nodes are rendered
+            self.client.cookies['djangocms_nodes_open'] = 'page_%s' % first_level_page.pk
+            self.client.get(url)
+            self._clear_cache(admin)
+            with self.assertNumQueries(FuzzyInt(1, 60)) as context:
+                response = self.client.get(url)
+                if DJANGO_1_5:
+                    num_queries = len(context.connection.queries) - context.starting_queries
+                else:
+                    num_queries = len(context.captured_queries)
+            self.assertContains(response, 'id="page_%s"' % first_level_page.pk)
+            self.assertContains(response, 'id="page_%s"' % second_level_page.pk)
+            self.assertNotContains(response, 'id="page_%s"' % third_level_page.pk)
+
+            # the number of queries does not depend on the pages in closed nodes
+            for i in range(3):
+                create_page('level3%s' % i, "nav_playground.html", "en", created_by=admin, published=True,
+                            parent=self.reload(second_level_page))
+            self._clear_cache(admin)
+            with self.assertNumQueries(num_queries):
+                response = self.client.get(url)
+            self.assertNotContains(response, 'id="page_%s"' % third_level_page.pk)
+
+            self.client.cookies['djangocms_nodes_open'] = 'page_%s%%2Cpage_%s' % (first_level_page.pk,
+                                                                                 second_level_page.pk)
+            response = self.client.get(url)
+            self.assertContains(response, 'id="page_%s"' % third_level_page.pk)
+
+            # the children of nodes whose parent is closed are not rendered
+            self.client.cookies['djangocms_nodes_open'] = 'page_%s' % second_level_page.pk
+            response = self.client.get(url)
+            self.assertNotContains(response, 'id="page_%s"' % second_level_page.pk)
+            self.assertNotContains(response, 'id="page_%s"' % third_level_page.pk)
+
+    def test_tree_json(self):
+        admin = self.get_superuser()
+        first_level_page = create_page('level1', 'nav_playground.html', 'en')
+        second_level_page_top = create_page('level21', "nav_playground.html", "en",
+                                            created_by=admin, published=True, parent=first_level_page)
+        second_level_page_bottom = create_page('level22', "nav_playground.html", "en",
+                                               created_by=admin, published=True, parent=self.reload(first_level_page))
+        create_page('level3', "nav_playground.html", "en",
+                    created_by=admin, published=True, parent=second_level_page_top)
+        url = reverse('admin:cms_page_tree')
+        cache.clear()
+        menu_pool.clear()
+
+        with self.login_user_context(admin):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            data = json.loads(response.content.decode('utf8'))
+            self.assertEqual(data['count'], 1)
+            node = data['nodes'][0]
+            self.assertEqual(node['id'], first_level_page.pk)
+            self.assertTrue(node['has_children'])
+            self.assertEqual(node['titles'], {'en': 'level1'})
+            self.assertEqual(node['publish_states']['en'], 'unpublished')
+            self.assertTrue(node['can_change'])
+
+            self._clear_cache(admin)
+            with self.assertNumQueries(FuzzyInt(1, 20)) as context:
+                response = self.client.get(url, {'node': first_level_page.pk})
+                if DJANGO_1_5:
+                    num_queries = len(context.connection.queries) - context.starting_queries
+                else:
+                    num_queries = len(context.captured_queries)
+            data = json.loads(response.content.decode('utf8'))
+            self.assertEqual(data['count'], 2)
+            self.assertEqual([node['id'] for node in data['nodes']],
+                             [second_level_page_top.pk, second_level_page_bottom.pk])
+            self.assertEqual([node['has_children'] for node in data['nodes']], [True, False])
+            self.assertFalse('html' in data['nodes'][0])
+
+            # the number of queries does not depend on the number of pages
+            for i in range(3):
+                create_page('level2%s' % i, "nav_playground.html", "en", created_by=admin, published=True,
+                            parent=self.reload(first_level_page))
+            self._clear_cache(admin)
+            with self.assertNumQueries(num_queries):
+                response = self.client.get(url, {'node': first_level_page.pk})
+            data = json.loads(response.content.decode('utf8'))
+            self.assertEqual(data['count'], 5)
+
+            response = self.client.get(url, {'node': second_level_page_top.pk, 'html': 1})
+            data = json.loads(response.content.decode('utf8'))
+            self.assertTrue('id="page_%s"' % data['nodes'][0]['id'] in data['nodes'][0]['html'])
+
+            response = self.client.get(url, {'node': first_level_page.pk, 'offset': 1, 'limit': 1})
+            data = json.loads(response.content.decode('utf8'))
+            self.assertEqual(data['count'], 5)
+            self.assertEqual([node['id'] for node in data['nodes']], [second_level_page_bottom.pk])
+
+            response = self.client.get(url, {'offset': 'x'})
+            self.assertEqual(response.status_code, 400)
+
     def test_unihandecode_doesnt_break_404_in_admin(self):
         admin = self.get_superuser()
 
@@ -708,6 +828,66 @@ class AdminTests(AdminTestsBase):
         self.assertEquals(sub_col.language, "de")
         self.assertEquals(sub_col.parent_id, col2.pk)
 
+    def test_move_plugin_tree(self):
+        page = self.get_page()
+        source, target = list(page.placeholders.all())[:2]
+        col = add_plugin(source, 'MultiColumnPlugin', 'en')
+        sub_cols = [add_plugin(source, 'ColumnPlugin', 'en', target=col) for i in range(10)]
+        first = add_plugin(target, 'TextPlugin', 'en', body='first')
+        second = add_plugin(target, 'TextPlugin', 'en', body='second')
+        page.publish('en')
+
+        admin = self.get_admin()
+        with self.login_user_context(admin):
+            request = self.get_request(post_data={'plugin_id': col.pk,
+                'placeholder_id': target.id, 'plugin_parent': '', 'plugin_language': 'en',
+                'plugin_order[]': [second.pk, col.pk, first.pk]})
+            # the number of queries does not depend on the number of plugins
+            # moved, unlike the revision of the page made after the move
+            apps = [app for app in settings.INSTALLED_APPS if app != 'reversion']
+            with SettingsOverride(INSTALLED_APPS=apps):
+                with self.assertNumQueries(FuzzyInt(10, 25)):
+                    response = self.admin_class.move_plugin(request)
+            self.assertEquals(response.status_code, 200)
+        for sub_col in CMSPlugin.objects.filter(pk__in=[sub_col.pk for sub_col in sub_cols]):
+            self.assertEqual(sub_col.placeholder_id, target.pk)
+            self.assertEqual(sub_col.parent_id, col.pk)
+        positions = dict(CMSPlugin.objects.filter(placeholder=target, parent=None).values_list('pk', 'position'))
+        self.assertEqual(positions, {second.pk: 0, col.pk: 1, first.pk: 2})
+        self.assertTrue(self.reload(page).is_dirty('en'))
+
+        with self.login_user_context(admin):
+            request = self.get_request(post_data={'plugin_id': col.pk,
+                'placeholder_id': target.id, 'plugin_parent': '', 'plugin_language': 'en',
+                'plugin_order[]': [second.pk, col.pk]})
+            response = self.admin_class.move_plugin(request)
+            self.assertEquals(response.status_code, 400)
+
+    def test_move_plugin_changed_date(self):
+        page = self.get_page()
+        source, target = list(page.placeholders.all())[:2]
+        col = add_plugin(source, 'MultiColumnPlugin', 'en')
+        moved = add_plugin(source, 'ColumnPlugin', 'en', target=col)
+        add_plugin(source, 'ColumnPlugin', 'en', target=col)
+        target_col = add_plugin(target, 'MultiColumnPlugin', 'en')
+        sibling = add_plugin(target, 'ColumnPlugin', 'en', target=target_col)
+        sub_col = add_plugin(target, 'ColumnPlugin', 'en', target=sibling)
+        past = timezone.now() - datetime.timedelta(days=1)
+        CMSPlugin.objects.all().update(changed_date=past)
+
+        admin = self.get_admin()
+        with self.login_user_context(admin):
+            request = self.get_request(post_data={'plugin_id': moved.pk,
+                'placeholder_id': target.id, 'plugin_parent': target_col.pk, 'plugin_language': 'en',
+                'plugin_order[]': [moved.pk, sibling.pk]})
+            response = self.admin_class.move_plugin(request)
+            self.assertEquals(response.status_code, 200)
+        changed_dates = dict(CMSPlugin.objects.values_list('pk', 'changed_date'))
+        # the moved plugin, the reordered level and both parents
+        for pk in (moved.pk, sibling.pk, col.pk, target_col.pk):
+            self.assertTrue(changed_dates[pk] > past + datetime.timedelta(hours=1))
+        self.assertTrue(changed_dates[sub_col.pk] < past + datetime.timedelta(hours=1))
+
     def test_preview_page(self):
         permless = self.get_permless()
         with self.login_user_context(permless):
@@ -1287,8 +1467,9 @@ class AdminFormsTests(AdminTestsBase):
             self.assertIn('<b>Test</b>', output)
         with self.assertNumQueries(FuzzyInt(18, 34)):
             output = force_unicode(self.client.get('/en/?edit').content)
-        with self.assertNumQueries(FuzzyInt(13, 15)):
+        with self.assertNumQueries(FuzzyInt(6, 9)):
             output = force_unicode(self.client.get('/en/').content)
+        self.assertEqual(output.count('<b>Test</b>'), 6)
 
     def test_tree_view_queries(self):
         from django.core.cache import cache
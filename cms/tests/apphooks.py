@@ -5,14 +5,16 @@ import sys
 from cms.api import create_page, create_title
 from cms.apphook_pool import apphook_pool
 from cms.compat import get_user_model
-from cms.appresolver import applications_page_check, clear_app_resolvers, get_app_patterns
-from cms.models import Title
+from cms.appresolver import (applications_page_check, check_app_urls, clear_app_resolvers, get_app_patterns,
+                              get_app_resolvers)
+from cms.cache.page import invalidate_app_urls
+from cms.models import Page, Title
 from cms.test_utils.testcases import CMSTestCase, SettingsOverrideTestCase
 from cms.test_utils.util.context_managers import SettingsOverride
 from cms.tests.menu_utils import DumbPageLanguageUrl
 from cms.utils.compat.type_checks import string_types
 from cms.utils.i18n import force_language
-from django.core.urlresolvers import clear_url_caches, reverse
+from django.core.urlresolvers import NoReverseMatch, clear_url_caches, reverse
 
 APP_NAME = 'SampleApp'
 NS_APP_NAME = 'NamespacedApp'
@@ -188,6 +190,79 @@ class ApphooksTestCase(CMSTestCase):
 
             apphook_pool.clear()
 
+    def test_get_page_for_apphook_from_index(self):
+        with SettingsOverride(ROOT_URLCONF='cms.test_utils.project.second_urls_for_apphook_tests'):
+            en_title = self.create_base_structure(APP_NAME, 'en')
+            with force_language("en"):
+                path = reverse('sample-settings')
+                # only the resolvers hooked under a prefix of the path are tried
+                resolvers = get_app_resolvers(path[len('/en/'):])
+                self.assertEqual(set(resolver.page_id for resolver in resolvers), set([en_title.page_id]))
+                self.assertEqual(get_app_resolvers('unknown/path/'), [])
+                request = self.get_request(path)
+                attached_to_page = applications_page_check(request, path=path[1:])  # strip leading slash
+                self.assertEquals(attached_to_page.pk, en_title.page_id)
+                # the page is not fetched again
+                with self.assertNumQueries(0):
+                    attached_to_page = applications_page_check(request, path=path[1:])
+                self.assertEquals(attached_to_page.pk, en_title.page_id)
+
+            apphook_pool.clear()
+
+    def test_reload_app_patterns_on_apphook_change(self):
+        with SettingsOverride(ROOT_URLCONF='cms.test_utils.project.second_urls_for_apphook_tests'):
+            self.create_base_structure(APP_NAME, 'en')
+            with force_language("en"):
+                path = reverse('sample-settings')
+            page = Page.objects.drafts().get(application_urls=APP_NAME)
+            page.application_urls = ''
+            page.save()
+            page.publish('en')
+            # nothing changed as far as the other processes know
+            check_app_urls()
+            with force_language("en"):
+                self.assertEqual(reverse('sample-settings'), path)
+            invalidate_app_urls()
+            check_app_urls()
+            with force_language("en"):
+                self.assertRaises(NoReverseMatch, reverse, 'sample-settings')
+            self.assertEqual(get_app_resolvers(path[len('/en/'):]), [])
+
+            apphook_pool.clear()
+
+    def test_reload_app_patterns_swaps_patterns(self):
+        from cms import appresolver
+
+        with SettingsOverride(ROOT_URLCONF='cms.test_utils.project.second_urls_for_apphook_tests'):
+            en_title = self.create_base_structure(APP_NAME, 'en')
+            with force_language("en"):
+                path = reverse('sample-settings')
+            request = self.get_request(path)
+            builds = []
+            build_app_patterns = appresolver.build_app_patterns
+
+            def build_and_resolve():
+                # other threads still resolve against the old patterns
+                with force_language("en"):
+                    builds.append(applications_page_check(request, path=path[1:]))
+                return build_app_patterns()
+
+            appresolver.build_app_patterns = build_and_resolve
+            try:
+                invalidate_app_urls()
+                check_app_urls()
+            finally:
+                appresolver.build_app_patterns = build_app_patterns
+            # built once for all url configurations
+            self.assertEqual(len(builds), 1)
+            self.assertEqual(builds[0].pk, en_title.page_id)
+            self.assertEqual(len(appresolver.APP_RESOLVERS), 1)
+            with force_language("en"):
+                self.assertEqual(reverse('sample-settings'), path)
+                self.assertEqual(applications_page_check(request, path=path[1:]).pk, en_title.page_id)
+
+            apphook_pool.clear()
+
     def test_get_page_for_apphook_on_preview_or_edit(self):
 
         if get_user_model().USERNAME_FIELD == 'email':
@@ -1,9 +1,12 @@
 # -*- coding: utf-8 -*-
 from cms.api import add_plugin, create_page
+from cms.cache import deferred_invalidation
+from cms.cache.page import get_page_tag, get_tag_versions, get_page_cache_stats, invalidate_tags
 from cms.models import Page
 from cms.plugin_pool import plugin_pool
 from cms.test_utils.project.pluginapp.plugins.caching.cms_plugins import NoCachePlugin
 from cms.test_utils.testcases import CMSTestCase
+from cms.test_utils.util.context_managers import SettingsOverride
 from cms.test_utils.util.fuzzy_int import FuzzyInt
 from cms.toolbar.toolbar import CMSToolbar
 from django.core.cache import cache
@@ -97,6 +100,77 @@ class CacheTestCase(CMSTestCase):
         plugin_pool.unregister_plugin(NoCachePlugin)
 
 
+    def test_cache_plugin_fragments(self):
+        from cms.plugin_rendering import get_plugin_cache_key
+
+        page1 = create_page('test page 1', 'nav_playground.html', 'en', published=True)
+        placeholder = page1.placeholders.filter(slot="body")[0]
+        plugin_pool.register_plugin(NoCachePlugin)
+        text = add_plugin(placeholder, "TextPlugin", 'en', body="English")
+        add_plugin(placeholder, "NoCachePlugin", 'en')
+
+        def render():
+            request = self.get_request('/en/')
+            request.current_page = Page.objects.get(pk=page1.pk)
+            request.toolbar = CMSToolbar(request)
+            template = Template("{% load cms_tags %}{% placeholder 'body' %}")
+            return template.render(RequestContext(request))
+
+        self.assertIn('English', render())
+        text = text.__class__.objects.get(pk=text.pk)
+        # the first of the two plugins in the placeholder, without children
+        structure = [0, 2]
+        cached_value = cache.get(get_plugin_cache_key(text, text.changed_date, '', structure))
+        self.assertIn('English', cached_value['content'])
+
+        # the placeholder can't be cached, but the text plugin is served from
+        # the plugin cache
+        cache.set(get_plugin_cache_key(text, text.changed_date, '', structure), {'content': 'Cached', 'sekizai': {}})
+        self.assertIn('Cached', render())
+
+        # changing the plugin renders it again
+        text.body = "Changed"
+        text.save()
+        self.assertIn('Changed', render())
+
+        plugin_pool.unregister_plugin(NoCachePlugin)
+
+    def test_cache_plugin_fragments_structure(self):
+        from cms.models import CMSPlugin
+        from cms.plugin_rendering import get_plugin_cache_key, get_plugin_tree_changed_date
+        from cms.utils.plugins import assign_plugins
+
+        page1 = create_page('test page 1', 'nav_playground.html', 'en')
+        placeholder = page1.placeholders.get(slot="body")
+        text = add_plugin(placeholder, "TextPlugin", 'en', body="Parent")
+        links = []
+        for index in range(3):
+            links.append(add_plugin(placeholder, "LinkPlugin", 'en', target=self.reload(text),
+                                    name="Link %s" % index, url="http://example.com/%s" % index))
+
+        def get_cache_key():
+            placeholder = page1.placeholders.get(slot="body")
+            assign_plugins(self.get_request('/en/'), [placeholder], page1.template, 'en')
+            parent = [plugin for plugin in placeholder._plugins_cache if plugin.pk == text.pk][0]
+            return get_plugin_cache_key(parent, get_plugin_tree_changed_date(parent), '')
+
+        cache_key = get_cache_key()
+        self.assertEqual(get_cache_key(), cache_key)
+
+        # reordering the children without touching them
+        CMSPlugin.objects.filter(pk=links[0].pk).update(position=5)
+        reordered_cache_key = get_cache_key()
+        self.assertNotEqual(reordered_cache_key, cache_key)
+
+        # moving a child out of the parent
+        CMSPlugin.objects.get(pk=links[1].pk).move_to(None, 'last-child')
+        moved_cache_key = get_cache_key()
+        self.assertNotEqual(moved_cache_key, reordered_cache_key)
+
+        # deleting a child which isn't the newest plugin
+        CMSPlugin.objects.get(pk=links[0].pk).delete()
+        self.assertNotEqual(get_cache_key(), moved_cache_key)
+
     def test_cache_page(self):
         from cms.views import _get_cache_version
         from cms.utils import get_cms_setting
@@ -148,11 +222,15 @@ class CacheTestCase(CMSTestCase):
         self.assertEqual(response.status_code, 200)
 
         #
-        # Test that the cache is invalidated on unpublishing the page
+        # Test that the cache is invalidated on unpublishing the page, without
+        # invalidating the cache of every other page
         #
         old_version = _get_cache_version()
+        page_tag = get_page_tag(page1.publisher_public_id)
+        old_tag_version = get_tag_versions([page_tag])[page_tag]
         page1.unpublish('en')
-        self.assertGreater(_get_cache_version(), old_version)
+        self.assertEqual(_get_cache_version(), old_version)
+        self.assertNotEqual(get_tag_versions([page_tag])[page_tag], old_tag_version)
 
         #
         # Test that this means the page is actually not cached.
@@ -167,22 +245,152 @@ class CacheTestCase(CMSTestCase):
         # set to False (disabled)
         #
         cache.clear()
-        settings.CMS_PAGE_CACHE = False
+        with SettingsOverride(CMS_PAGE_CACHE=False):
+            # Test that the page is initially uncached
+            with self.assertNumQueries(FuzzyInt(1, 20)):
+                response = self.client.get('/en/')
+            self.assertEqual(response.status_code, 200)
 
-        # Test that the page is initially uncached
-        with self.assertNumQueries(FuzzyInt(1, 20)):
-            response = self.client.get('/en/')
-        self.assertEqual(response.status_code, 200)
+            #
+            # Test that subsequent requests of the same page are still requires DB
+            # access.
+            #
+            with self.assertNumQueries(FuzzyInt(1, 20)):
+                response = self.client.get('/en/')
+            self.assertEqual(response.status_code, 200)
 
         #
-        # Test that subsequent requests of the same page are still requires DB
-        # access.
+        # Let's reset the original middleware for the remaining tests...
         #
+        settings.MIDDLEWARE_CLASSES = old_middleware[:]
+
+    def test_cache_page_tags(self):
+        from django.conf import settings
+
+        old_middleware = settings.MIDDLEWARE_CLASSES[:]
+        cache.clear()
+        exclude = [
+            'django.middleware.cache.UpdateCacheMiddleware',
+            'django.middleware.cache.FetchFromCacheMiddleware'
+        ]
+        settings.MIDDLEWARE_CLASSES[:] = [mw for mw in settings.MIDDLEWARE_CLASSES if mw not in exclude]
+
+        page1 = create_page('test page 1', 'nav_playground.html', 'en', published=True)
+        page2 = create_page('test page 2', 'nav_playground.html', 'en', published=True)
+        placeholder1 = page1.placeholders.get(slot="body")
+        placeholder2 = page2.placeholders.get(slot="body")
+        add_plugin(placeholder1, "TextPlugin", 'en', body="First")
+        add_plugin(placeholder2, "TextPlugin", 'en', body="Second")
+        page1.publish('en')
+        page2.publish('en')
+        page2 = page2.reload()
+
+        self.client.get('/en/')
+        self.client.get(page2.get_absolute_url('en'))
+        with self.assertNumQueries(0):
+            self.client.get('/en/')
+        with self.assertNumQueries(0):
+            self.client.get(page2.get_absolute_url('en'))
+
+        # publishing content changes of the second page keeps the first one cached
+        add_plugin(placeholder2, "TextPlugin", 'en', body="Changed")
+        page2.publish('en')
+        with self.assertNumQueries(0):
+            response = self.client.get('/en/')
+        self.assertContains(response, 'First')
+        with self.assertNumQueries(FuzzyInt(1, 20)):
+            response = self.client.get(page2.get_absolute_url('en'))
+        self.assertContains(response, 'Changed')
+
+        settings.MIDDLEWARE_CLASSES = old_middleware[:]
+
+    def test_deferred_invalidation(self):
+        page = create_page('test page', 'nav_playground.html', 'en', published=True)
+        tag = get_page_tag(page.publisher_public_id)
+        version = get_tag_versions([tag])[tag]
+        with deferred_invalidation():
+            invalidate_tags([tag])
+            page.publish('en')
+            self.assertEqual(get_tag_versions([tag])[tag], version)
+        self.assertNotEqual(get_tag_versions([tag])[tag], version)
+
+    def test_cache_page_stale_while_revalidate(self):
+        from cms.appresolver import check_app_urls
+        from cms.views import _get_cache_key
+        from django.conf import settings
+
+        old_middleware = settings.MIDDLEWARE_CLASSES[:]
+        cache.clear()
+        # store the generation of the apphook url patterns again, so the
+        # requests below don't rebuild them
+        check_app_urls()
+        exclude = [
+            'django.middleware.cache.UpdateCacheMiddleware',
+            'django.middleware.cache.FetchFromCacheMiddleware'
+        ]
+        settings.MIDDLEWARE_CLASSES[:] = [mw for mw in settings.MIDDLEWARE_CLASSES if mw not in exclude]
+
+        page1 = create_page('test page 1', 'nav_playground.html', 'en', published=True)
+        placeholder = page1.placeholders.get(slot="body")
+        add_plugin(placeholder, "TextPlugin", 'en', body="First")
+        page1.publish('en')
+
+        self.client.get('/en/')
+        with self.assertNumQueries(0):
+            self.client.get('/en/')
+        self.assertEqual(get_page_cache_stats(), {'hit': 1, 'miss': 1, 'stale': 0})
+
+        add_plugin(placeholder, "TextPlugin", 'en', body="Second")
+        page1.publish('en')
+
+        # another process is rendering the page, serve the previous version
+        lock_key = '%s:lock' % _get_cache_key(self.get_request('/en/'))
+        cache.add(lock_key, 1, 10)
+        with self.assertNumQueries(0):
+            response = self.client.get('/en/')
+        self.assertNotContains(response, 'Second')
+        self.assertEqual(get_page_cache_stats()['stale'], 1)
+
+        # once the lock is gone, the page gets rendered again
+        cache.delete(lock_key)
         with self.assertNumQueries(FuzzyInt(1, 20)):
             response = self.client.get('/en/')
-        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Second')
+        self.assertEqual(cache.get(lock_key), None)
+
+        with SettingsOverride(CMS_PAGE_CACHE_GRACE=0):
+            add_plugin(placeholder, "TextPlugin", 'en', body="Third")
+            page1.publish('en')
+            cache.add(lock_key, 1, 10)
+            with self.assertNumQueries(FuzzyInt(1, 20)):
+                response = self.client.get('/en/')
+            self.assertContains(response, 'Third')
+
+        settings.MIDDLEWARE_CLASSES = old_middleware[:]
+
+    def test_cache_page_old_format(self):
+        from cms.views import _get_cache_key, _get_cache_version
+        from django.conf import settings
+
+        old_middleware = settings.MIDDLEWARE_CLASSES[:]
+        cache.clear()
+        exclude = [
+            'django.middleware.cache.UpdateCacheMiddleware',
+            'django.middleware.cache.FetchFromCacheMiddleware'
+        ]
+        settings.MIDDLEWARE_CLASSES[:] = [mw for mw in settings.MIDDLEWARE_CLASSES if mw not in exclude]
+
+        page1 = create_page('test page 1', 'nav_playground.html', 'en', published=True)
+        placeholder = page1.placeholders.get(slot="body")
+        add_plugin(placeholder, "TextPlugin", 'en', body="First")
+        page1.publish('en')
+
+        # entries stored by earlier versions are a miss, not an error
+        cache_key = _get_cache_key(self.get_request('/en/'))
+        for old_entry in (('old', {}), ('old', {}, {})):
+            cache.set(cache_key, old_entry, 60, version=_get_cache_version())
+            response = self.client.get('/en/')
+            self.assertEqual(response.status_code, 200)
+            self.assertContains(response, 'First')
 
-        #
-        # Let's reset the original middleware for the remaining tests...
-        #
         settings.MIDDLEWARE_CLASSES = old_middleware[:]
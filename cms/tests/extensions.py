@@ -131,6 +131,31 @@ class ExtensionsTestCase(TestCase):
         title_extension.delete()
         self.assertFalse(MyTitleExtension.objects.filter(pk=title_extension.pk).exists())
 
+    def test_prefetch_extensions(self):
+        from cms.menu import CMSMenu
+        from cms.test_utils.util.context_managers import SettingsOverride
+
+        pages = [create_page('page%s' % i, "nav_playground.html", "en") for i in range(3)]
+        for page in pages[:2]:
+            MyPageExtension.objects.create(extended_object=page, extra=page.get_title())
+        MyTitleExtension.objects.create(extended_object=pages[0].get_title_obj(), extra_title='title')
+        pages = list(Page.objects.filter(pk__in=[page.pk for page in pages]).order_by('tree_id'))
+        with self.assertNumQueries(len(extension_pool.page_extensions)):
+            extension_pool.prefetch_page_extensions(pages)
+        with self.assertNumQueries(0):
+            self.assertEqual(pages[0].mypageextension.extra, 'page0')
+            self.assertEqual(extension_pool.get_extensions(pages[1])['mypageextension'].extra, 'page1')
+            self.assertFalse('mypageextension' in extension_pool.get_extensions(pages[2]))
+
+        for page in pages:
+            page.publish('en')
+        with SettingsOverride(CMS_MENU_EXTENSIONS=True):
+            nodes = CMSMenu().get_nodes(self.get_request('/'))
+        extensions = dict((node.id, node.attr['extensions']) for node in nodes)
+        self.assertEqual(extensions[pages[0].publisher_public_id]['mypageextension'].extra, 'page0')
+        self.assertEqual(extensions[pages[0].publisher_public_id]['mytitleextension'].extra_title, 'title')
+        self.assertFalse('mypageextension' in extensions[pages[2].publisher_public_id])
+
 
 class ExtensionAdminTestCase(AdminTestsBase):
     def setUp(self):
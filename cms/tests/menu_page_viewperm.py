@@ -6,12 +6,13 @@ from django.contrib.auth.models import AnonymousUser, Group
 
 from cms.api import create_page
 from cms.compat import get_user_model, user_related_name
-from cms.menu import get_visible_pages
+from cms.menu import get_visible_pages, get_view_restrictions, get_granted_pages
 from cms.models import Page
 from cms.models import ACCESS_DESCENDANTS, ACCESS_CHILDREN, ACCESS_PAGE
 from cms.models import ACCESS_PAGE_AND_CHILDREN, ACCESS_PAGE_AND_DESCENDANTS
 from cms.models.permissionmodels import GlobalPagePermission, PagePermission
 from cms.test_utils.testcases import SettingsOverrideTestCase
+from menus.base import Menu
 from menus.menu_pool import menu_pool
 
 __all__ = [
@@ -516,6 +517,71 @@ class ViewPermissionComplexMenuAllNodesTests(ViewPermissionTests):
         self.assertViewAllowed(urls["/en/page_d/page_d_a/"], user)
 
 
+    def test_view_restrictions_cached(self):
+        """
+        The view restrictions are computed once and invalidated when page
+        permissions change
+        """
+        self._setup_user_groups()
+        all_pages = self._setup_tree_pages()
+        self._setup_view_restrictions()
+        urls = self.get_url_dict(all_pages)
+        user = get_user_model().objects.get(email='user_5@django-cms.org')
+        page_d = urls['/en/page_d/']
+        restrictions = get_view_restrictions(self.site)
+        self.assertTrue(page_d.pk in restrictions['restricted'])
+        self.assertFalse(urls['/en/page_d/page_d_a/'].pk in restrictions['restricted'])
+        group = Group.objects.get(name=self.GROUPNAME_5)
+        self.assertTrue(page_d.pk in restrictions['groups'][group.pk])
+        with self.assertNumQueries(0):
+            get_view_restrictions(self.site)
+
+        request = self.get_request(user)
+        visible = get_visible_pages(request, all_pages, self.site)
+        self.assertTrue(page_d.pk in visible)
+        self.assertEqual(get_granted_pages(request, restrictions),
+                         set(restrictions['groups'][group.pk]))
+
+        PagePermission.objects.create(can_view=True, user=user, page=page_d,
+                                      grant_on=ACCESS_CHILDREN)
+        restrictions = get_view_restrictions(self.site)
+        self.assertTrue(urls['/en/page_d/page_d_a/'].pk in restrictions['restricted'])
+        self.assertTrue(urls['/en/page_d/page_d_a/'].pk in restrictions['users'][user.pk])
+
+    def test_menu_cache_shared_per_permission_profile(self):
+        """
+        Users with the same view permissions share their cached menu
+        """
+        self._setup_user_groups()
+        all_pages = self._setup_tree_pages()
+        self._setup_view_restrictions()
+        menu_pool.discover_menus()
+        other_user_1 = self._create_user('other_user_1', True)
+        getattr(Group.objects.get(name=self.GROUPNAME_1), user_related_name).add(other_user_1)
+        users = dict((user.email.split('@')[0], user) for user in get_user_model().objects.all())
+
+        def get_vary(user):
+            return menu_pool._get_cache_vary(self.get_request(user, all_pages[0]))
+
+        self.assertEqual(get_vary(users['user_1']), get_vary(other_user_1))
+        self.assertEqual(get_vary(AnonymousUser()), get_vary(AnonymousUser()))
+        self.assertNotEqual(get_vary(users['user_1']), get_vary(users['user_1_nostaff']))
+        self.assertNotEqual(get_vary(users['user_1']), get_vary(users['user_2']))
+        self.assertNotEqual(get_vary(users['user_staff']), get_vary(users['user_1']))
+        self.assertNotEqual(get_vary(users['user_staff']), get_vary(AnonymousUser()))
+
+        nodes = menu_pool.get_nodes(self.get_request(users['user_1'], all_pages[0]))
+        other_nodes = menu_pool.get_nodes(self.get_request(other_user_1, all_pages[0]))
+        self.assertEqual([node.get_absolute_url() for node in nodes],
+                         [node.get_absolute_url() for node in other_nodes])
+
+        # menus which don't declare what they vary on are cached per user
+        menu = Menu()
+        self.assertNotEqual(menu.get_cache_vary(self.get_request(users['user_1'], all_pages[0])),
+                            menu.get_cache_vary(self.get_request(other_user_1, all_pages[0])))
+        self.assertEqual(menu.get_cache_vary(self.get_request(AnonymousUser(), all_pages[0])), '')
+
+
 class ViewPermissionTreeBugTests(ViewPermissionTests):
     """Test issue 1113
     https://github.com/divio/django-cms/issues/1113
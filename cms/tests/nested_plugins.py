@@ -479,6 +479,51 @@ class NestedPluginsTestCase(PluginsTestBaseCase, UnittestCompatMixin):
             self.assertEqual(post_add_plugin_count, 2)
 
 
+    def test_copy_plugins_to_plugin(self):
+        """
+        Copies a nested plugin structure into a plugin of another placeholder,
+        the copies become the first children of that plugin.
+        """
+        source = Placeholder.objects.create(slot=u"source")
+        parent = add_plugin(source, u"TextPlugin", u"en", body=u"parent")
+        child = add_plugin(source, u"TextPlugin", u"en", body=u"child", target=self.reload(parent))
+        add_plugin(source, u"TextPlugin", u"en", body=u"grandchild", target=self.reload(child))
+        add_plugin(source, u"TextPlugin", u"en", body=u"second child", target=self.reload(parent))
+        placeholder = Placeholder.objects.create(slot=u"target")
+        target = add_plugin(placeholder, u"TextPlugin", u"en", body=u"target")
+        add_plugin(placeholder, u"TextPlugin", u"en", body=u"existing", target=self.reload(target))
+
+        copied = copy_plugins_to(source.get_plugins(), placeholder, parent_plugin_id=target.pk)
+        self.assertEqual(len(copied), 4)
+        target = self.reload(target)
+        descendants = target.get_descendants()
+        self.assertEqual([Text.objects.get(pk=plugin.pk).body for plugin in descendants],
+                         [u"parent", u"child", u"grandchild", u"second child", u"existing"])
+        self.assertEqual([plugin.level for plugin in descendants], [1, 2, 3, 2, 1])
+        self.assertEqual(descendants[0].parent_id, target.pk)
+        self.assertEqual(target.rght - target.lft, 11)
+        self.assertEqual(CMSPlugin.objects.filter(placeholder=placeholder, tree_id=target.tree_id).count(), 6)
+
+    def test_copy_plugins_to_new_trees(self):
+        """
+        Copies of the same plugins get trees of their own, each child is
+        attached to the parent of its own copy.
+        """
+        source = Placeholder.objects.create(slot=u"source")
+        parent = add_plugin(source, u"TextPlugin", u"en", body=u"parent")
+        add_plugin(source, u"TextPlugin", u"en", body=u"child", target=self.reload(parent))
+        placeholder = Placeholder.objects.create(slot=u"target")
+
+        first = copy_plugins_to(source.get_plugins(), placeholder)
+        second = copy_plugins_to(source.get_plugins(), placeholder)
+        self.assertNotEqual(first[0][0].tree_id, second[0][0].tree_id)
+        for copies in (first, second):
+            new_parent, new_child = [self.reload(new_plugin) for new_plugin, old_plugin in copies]
+            self.assertEqual(new_child.parent_id, new_parent.pk)
+            self.assertEqual(new_child.tree_id, new_parent.tree_id)
+        tree_ids = CMSPlugin.objects.filter(placeholder=placeholder, level=0).values_list('tree_id', flat=True)
+        self.assertEqual(len(set(tree_ids)), 2)
+
     def test_copy_page_nested_plugin(self):
         """
         Test to verify that page copy with a nested plugin works
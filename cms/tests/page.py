@@ -1,8 +1,10 @@
 # -*- coding: utf-8 -*-
 from __future__ import with_statement
 import datetime
+import json
 from cms import constants, api
 import os.path
+from uuid import uuid4
 
 from django.conf import settings
 from django.core.cache import cache
@@ -15,7 +17,7 @@ from django.utils import timezone
 
 from cms.admin.forms import AdvancedSettingsForm
 from cms.admin.pageadmin import PageAdmin
-from cms.api import create_page, add_plugin
+from cms.api import create_page, create_title, add_plugin
 from cms.middleware.user import CurrentUserMiddleware
 from cms.models import Page, Title
 from cms.models.placeholdermodel import Placeholder
@@ -27,7 +29,7 @@ from cms.sitemaps import CMSSitemap
 from cms.templatetags.cms_tags import get_placeholder_content
 from cms.test_utils.testcases import (CMSTestCase, URL_CMS_PAGE, URL_CMS_PAGE_ADD)
 from cms.test_utils.util.context_managers import (LanguageOverride, SettingsOverride, UserLoginContext)
-from cms.utils import get_cms_setting
+from cms.utils import copy_pages, get_cms_setting
 from cms.utils.page_resolver import get_page_from_request, is_valid_url
 from cms.utils.page import is_valid_page_slug, get_available_slug
 
@@ -339,6 +341,124 @@ class PagesTestCase(CMSTestCase):
 
         self.assertEqual(Page.objects.drafts().count() - count, 3)
 
+    def test_copy_page_tree(self):
+        # otherwise page_b becomes the home page, whose children share the
+        # slugs of the root pages
+        create_page("home", "nav_playground.html", "en", published=True)
+        page_a = create_page("page_a", "nav_playground.html", "en")
+        page_a_a = create_page("page_a_a", "nav_playground.html", "en", parent=page_a)
+        page_a_b = create_page("page_a_b", "nav_playground.html", "en", parent=page_a)
+        create_page("page_a_a_a", "nav_playground.html", "en", parent=page_a_a)
+        create_title("de", "seite_a_b", page_a_b, slug="seite_a_b")
+        placeholder = page_a_b.placeholders.get(slot="body")
+        text = add_plugin(placeholder, "TextPlugin", "en", body="Copied")
+        add_plugin(placeholder, "LinkPlugin", "en", target=text, name="Link", url="http://example.com")
+        page_b = create_page("page_b", "nav_playground.html", "en")
+        create_page("page_b_a", "nav_playground.html", "en", parent=page_b)
+
+        progress = []
+        page_a = Page.objects.get(pk=page_a.pk)
+        copy = page_a.copy_page(Page.objects.get(pk=page_b.pk), page_a.site, 'last-child',
+                                progress=lambda done, total: progress.append((done, total)))
+        self.assertEqual(progress[-1], (4, 4))
+
+        page_b = Page.objects.get(pk=page_b.pk)
+        copies = page_b.get_descendants()
+        self.assertEqual([page.get_slug() for page in copies],
+                         ["page_b_a", "page_a", "page_a_a", "page_a_a_a", "page_a_b"])
+        self.assertEqual(page_b.rght - page_b.lft, 11)
+        self.assertEqual(copies[1].pk, copy.pk)
+        self.assertEqual(copies[1].parent_id, page_b.pk)
+        self.assertEqual(copies[3].parent_id, copies[2].pk)
+        self.assertEqual(copies[3].get_path(), "page_b/page_a/page_a_a/page_a_a_a")
+        self.assertEqual(copies[4].get_path("de", fallback=False), "page_b/page_a/seite_a_b")
+        self.assertFalse(copies[4].title_set.filter(published=True).exists())
+
+        copied_placeholder = copies[4].placeholders.get(slot="body")
+        self.assertNotEqual(copied_placeholder.pk, placeholder.pk)
+        plugins = list(copied_placeholder.get_plugins_list())
+        self.assertEqual([plugin.plugin_type for plugin in plugins], ["TextPlugin", "LinkPlugin"])
+        self.assertEqual(plugins[1].parent_id, plugins[0].pk)
+        self.assertEqual(plugins[0].get_plugin_instance()[0].body, "Copied")
+        # the original is left alone
+        self.assertEqual(placeholder.get_plugins().count(), 2)
+
+    def test_copy_page_background(self):
+        page_a = create_page("page_a", "nav_playground.html", "en")
+        create_page("page_a_a", "nav_playground.html", "en", parent=page_a)
+        page_b = create_page("page_b", "nav_playground.html", "en")
+        jobs = []
+
+        def start_copy_job(page, target, site, position='first-child', copy_permissions=True, user=None):
+            # runs the job right away instead of in a thread
+            job_id = uuid4().hex
+            jobs.append(job_id)
+            copy_pages._run_copy_job(job_id, page, target, site, position, copy_permissions, user)
+            return job_id
+
+        superuser = self.get_superuser()
+        original_start_copy_job = copy_pages.start_copy_job
+        copy_pages.start_copy_job = start_copy_job
+        try:
+            with SettingsOverride(CMS_PAGE_COPY_BACKGROUND_THRESHOLD=1):
+                with self.login_user_context(superuser):
+                    data = {'position': 'last-child', 'target': page_b.pk, 'site': 1}
+                    response = self.client.post(URL_CMS_PAGE + "%d/copy-page/" % page_a.pk, data)
+                    status_url = reverse('admin:cms_page_copy_page_status', args=(jobs[0],))
+                    self.assertEqual(json.loads(response.content.decode('utf8')),
+                                     {"status": 202, "content": status_url})
+
+                    response = self.client.get(status_url)
+                    self.assertEqual(response.status_code, 200)
+                    copy = Page.objects.get(parent=page_b)
+                    self.assertEqual(json.loads(response.content.decode('utf8'))['page_id'], copy.pk)
+
+                    response = self.client.get(reverse('admin:cms_page_copy_page_status', args=(uuid4().hex,)))
+                    self.assertEqual(response.status_code, 404)
+        finally:
+            copy_pages.start_copy_job = original_start_copy_job
+        self.assertEqual(len(jobs), 1)
+
+    def test_run_copy_job(self):
+        page_a = create_page("page_a", "nav_playground.html", "en")
+        create_page("page_a_a", "nav_playground.html", "en", parent=page_a)
+        page_b = create_page("page_b", "nav_playground.html", "en")
+        site = page_a.site
+
+        copy_pages._run_copy_job('job', page_a, page_b, site, 'last-child', True, None)
+        state = copy_pages.get_copy_job('job')
+        copy = Page.objects.get(parent=page_b)
+        self.assertEqual((state['done'], state['total']), (2, 2))
+        self.assertTrue(state['finished'])
+        self.assertEqual(state['page_id'], copy.pk)
+        self.assertEqual(state['error'], None)
+
+        def copy_failing(*args, **kwargs):
+            raise ValueError("Copy failed")
+
+        original_copy_pages = copy_pages.copy_pages
+        copy_pages.copy_pages = copy_failing
+        try:
+            copy_pages._run_copy_job('failing', page_a, page_b, site, 'last-child', True, None)
+        finally:
+            copy_pages.copy_pages = original_copy_pages
+        state = copy_pages.get_copy_job('failing')
+        self.assertTrue(state['finished'])
+        self.assertEqual(state['page_id'], None)
+        self.assertEqual(state['error'], "Copy failed")
+
+    def test_copy_job_stalled(self):
+        copy_pages._set_copy_job('job', done=1, total=3, finished=False, page_id=None, error=None)
+        self.assertFalse(copy_pages.get_copy_job('job')['finished'])
+        # the process running the job ended without finishing it
+        key = copy_pages.get_copy_job_cache_key('job')
+        state = cache.get(key)
+        state['updated'] -= copy_pages.JOB_STALLED + 1
+        cache.set(key, state)
+        state = copy_pages.get_copy_job('job')
+        self.assertTrue(state['finished'])
+        self.assertTrue(state['error'])
+
     def test_language_change(self):
         superuser = self.get_superuser()
         with self.login_user_context(superuser):
@@ -414,6 +534,32 @@ class PagesTestCase(CMSTestCase):
             page3 = Page.objects.get(pk=page3.pk)
             self.assertEqual(page3.get_path(), page_data3['slug'])
 
+    def test_descendant_paths(self):
+        home = create_page("home", "nav_playground.html", "en")
+        parent = create_page("parent", "nav_playground.html", "en", parent=home)
+        create_title("de", "eltern", parent, slug="eltern")
+        child = create_page("child", "nav_playground.html", "en", parent=parent)
+        grandchild = create_page("grandchild", "nav_playground.html", "en", parent=child)
+        # child has no german title, its english path is used instead
+        create_title("de", "enkel", grandchild, slug="enkel")
+        grandchild = Page.objects.get(pk=grandchild.pk)
+        self.assertEqual(grandchild.get_path("de"), "parent/child/enkel")
+
+        title = parent.title_set.get(language="en")
+        title.slug = "renamed"
+        title.save()
+        child = Page.objects.get(pk=child.pk)
+        self.assertEqual(child.get_path("en"), "renamed/child")
+        grandchild = Page.objects.get(pk=grandchild.pk)
+        self.assertEqual(grandchild.get_path("en"), "renamed/child/grandchild")
+        self.assertEqual(grandchild.get_path("de", fallback=False), "renamed/child/enkel")
+        self.assertEqual(Page.objects.get(pk=parent.pk).get_path("de"), "eltern")
+
+        child.move_page(Page.objects.get(pk=home.pk), "last-child")
+        grandchild = Page.objects.get(pk=grandchild.pk)
+        self.assertEqual(grandchild.get_path("en"), "child/grandchild")
+        self.assertEqual(grandchild.get_path("de", fallback=False), "child/enkel")
+
     def test_move_page_inherit(self):
         parent = create_page("Parent", 'col_three.html', "en")
         child = create_page("Child", constants.TEMPLATE_INHERITANCE_MAGIC,
@@ -619,6 +765,32 @@ class PagesTestCase(CMSTestCase):
         self.assertIsNotNone(found_page)
         self.assertFalse(found_page.publisher_is_draft)
 
+    def test_get_page_from_request_path_index(self):
+        root = create_page("root", "nav_playground.html", "en", slug="root",
+                           published=True)
+        page = create_page("page", "nav_playground.html", "en", slug="page",
+                           published=True, parent=root)
+        get_page_from_request(self.get_request('/en/page/'))
+        # the index is built, only the page itself is fetched
+        with self.assertNumQueries(1):
+            found_page = get_page_from_request(self.get_request('/en/page/'))
+        self.assertEqual(found_page.pk, page.publisher_public_id)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_page_from_request(self.get_request('/en/nope/')), None)
+        # saving a public title makes every process rebuild its index
+        title = page.get_title_obj('en')
+        title.slug = 'renamed'
+        title.save()
+        page.publish('en')
+        self.assertEqual(get_page_from_request(self.get_request('/en/page/')), None)
+        found_page = get_page_from_request(self.get_request('/en/renamed/'))
+        self.assertEqual(found_page.pk, page.publisher_public_id)
+        # publication dates are checked on every request
+        tomorrow = timezone.now() + datetime.timedelta(days=1)
+        create_page("later", "nav_playground.html", "en", slug="later",
+                    published=True, parent=root, publication_date=tomorrow)
+        self.assertEqual(get_page_from_request(self.get_request('/en/later/')), None)
+
     def test_get_page_from_request_on_cms_admin_with_editplugin(self):
         page = create_page("page", "nav_playground.html", "en")
         request = self.get_request(
@@ -31,7 +31,7 @@ from cms.test_utils.util.context_managers import (SettingsOverride, UserLoginCon
 from cms.test_utils.util.mock import AttributeObject
 from cms.utils.compat.dj import force_unicode
 from cms.utils.placeholder import PlaceholderNoAction, MLNGPlaceholderActions, get_placeholder_conf
-from cms.utils.plugins import get_placeholders
+from cms.utils.plugins import get_placeholders, assign_plugins
 from django.conf import settings
 from django.contrib import admin
 from django.contrib.auth.models import Permission
@@ -439,6 +439,45 @@ class PlaceholderTestCase(CMSTestCase, UnittestCompatMixin):
             content_en = render_placeholder(placeholder_en, context_en)
             self.assertRegexpMatches(content_en, "^en body$")
 
+    def test_assign_plugins_mixed_language_fallback(self):
+        """
+        Placeholders falling back to another language must not drop the
+        plugins of the placeholders fetched in the requested language.
+        """
+        page = create_page('page_en', 'col_two.html', 'en')
+        create_title("de", "page_de", page)
+        placeholder_left = page.placeholders.get(slot='col_left')
+        placeholder_sidebar = page.placeholders.get(slot='col_sidebar')
+        add_plugin(placeholder_left, TextPlugin, 'de', body='de left')
+        add_plugin(placeholder_sidebar, TextPlugin, 'en', body='en sidebar')
+        add_plugin(placeholder_sidebar, LinkPlugin, 'de', name='de link', url='http://example.com/')
+        conf = {
+            'col_left': {
+                'language_fallback': True,
+            },
+            'col_sidebar': {
+                'language_fallback': True,
+            },
+        }
+        request = self.get_request(language="de", page=page)
+        with SettingsOverride(CMS_PLACEHOLDER_CONF=conf):
+            # one plugin query and one query per plugin type
+            with self.assertNumQueries(3):
+                assign_plugins(request, [placeholder_left, placeholder_sidebar], 'col_two.html', 'de')
+            self.assertEqual(request.plugin_query_count, 3)
+            self.assertEqual([plugin.body for plugin in placeholder_left._plugins_cache], ['de left'])
+            self.assertEqual([plugin.name for plugin in placeholder_sidebar._plugins_cache], ['de link'])
+
+            for placeholder in (placeholder_left, placeholder_sidebar):
+                del(placeholder._plugins_cache)
+            request = self.get_request(language="en", page=page)
+            # an additional query for the fallback languages
+            with self.assertNumQueries(3):
+                assign_plugins(request, [placeholder_left, placeholder_sidebar], 'col_two.html', 'en')
+            self.assertEqual(request.plugin_query_count, 3)
+            self.assertEqual([plugin.body for plugin in placeholder_left._plugins_cache], ['de left'])
+            self.assertEqual([plugin.body for plugin in placeholder_sidebar._plugins_cache], ['en sidebar'])
+
     def test_plugins_prepopulate(self):
         """ Tests prepopulate placeholder configuration """
 
@@ -1061,6 +1061,37 @@ class PluginsTestCase(PluginsTestBaseCase):
                                 plugin.get_parent_classes(placeholder.slot, page))
         plugin_pool.unregister_plugin(ParentClassesPlugin)
 
+    def test_plugin_render_plan_cached(self):
+        page = create_page("page", "nav_playground.html", "en", published=True)
+        placeholder = page.placeholders.get(slot='body')
+        plugin = plugin_pool.get_plugin('TextPlugin')()
+        child_classes = plugin.get_child_classes(placeholder.slot, page)
+        self.assertTrue('TextPlugin' in child_classes)
+        # neither the placeholder conf nor the plugin registry are looked at
+        # again for the same plugin class, slot and template
+        plan = plugin_pool.get_render_plan(plugin.__class__, placeholder.slot, page)
+        self.assertIs(plan, plugin_pool.get_render_plan(plugin.__class__, placeholder.slot, page))
+        with self.assertNumQueries(0):
+            self.assertEqual(child_classes, plugin.get_child_classes(placeholder.slot, page))
+
+        ChildClassesPlugin = type('ChildClassesPlugin', (CMSPluginBase,),
+                                  dict(render_template='allow_children_plugin.html'))
+        plugin_pool.register_plugin(ChildClassesPlugin)
+        self.assertTrue('ChildClassesPlugin' in plugin.get_child_classes(placeholder.slot, page))
+        plugin_pool.unregister_plugin(ChildClassesPlugin)
+        self.assertFalse('ChildClassesPlugin' in plugin.get_child_classes(placeholder.slot, page))
+
+        CMS_PLACEHOLDER_CONF = {
+            'body': {
+                'child_classes': {
+                    'TextPlugin': ['LinkPlugin'],
+                }
+            }
+        }
+        with SettingsOverride(CMS_PLACEHOLDER_CONF=CMS_PLACEHOLDER_CONF):
+            self.assertEqual(['LinkPlugin'], plugin.get_child_classes(placeholder.slot, page))
+        self.assertEqual(child_classes, plugin.get_child_classes(placeholder.slot, page))
+
     def test_plugin_translatable_content_getter_setter(self):
         """
         Test that you can add a text plugin
@@ -1311,6 +1342,23 @@ class PluginManyToManyTestCase(PluginsTestBaseCase):
         self.assertEqual(expected, db_counts)
 
 
+    def test_publish_m2m_changes_only(self):
+        page = create_page("page", "nav_playground.html", "en")
+        placeholder = page.placeholders.get(slot='body')
+        plugin = add_plugin(placeholder, "ArticlePlugin", "en", title="Articles")
+        plugin.sections = self.sections
+        page.publish('en')
+        public_placeholder = page.reload().publisher_public.placeholders.get(slot='body')
+        public_plugin = ArticlePluginModel.objects.get(placeholder=public_placeholder)
+        self.assertEqual(public_plugin.sections.count(), self.section_count)
+
+        # only the relations change, the plugin isn't saved
+        plugin.sections.remove(self.sections[0])
+        page.publish('en')
+        public_plugin = ArticlePluginModel.objects.get(placeholder=public_placeholder)
+        self.assertEqual(sorted(public_plugin.sections.values_list('pk', flat=True)), self.section_pks[1:])
+
+
 class PluginsMetaOptionsTests(TestCase):
     ''' TestCase set for ensuring that bugs like #992 are caught '''
 
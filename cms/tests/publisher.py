@@ -1,11 +1,15 @@
 # -*- coding: utf-8 -*-
 from __future__ import with_statement
+import multiprocessing
+import os
+import tempfile
 from cms.constants import PUBLISHER_STATE_PENDING, PUBLISHER_STATE_DEFAULT, PUBLISHER_STATE_DIRTY
 from cms.utils.i18n import force_language
 from django.core.cache import cache
 from django.core.management.base import CommandError
 from django.core.urlresolvers import reverse
 from cms.compat import get_user_model
+from cms import cache as cache_module
 from cms.api import create_page, add_plugin, create_title
 from cms.management.commands import publisher_publish
 from cms.models import CMSPlugin, Title
@@ -155,6 +159,116 @@ class PublisherCommandTests(TestCase):
         non_draft = Page.objects.public()[0]
         self.assertEquals(non_draft.reverse_id, 'a_test')
 
+    def test_command_line_checkpoint(self):
+        get_user_model().objects.create_superuser('djangocms', 'cms@example.com', '123456')
+        first = create_page("first", "nav_playground.html", "en", published=True)
+        second = create_page("second", "nav_playground.html", "en", published=True)
+        checkpoint = tempfile.mktemp()
+        with open(checkpoint, 'w') as checkpoint_file:
+            checkpoint_file.write("%d\n" % first.pk)
+        try:
+            with StdoutOverride() as buffer:
+                com = publisher_publish.Command()
+                com.handle_noargs(checkpoint=checkpoint)
+                lines = buffer.getvalue().split('\n')
+            with open(checkpoint) as checkpoint_file:
+                published = [int(line) for line in checkpoint_file]
+        finally:
+            os.remove(checkpoint)
+        # the first page was published by the interrupted run
+        self.assertTrue(u"Total:     1" in lines)
+        self.assertEqual(published, [first.pk, second.pk])
+
+    def test_command_line_jobs(self):
+        from cms.cache.page import get_page_tag
+        from cms.utils.copy_plugins import share_tree_ids
+
+        superuser = get_user_model().objects.create_superuser('djangocms', 'cms@example.com', '123456')
+        children = []
+        for tree in range(2):
+            root = create_page("root %s" % tree, "nav_playground.html", "en", published=True)
+            for child in range(2):
+                page = create_page("child %s %s" % (tree, child), "nav_playground.html", "en",
+                                   parent=root, published=True)
+                placeholder = page.placeholders.get(slot=u"body")
+                add_plugin(placeholder, u"TextPlugin", u"en", body="child %s %s" % (tree, child))
+                children.append(page.pk)
+        for page in Page.objects.filter(pk__in=children):
+            page.reverse_id = 'page_%s' % page.pk
+            page.save()
+
+        trees, serial = publisher_publish.Command().split_trees(children)
+        self.assertEqual(sorted(sorted(tree) for tree in trees), [children[:2], children[2:]])
+        self.assertEqual(serial, [])
+
+        worker_invalidations = []
+
+        def publish_tree(pks):
+            # a worker process doesn't see the invalidations of the command
+            outer = cache_module._deferred.invalidations
+            cache_module._deferred.invalidations = None
+            try:
+                results, invalidations = publisher_publish.publish_tree(pks)
+            finally:
+                cache_module._deferred.invalidations = outer
+            worker_invalidations.append(invalidations)
+            return results, invalidations
+
+        class InProcessPool(object):
+            """
+            Publishes the trees in this process, which can see the data of the
+            test, like the pool of worker processes would.
+            """
+            def __init__(self, jobs, initializer, initargs):
+                initializer(*initargs)
+
+            def imap_unordered(self, func, iterable):
+                return [publish_tree(pks) for pks in iterable]
+
+            def close(self):
+                pass
+
+            def terminate(self):
+                pass
+
+            def join(self):
+                pass
+
+        class Command(publisher_publish.Command):
+            def get_pool(self, jobs, user):
+                pool_users.append(user)
+                return InProcessPool(jobs, publisher_publish.init_worker,
+                                     (user, multiprocessing.Lock(), multiprocessing.Value('i', 0)))
+
+        pool_users = []
+        replayed = []
+        original_run_invalidations = cache_module.run_invalidations
+        cache_module.run_invalidations = replayed.append
+        try:
+            with StdoutOverride():
+                Command().handle_noargs(jobs=2)
+        finally:
+            cache_module.run_invalidations = original_run_invalidations
+            share_tree_ids(None, None)
+
+        self.assertEqual(pool_users, [superuser])
+        self.assertEqual(len(worker_invalidations), 2)
+        # the invalidations of the workers are replayed once, at the end
+        self.assertEqual(len(replayed), 1)
+        for invalidations in worker_invalidations:
+            self.assertTrue(invalidations['tags'] <= replayed[0]['tags'])
+            self.assertTrue(invalidations['menus'] <= replayed[0]['menus'])
+            if invalidations['page_cache']:
+                self.assertTrue(replayed[0]['page_cache'])
+        for page in Page.objects.filter(pk__in=children):
+            public = page.publisher_public
+            self.assertEqual(public.reverse_id, 'page_%s' % page.pk)
+            self.assertEqual(public.parent_id, page.parent.publisher_public_id)
+            self.assertEqual(public.tree_id, page.parent.publisher_public.tree_id)
+            self.assertTrue(replayed[0]['page_cache'] or get_page_tag(public.pk) in replayed[0]['tags'])
+            body = public.placeholders.get(slot=u"body").get_plugins('en')
+            self.assertEqual([Text.objects.get(pk=plugin.pk).body for plugin in body], [page.get_title('en')])
+
     def tearDown(self):
         plugin_pool.patched = False
         plugin_pool.set_plugin_meta()
@@ -677,12 +791,67 @@ class PublishingTests(TestCase):
         self.assertEquals(page.get_publisher_state("en"), PUBLISHER_STATE_DEFAULT)
 
         self.assertEquals(CMSPlugin.objects.count(), 4)
-        plugins = CMSPlugin.objects.filter(placeholder__page=page)
+        plugins = CMSPlugin.objects.filter(placeholder__page=page).order_by('position')
         self.assertEquals(plugins.count(), 2)
 
         plugins = [plugin.get_plugin_instance()[0] for plugin in plugins]
         self.assertEquals(plugins[0].body, "Deleted content")
         self.assertEquals(plugins[1].body, "Public content")
+        # the modified plugin is reverted in place
+        self.assertEquals(plugins[1].pk, text_plugin.pk)
+
+    def test_publish_changed_plugins_only(self):
+        page = create_page("Page", "nav_playground.html", "en", published=True)
+        placeholder = page.placeholders.get(slot=u"body")
+        first = add_plugin(placeholder, u"TextPlugin", u"en", body="First")
+        second = add_plugin(placeholder, u"TextPlugin", u"en", body="Second")
+        third = add_plugin(placeholder, u"TextPlugin", u"en", body="Third")
+        page.publish('en')
+        public_placeholder = page.reload().publisher_public.placeholders.get(slot=u"body")
+        public_plugins = dict((plugin.lineage_id, plugin) for plugin in public_placeholder.get_plugins('en'))
+        self.assertEqual(sorted(public_plugins), sorted([first.pk, second.pk, third.pk]))
+
+        second.body = "Changed"
+        second.save()
+        third_pk = third.pk
+        third.delete()
+        page.publish('en')
+
+        plugins = dict((plugin.lineage_id, plugin) for plugin in public_placeholder.get_plugins('en'))
+        self.assertEqual(sorted(plugins), sorted([first.pk, second.pk]))
+        # the public plugins were updated in place, the unchanged one untouched
+        self.assertEqual(plugins[first.pk].pk, public_plugins[first.pk].pk)
+        self.assertEqual(plugins[first.pk].changed_date, public_plugins[first.pk].changed_date)
+        self.assertEqual(plugins[second.pk].pk, public_plugins[second.pk].pk)
+        self.assertEqual(Text.objects.get(pk=plugins[first.pk].pk).body, "First")
+        self.assertEqual(Text.objects.get(pk=plugins[second.pk].pk).body, "Changed")
+        # the public plugin of the deleted draft plugin is removed
+        self.assertFalse(CMSPlugin.objects.filter(pk=public_plugins[third_pk].pk).exists())
+        self.assertFalse(Text.objects.filter(pk=public_plugins[third_pk].pk).exists())
+        self.assertFalse(CMSPlugin.objects.filter(lineage_id=third_pk).exists())
+
+    def test_publish_structure_changes_changed_date(self):
+        page = create_page("Page", "nav_playground.html", "en", published=True)
+        placeholder = page.placeholders.get(slot=u"body")
+        parent = add_plugin(placeholder, u"TextPlugin", u"en", body="Parent")
+        first = add_plugin(placeholder, u"LinkPlugin", u"en", target=self.reload(parent),
+                           name="First", url="http://example.com/1")
+        second = add_plugin(placeholder, u"LinkPlugin", u"en", target=self.reload(parent),
+                            name="Second", url="http://example.com/2")
+        page.publish('en')
+        public = dict((plugin.lineage_id, plugin) for plugin in CMSPlugin.objects.filter(
+            placeholder__page=page.reload().publisher_public))
+
+        # swap the children without saving them
+        CMSPlugin.objects.filter(pk=first.pk).update(position=second.position)
+        CMSPlugin.objects.filter(pk=second.pk).update(position=first.position)
+        page.publish('en')
+        changed = dict((plugin.lineage_id, plugin) for plugin in CMSPlugin.objects.filter(
+            placeholder__page=page.reload().publisher_public))
+        for pk in (parent.pk, first.pk, second.pk):
+            self.assertEqual(changed[pk].pk, public[pk].pk)
+            self.assertTrue(changed[pk].changed_date > public[pk].changed_date)
+        self.assertEqual(changed[first.pk].position, public[second.pk].position)
 
     def test_revert_move(self):
         parent = create_page("Parent", "nav_playground.html", "en", published=True)
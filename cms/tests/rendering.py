@@ -306,6 +306,15 @@ class RenderingTestCase(SettingsOverrideTestCase):
         r = self.render(t, self.test_page3)
         self.assertEqual(r, u'|' + self.test_data['text_main'] + '|' + self.test_data3['text_sub'])
 
+    def test_inherit_placeholder_batched(self):
+        t = Template(u'{% load cms_tags %}|{% placeholder "main" inherit %}')
+        with SettingsOverride(CMS_TEMPLATES=[(TEMPLATE_NAME, '')], CMS_PLACEHOLDER_CACHE=False):
+            context = self.get_context(self.test_page3)
+            r = self.strip_rendered(t.render(context))
+        self.assertEqual(r, u'|' + self.test_data['text_main'])
+        # the plugins of the page and its ancestors are fetched at once
+        self.assertEqual(context['request'].plugin_query_count, 2)
+
     def test_extra_context_isolation(self):
         with ChangeModel(self.test_page, template='extra_context.html'):
             response = self.client.get(self.test_page.get_absolute_url())
@@ -1,7 +1,10 @@
 # -*- coding: utf-8 -*-
+from django.contrib.sites.models import Site
 from django.utils.translation import ugettext_lazy as _
+from cms.api import add_plugin
 from cms.models import Title, Page
 from cms.sitemaps import CMSSitemap
+from cms.sitemaps.views import sitemap
 from cms.test_utils.testcases import CMSTestCase
 from cms.api import create_page, create_title
 from cms.test_utils.util.context_managers import SettingsOverride
@@ -90,6 +93,18 @@ class SitemapTestCase(CMSTestCase):
         # 1 page with only english title
         self.assertEqual(sitemap.items().count(), 18)
 
+    def test_sitemap_lastmod_reused_instance(self):
+        """
+        The dates are looked up again whenever the same sitemap is built
+        """
+        sitemap = CMSSitemap()
+        title = Title.objects.public().get(title='P4', language='en')
+        sitemap.get_urls()
+        placeholder = title.page.placeholders.get(slot='body')
+        plugin = add_plugin(placeholder, 'TextPlugin', 'en', body='Changed')
+        lastmods = dict((item['item'].pk, item['lastmod']) for item in sitemap.get_urls())
+        self.assertEqual(lastmods[title.pk], plugin.changed_date)
+
     def test_sitemap_items_location(self):
         """
         Check the correct URL in location, recreating it according to the title
@@ -153,3 +168,29 @@ class SitemapTestCase(CMSTestCase):
             else:
                 url = 'http://example.com/%s/%s' % (title.language, title.path)
             self.assertFalse(url in locations)
+
+    def test_sitemap_lastmod_queries(self):
+        """
+        The plugin dates of all pages are looked up with one query
+        """
+        page = Page.objects.public().get(title_set__title='P2')
+        plugin = add_plugin(page.placeholders.get(slot='body'), 'TextPlugin', 'en', body='text')
+        site = Site.objects.get_current()
+        sitemap_instance = CMSSitemap()
+        # count, titles, plugin dates
+        with self.assertNumQueries(3):
+            urlset = sitemap_instance.get_urls(site=site)
+        self.assertEqual(len(urlset), 18)
+        for item in urlset:
+            if item['item'].page_id == page.pk:
+                self.assertEqual(item['lastmod'], max(plugin.changed_date, page.changed_date))
+
+    def test_sitemap_view(self):
+        request = self.get_request('/sitemap.xml')
+        content = b''.join(sitemap(request, {'cmspages': CMSSitemap}))
+        for item in CMSSitemap().get_urls(site=Site.objects.get_current()):
+            self.assertIn(('<loc>%s</loc>' % item['location']).encode('utf8'), content)
+        # the rendered sitemap is cached
+        with self.assertNumQueries(0):
+            cached = sitemap(request, {'cmspages': CMSSitemap}).content
+        self.assertEqual(cached, content)
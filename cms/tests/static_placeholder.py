@@ -78,6 +78,22 @@ class StaticPlaceholderTestCase(PluginsTestBaseCase):
         request = self.get_request()
         static_placeholder.publish(request, 'en')
 
+    def test_cached_rendering(self):
+        static_placeholder = StaticPlaceholder.objects.create(name='foo', code='bar')
+        add_plugin(static_placeholder.draft, 'TextPlugin', 'en', body='first')
+        static_placeholder.publish(self.get_request(), 'en', force=True)
+        t = Template('{% load cms_tags %}{% static_placeholder "bar" %}')
+        self.assertIn('first', t.render(self.get_context('/')))
+        context = self.get_context('/')
+        with self.assertNumQueries(0):
+            rendered = t.render(context)
+        self.assertIn('first', rendered)
+        self.assertEqual([static.code for static in context['request'].static_placeholders], ['bar'])
+        add_plugin(static_placeholder.draft, 'TextPlugin', 'en', body='second')
+        self.assertNotIn('second', t.render(self.get_context('/')))
+        static_placeholder.publish(self.get_request(), 'en', force=True)
+        self.assertIn('second', t.render(self.get_context('/')))
+
     def test_move_plugin(self):
         static_placeholder_source = StaticPlaceholder.objects.create(name='foobar', code='foobar')
         static_placeholder_target = StaticPlaceholder.objects.create(name='foofoo', code='foofoo')
@@ -140,6 +140,33 @@ class TemplatetagDatabaseTests(TwoPagesFixture, SettingsOverrideTestCase):
         request = self.get_request('/')
         self.assertRaises(TypeError, _get_page_by_untyped_arg, [], request, 1)
 
+    def test_get_page_by_untyped_arg_identity_map(self):
+        second = self._getsecond()
+        request = self.get_request('/')
+        with self.assertNumQueries(1):
+            page = _get_page_by_untyped_arg(second.pk, request, 1)
+        self.assertEqual(page, second)
+        with self.assertNumQueries(0):
+            self.assertIs(_get_page_by_untyped_arg(second.pk, request, 1), page)
+        with self.assertNumQueries(1):
+            self.assertEqual(_get_page_by_untyped_arg("myreverseid", request, 1), second)
+        with self.assertNumQueries(0):
+            _get_page_by_untyped_arg("myreverseid", request, 1)
+
+    def test_prefetch_pages(self):
+        from django.core.cache import cache
+
+        cache.clear()
+        pages = [create_page('page%s' % i, 'nav_playground.html', 'en', published=True).publisher_public
+                 for i in range(10)]
+        request = self.get_request('/')
+        template = Template("{% load cms_tags %}{% prefetch_pages pks %}{% for pk in pks %}{% page_url pk %}|{% endfor %}")
+        context = RequestContext(request, {'pks': [page.pk for page in pages]})
+        # one query for the pages and one for their titles
+        with self.assertNumQueries(2):
+            output = template.render(context)
+        self.assertEqual(output, ''.join('%s|' % page.get_absolute_url() for page in pages))
+
     def test_show_placeholder_for_page_placeholder_does_not_exist(self):
         """
         Verify ``show_placeholder`` correctly handles being given an
@@ -16,7 +16,11 @@ from cms.toolbar.toolbar import CMSToolbar
 from cms.middleware.toolbar import ToolbarMiddleware
 from cms.test_utils.testcases import SettingsOverrideTestCase, URL_CMS_PAGE_ADD, URL_CMS_PAGE_CHANGE
 from cms.test_utils.util.context_managers import SettingsOverride
+from cms.utils.compat.dj import force_unicode
+from django.contrib.admin.models import ADDITION, LogEntry
 from django.contrib.auth.models import AnonymousUser, Permission
+from django.contrib.contenttypes.models import ContentType
+from django.http import HttpResponse
 from django.test import TestCase
 from django.test.client import RequestFactory
 from django.utils.functional import lazy
@@ -261,6 +265,28 @@ class ToolbarTests(ToolbarTestBase):
                 self.assertEqual(response.status_code, 200)
                 self.assertNotContains(response, '/it/')
 
+    def test_user_settings_and_log_entries_cached(self):
+        page = create_page('test', 'nav_playground.html', 'en', published=True)
+        staff = self.get_staff()
+        request = self.get_page_request(page, staff, '/')
+        clipboard_id = UserSettings.objects.get(user=staff).clipboard_id
+        # neither the user settings nor the admin log are queried
+        with self.assertNumQueries(0):
+            ToolbarMiddleware().process_request(request)
+            self.assertEqual(request.toolbar.toolbar_language, 'en')
+            self.assertEqual(request.toolbar.clipboard.pk, clipboard_id)
+            ToolbarMiddleware().process_response(request, HttpResponse())
+        self.assertNotIn('cms_log_latest', request.session)
+        LogEntry.objects.log_action(staff.pk, ContentType.objects.get_for_model(Page).pk, page.pk,
+                                    force_unicode(page), ADDITION)
+        log_entry = LogEntry.objects.get(user=staff)
+        ToolbarMiddleware().process_response(request, HttpResponse())
+        self.assertEqual(request.session['cms_log_latest'], log_entry.pk)
+        user_settings = UserSettings.objects.get(user=staff)
+        user_settings.language = 'de'
+        user_settings.save()
+        self.assertEqual(CMSToolbar(request).toolbar_language, 'de')
+
     def test_get_alphabetical_insert_position(self):
         page = create_page("toolbar-page", "nav_playground.html", "en",
                            published=True)
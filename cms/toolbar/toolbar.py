@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
+from cms.cache.toolbar import get_user_settings
 from cms.constants import LEFT
-from cms.models import UserSettings, Placeholder
+from cms.models import Placeholder
 from cms.toolbar.items import Menu, ToolbarAPIMixin, ButtonList
 from cms.toolbar_pool import toolbar_pool
 from cms.utils import get_language_from_request
@@ -52,25 +53,6 @@ class CMSToolbar(ToolbarAPIMixin):
         else:
             self.language = settings.LANGUAGE_CODE
 
-        # We need to store the current language in case the user's preferred language is different.
-        self.toolbar_language = self.language
-
-        if self.is_staff:
-            try:
-                user_settings = UserSettings.objects.select_related('clipboard').get(user=self.request.user)
-            except UserSettings.DoesNotExist:
-                user_settings = UserSettings(language=self.language, user=self.request.user)
-                placeholder = Placeholder(slot="clipboard")
-                placeholder.save()
-                user_settings.clipboard = placeholder
-                user_settings.save()
-            if (settings.USE_I18N and user_settings.language in dict(settings.LANGUAGES)) or (
-                    not settings.USE_I18N and user_settings.language == settings.LANGUAGE_CODE):
-                self.toolbar_language = user_settings.language
-            else:
-                user_settings.language = self.language
-                user_settings.save()
-            self.clipboard = user_settings.clipboard
         with force_language(self.language):
             try:
                 self.view_name = resolve(self.request.path).func.__module__
@@ -88,6 +70,28 @@ class CMSToolbar(ToolbarAPIMixin):
             toolbar = toolbars[key](self.request, self, key == app_key, app_key)
             self.toolbars[key] = toolbar
 
+    def get_user_settings(self):
+        # the settings of the user are only looked up once the toolbar needs
+        # them
+        if not hasattr(self, '_user_settings'):
+            if self.is_staff:
+                self._user_settings = get_user_settings(self.request.user, self.language)
+            else:
+                self._user_settings = (self.language, None)
+        return self._user_settings
+
+    @property
+    def toolbar_language(self):
+        # the language of the user, which may differ from the one of the page
+        return self.get_user_settings()[0]
+
+    @property
+    def clipboard(self):
+        if not hasattr(self, '_clipboard'):
+            clipboard_id = self.get_user_settings()[1]
+            self._clipboard = Placeholder(pk=clipboard_id, slot="clipboard") if clipboard_id else None
+        return self._clipboard
+
     @property
     def csrf_token(self):
         token = get_token(self.request)
@@ -160,7 +164,7 @@ class CMSToolbar(ToolbarAPIMixin):
 
     def get_clipboard_plugins(self):
         self.populate()
-        if not hasattr(self, "clipboard"):
+        if not self.clipboard:
             return []
         return self.clipboard.get_plugins()
 
@@ -6,6 +6,7 @@ from cms.constants import PUBLISHER_STATE_PENDING, PUBLISHER_STATE_DIRTY
 import django
 from django.http import HttpResponse
 from django.shortcuts import render_to_response
+from django.template.loader import render_to_string
 from django.template.context import RequestContext
 from django.contrib.sites.models import Site
 
@@ -34,6 +35,24 @@ publisher_classes = {
 }
 
 
+def get_page_publish_state(page, language):
+    """
+    Returns the state of a language of a draft page as shown in the page
+    tree: "published", "dirty" (unpublished changes), "unpublishedparent",
+    "unpublished" or "empty" (no content).
+    """
+    if page.is_published(language) and page.publisher_public_id and page.publisher_public.is_published(language):
+        if page.is_dirty(language):
+            return "dirty"
+        return "published"
+    if language in page.languages:
+        if page.publisher_public_id and page.publisher_public.get_publisher_state(
+                language) == PUBLISHER_STATE_PENDING:
+            return "unpublishedparent"
+        return "unpublished"
+    return "empty"
+
+
 def get_admin_menu_item_context(request, page, filtered=False):
     """
     Used for rendering the page tree, inserts into context everything what
@@ -87,6 +106,19 @@ def get_admin_menu_item_context(request, page, filtered=False):
     return context
 
 
+def render_admin_tree_node(request, page, languages):
+    """
+    Returns the html of the node of a page in the page tree, closed, as the
+    tree view returns it to the page tree when a node is opened.
+    """
+    context = RequestContext(request, {
+        'has_add_permission': permissions.has_page_add_permission(request),
+        'site_languages': languages,
+    })
+    context.update(get_admin_menu_item_context(request, page))
+    return render_to_string("admin/cms/page/tree/lazy_child_menu.html", context)
+
+
 def render_admin_menu_item(request, page, template=None):
     """
     Renders requested page item for the tree. This is used in case when item
@@ -46,6 +46,9 @@ DEFAULTS = {
     'PAGE_MEDIA_PATH': 'cms_page_media/',
     'TITLE_CHARACTER': '+',
     'PAGE_CACHE': True,
+    'PAGE_CACHE_GRACE': 10,
+    'MENU_CACHE_KEY_REGISTRY': 'menus.menu_pool.GenerationCacheKeyRegistry',
+    'MENU_EXTENSIONS': False,
     'PLACEHOLDER_CACHE': True,
     'PLUGIN_CACHE': True,
     'CACHE_PREFIX': 'cms-',
@@ -55,6 +58,7 @@ DEFAULTS = {
     'UNIHANDECODE_DECODERS': ['ja', 'zh', 'kr', 'vn', 'diacritic'],
     'UNIHANDECODE_DEFAULT_DECODER': 'diacritic',
     'MAX_PAGE_PUBLISH_REVERSIONS': 25,
+    'PAGE_COPY_BACKGROUND_THRESHOLD': 100,
 }
 
 
@@ -0,0 +1,320 @@
+# -*- coding: utf-8 -*-
+from collections import defaultdict
+from logging import getLogger
+import threading
+import time
+from uuid import uuid4
+
+from django.db import connection
+from django.utils.translation import ugettext
+
+from cms.constants import PUBLISHER_STATE_DIRTY
+from cms.utils import get_cms_setting
+from cms.utils.compat.dj import force_unicode
+from cms.utils.copy_plugins import (BATCH_SIZE, bulk_insert, copy_placeholder_plugins,
+                                    _plugin_tree_transaction)
+
+logger = getLogger(__name__)
+
+# seconds the state of a background copy job is kept after its last update
+JOB_TIMEOUT = 60 * 60
+# seconds between two updates of the state of a running copy job, a job whose
+# state wasn't updated for JOB_STALLED seconds is reported as failed
+JOB_HEARTBEAT = 10
+JOB_STALLED = 60
+
+
+def copy_pages(page, target, site, position='first-child', copy_permissions=True, progress=None):
+    """
+    Copies page and all its descendants to the given position relative to
+    target, or to a new tree if target is None, on site.
+
+    The space for all copies is made in the page tree at once, so the copies
+    of the pages, their titles, permissions, placeholders and plugins are
+    inserted in batches instead of saving them one by one. progress gets
+    called with the number of pages whose content has been copied and the
+    number of pages to copy. Returns the copy of page.
+    """
+    from cms.cache import deferred_invalidation
+    from cms.cache.permissions import clear_permission_cache, clear_view_restrictions_cache
+    from cms.models import Page, Title
+    from cms.models.permissionmodels import PagePermission
+    from cms.signals.title import update_descendant_paths
+    from cms.utils.page import get_available_slug
+    from menus.menu_pool import menu_pool
+
+    with deferred_invalidation():
+        page = Page.objects.get(pk=page.pk)
+        size = page.get_descendant_count() + 1
+        parent = None
+        lft, level = 1, 0
+        manager = Page._tree_manager
+        if target is None:
+            tree_id = manager._get_next_tree_id()
+        else:
+            target = Page.objects.get(pk=target.pk)
+            if target.is_root_node() and position in ('left', 'right'):
+                tree_id = target.tree_id if position == 'left' else target.tree_id + 1
+                manager._create_tree_space(tree_id - 1)
+            else:
+                if position == 'first-child':
+                    parent, space_target = target, target.lft
+                elif position == 'last-child':
+                    parent, space_target = target, target.rght - 1
+                else:
+                    parent = target.parent
+                    space_target = target.lft - 1 if position == 'left' else target.rght
+                tree_id, lft, level = target.tree_id, space_target + 1, parent.level + 1
+                manager._create_space(size * 2, space_target, tree_id)
+        rght = lft + size * 2 - 1
+
+        # making space may have moved the pages to copy
+        page = Page.objects.get(pk=page.pk)
+        pages = list(page.get_descendants(include_self=True))
+        subtree = dict(page__tree_id=page.tree_id, page__lft__gte=page.lft, page__rght__lte=page.rght)
+        titles = defaultdict(list)
+        for title in Title.objects.filter(**subtree):
+            titles[title.page_id].append(title)
+        placeholders = defaultdict(list)
+        for link in Page.placeholders.through.objects.filter(**subtree).select_related('placeholder'):
+            placeholders[link.page_id].append(link.placeholder)
+        if get_cms_setting('PERMISSION') and copy_permissions:
+            permissions = list(PagePermission.objects.filter(**subtree))
+        else:
+            permissions = []
+        site_reverse_ids = set(
+            Page.objects.filter(site=site, reverse_id__isnull=False).values_list('reverse_id', flat=True))
+
+        changed_by = _get_changed_by()
+        copies = {}
+        levels = defaultdict(list)
+        for old_page in pages:
+            new_page = _copy_fields(Page, old_page)
+            new_page.publisher_public_id = None
+            new_page.is_home = False
+            # only set reverse_id on standard copy
+            if new_page.reverse_id in site_reverse_ids:
+                new_page.reverse_id = None
+            new_page.site_id = site.pk
+            new_page.created_by = new_page.changed_by = changed_by
+            new_page.tree_id = tree_id
+            new_page.lft = old_page.lft - page.lft + lft
+            new_page.rght = old_page.rght - page.lft + lft
+            new_page.level = old_page.level - page.level + level
+            copies[old_page.pk] = new_page
+            levels[new_page.level].append((new_page, old_page))
+        # children need the pks of their parents, which are looked up by lft
+        for new_level in sorted(levels):
+            level_copies = []
+            for new_page, old_page in levels[new_level]:
+                if old_page.pk == page.pk:
+                    new_page.parent_id = parent.pk if parent else None
+                else:
+                    new_page.parent_id = copies[old_page.parent_id].pk
+                level_copies.append(new_page)
+            bulk_insert(Page, level_copies)
+            pks = dict(Page.objects.filter(
+                tree_id=tree_id, lft__gte=lft, lft__lte=rght, level=new_level).values_list('lft', 'pk'))
+            for new_page in level_copies:
+                new_page.pk = pks[new_page.lft]
+        page_copy = copies[page.pk]
+
+        new_titles = []
+        for old_page in pages:
+            for title in titles[old_page.pk]:
+                new_title = _copy_fields(Title, title)
+                new_title.page = copies[old_page.pk]
+                new_title.published = False
+                new_title.publisher_public_id = None
+                new_title.publisher_state = PUBLISHER_STATE_DIRTY
+                if old_page.pk == page.pk:
+                    # the copies below have new parents, their slugs are free
+                    new_title.slug = get_available_slug(new_title)
+                new_titles.append(new_title)
+        bulk_insert(Title, new_titles)
+        update_descendant_paths(page_copy, include_self=True)
+
+        if permissions:
+            new_permissions = []
+            for permission in permissions:
+                new_permission = _copy_fields(PagePermission, permission)
+                new_permission.page_id = copies[permission.page_id].pk
+                new_permissions.append(new_permission)
+            bulk_insert(PagePermission, new_permissions)
+            clear_permission_cache()
+            clear_view_restrictions_cache(site.pk)
+
+        # copy the placeholders (and plugins on those placeholders!) of a few
+        # pages at a time
+        done = 0
+        if progress:
+            progress(done, len(pages))
+        batch = []
+        for old_page in pages:
+            batch.append(old_page)
+            if sum(len(placeholders[batch_page.pk]) for batch_page in batch) >= BATCH_SIZE or old_page is pages[-1]:
+                _copy_placeholders([(copies[batch_page.pk], placeholders[batch_page.pk]) for batch_page in batch])
+                done += len(batch)
+                batch = []
+                if progress:
+                    progress(done, len(pages))
+
+        # invalidate the menu for this site
+        menu_pool.clear(site_id=site.pk)
+    return page_copy
+
+
+def _copy_fields(model, obj):
+    """
+    Returns a new instance of model with the field values of obj but its pk.
+    """
+    new_obj = model()
+    for field in model._meta.local_fields:
+        if not field.primary_key:
+            setattr(new_obj, field.attname, getattr(obj, field.attname))
+    return new_obj
+
+
+def _get_changed_by():
+    # like Page.save
+    from cms.utils.permissions import get_current_user
+
+    user = get_current_user()
+    if not user:
+        return "script"
+    try:
+        return str(user)
+    except AttributeError:
+        # AnonymousUser may not have USERNAME_FIELD
+        return "anonymous"
+
+
+def _copy_placeholders(pages_placeholders):
+    """
+    Copies the given placeholders with their plugins and adds the copies to
+    the pages they go with. Takes a list of (page, placeholders) pairs.
+    """
+    from cms.models import CMSPlugin, Page, Placeholder
+
+    # placeholders have nothing to find the copies by once they have been
+    # inserted, so they get unique slots until their pks are known
+    token = uuid4().hex
+    copies = []
+    for page, placeholders in pages_placeholders:
+        for placeholder in placeholders:
+            new_placeholder = Placeholder(slot='%s:%s' % (token, len(copies)), default_width=placeholder.default_width)
+            copies.append((page, placeholder, new_placeholder))
+    if not copies:
+        return
+    bulk_insert(Placeholder, [new_placeholder for page, placeholder, new_placeholder in copies])
+    pks = dict(Placeholder.objects.filter(slot__startswith=token).values_list('slot', 'pk'))
+    slots = defaultdict(list)
+    for page, placeholder, new_placeholder in copies:
+        new_placeholder.pk = pks[new_placeholder.slot]
+        new_placeholder.slot = placeholder.slot
+        slots[placeholder.slot].append(new_placeholder.pk)
+    for slot, slot_pks in slots.items():
+        Placeholder.objects.filter(pk__in=slot_pks).update(slot=slot)
+
+    through = Page.placeholders.through
+    bulk_insert(through, [through(page_id=page.pk, placeholder_id=new_placeholder.pk)
+                          for page, placeholder, new_placeholder in copies])
+    plugins = CMSPlugin.objects.filter(
+        placeholder__in=[placeholder.pk for page, placeholder, new_placeholder in copies]
+    ).order_by('tree_id', 'lft')
+    copy_placeholder_plugins(plugins, dict((placeholder.pk, new_placeholder)
+                                           for page, placeholder, new_placeholder in copies))
+
+
+def get_copy_job_cache_key(job_id):
+    return "%s:copy_page_job:%s" % (get_cms_setting('CACHE_PREFIX'), job_id)
+
+
+def get_copy_job(job_id):
+    """
+    Returns the state of the background copy job job_id: a dictionary with
+    the number of pages copied ('done'), the number of pages to copy
+    ('total'), whether the job has ended ('finished'), the pk of the copy once
+    it has ('page_id') and the error message if it failed ('error').
+    Returns None for unknown jobs.
+
+    Running jobs update their state every JOB_HEARTBEAT seconds. Jobs which
+    didn't for JOB_STALLED seconds, because the process running them ended,
+    are reported as failed.
+
+    The state is kept in the default cache, which has to be shared by all
+    processes serving the admin, or the progress of the jobs started by
+    other processes is unknown.
+    """
+    from django.core.cache import cache
+    state = cache.get(get_copy_job_cache_key(job_id))
+    if state is not None and not state['finished'] and time.time() - state['updated'] > JOB_STALLED:
+        state.update(finished=True, error=ugettext("The copy of the pages stopped unexpectedly."))
+    return state
+
+
+def _set_copy_job(job_id, **state):
+    from django.core.cache import cache
+    state['updated'] = time.time()
+    cache.set(get_copy_job_cache_key(job_id), state, JOB_TIMEOUT)
+
+
+def start_copy_job(page, target, site, position='first-child', copy_permissions=True, user=None):
+    """
+    Runs copy_pages in a background thread of this process and returns the id
+    of the job, whose progress get_copy_job reports.
+    """
+    job_id = uuid4().hex
+    total = page.get_descendant_count() + 1
+    _set_copy_job(job_id, done=0, total=total, finished=False, page_id=None, error=None)
+    thread = threading.Thread(target=_run_copy_job_thread,
+                              args=(job_id, page, target, site, position, copy_permissions, user))
+    thread.start()
+    return job_id
+
+
+def _run_copy_job(job_id, page, target, site, position, copy_permissions, user):
+    from cms.utils.permissions import set_current_user
+
+    set_current_user(user)
+    state = {'done': 0, 'total': page.get_descendant_count() + 1, 'finished': False, 'page_id': None,
+             'error': None}
+    lock = threading.Lock()
+    stopped = threading.Event()
+
+    def update(**changes):
+        with lock:
+            state.update(changes)
+            _set_copy_job(job_id, **state)
+
+    def heartbeat():
+        # tells get_copy_job the job is still running while it copies
+        # many pages at once, without reporting progress
+        stopped.wait(JOB_HEARTBEAT)
+        while not stopped.is_set():
+            update()
+            stopped.wait(JOB_HEARTBEAT)
+
+    heartbeat_thread = threading.Thread(target=heartbeat)
+    heartbeat_thread.daemon = True
+    heartbeat_thread.start()
+    try:
+        with _plugin_tree_transaction(None):
+            page_copy = copy_pages(page, target, site, position, copy_permissions,
+                                   progress=lambda done, total: update(done=done, total=total))
+    except Exception as e:
+        logger.exception("Copying page %s failed" % page.pk)
+        update(finished=True, error=force_unicode(e))
+    else:
+        total = page_copy.get_descendant_count() + 1
+        update(done=total, total=total, finished=True, page_id=page_copy.pk)
+    finally:
+        stopped.set()
+
+
+def _run_copy_job_thread(*args):
+    try:
+        _run_copy_job(*args)
+    finally:
+        # the thread has a connection of its own
+        connection.close()
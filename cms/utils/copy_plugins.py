@@ -1,38 +1,596 @@
 # -*- coding: utf-8 -*-
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import reduce
+import operator
 
+from cms.utils.compat import DJANGO_1_5
+from django.db import connections, router, transaction
+from django.db.models import AutoField, F, Max, OneToOneField, Q
+from django.db.models.deletion import Collector
+from django.utils import timezone
+
+# number of rows inserted by a single query, keeps SQLite below its limits
+BATCH_SIZE = 100
+
+_tree_id_lock = None
+_last_tree_id = None
+
+# the key of the PostgreSQL advisory lock serializing changes to plugin trees
+TREE_LOCK_KEY = 0x636d7370
 
 
 def copy_plugins_to(plugin_list, to_placeholder, to_language=None, parent_plugin_id=None):
     """
     Copies a list of plugins to a placeholder to a language.
+
+    Parents have to come before their children in the list. The first plugin
+    is copied as a root plugin, or as the first child of the plugin with the
+    pk parent_plugin_id. The tree fields of all copies are computed up front,
+    so copies are inserted in batches per tree level and plugin model instead
+    of one at a time.
+    """
+    from cms.signals.plugins import mark_placeholder_changed
+
+    plugins_ziplist = _copy_plugins(plugin_list, lambda plugin: to_placeholder, to_language, parent_plugin_id)
+    if not plugins_ziplist:
+        return plugins_ziplist
+
+    for language in set(new_plugin.language for new_plugin, old_plugin in plugins_ziplist):
+        mark_placeholder_changed(to_placeholder, language)
+    _post_copy(plugins_ziplist)
+    # returns information about originals and copies
+    return plugins_ziplist
+
+
+def copy_placeholder_plugins(plugin_list, placeholders):
     """
-    old_parent_cache = {}
+    Copies the plugins of several placeholders at once, like copy_plugins_to
+    does for one. placeholders maps the pks of the placeholders of the
+    plugins to the placeholders to copy them to, which are meant to be new:
+    they are not marked as changed.
+    """
+    plugins_ziplist = _copy_plugins(plugin_list, lambda plugin: placeholders[plugin.placeholder_id])
+    _post_copy(plugins_ziplist)
+    return plugins_ziplist
+
+
+def _copy_plugins(plugin_list, get_placeholder, to_language=None, parent_plugin_id=None):
+    from cms.models import CMSPlugin
+
     plugins_ziplist = []
-    first = True
-    for old_plugin in plugin_list:
-        if first:
-            old_plugin.parent = None
-            old_plugin.parent_id = None
-        if to_language:
-            plugin_language = to_language
+    new_plugins = {}
+    children = defaultdict(list)
+    roots = []
+    for old_plugin in _get_known_plugins(plugin_list):
+        new_plugin = CMSPlugin(
+            placeholder=get_placeholder(old_plugin),
+            language=to_language or old_plugin.language,
+            plugin_type=old_plugin.plugin_type,
+            position=old_plugin.position,
+        )
+        if plugins_ziplist and old_plugin.parent_id in new_plugins:
+            children[old_plugin.parent_id].append(old_plugin)
         else:
-            plugin_language = old_plugin.language
-            # do the simple copying
-
-        new_plugin = old_plugin.copy_plugin(to_placeholder, plugin_language, old_parent_cache)
-        if first:
-            first = False
-            if parent_plugin_id:
-                from cms.models import CMSPlugin
-                if parent_plugin_id:
-                    new_plugin.move_to(target=CMSPlugin.objects.get(pk=parent_plugin_id))
-                    new_plugin = CMSPlugin.objects.get(pk=new_plugin.pk)
+            roots.append(old_plugin)
+        new_plugins[old_plugin.pk] = new_plugin
         plugins_ziplist.append((new_plugin, old_plugin))
-        # this magic is needed for advanced plugins like Text Plugins that can have
+    if not plugins_ziplist:
+        return plugins_ziplist
+
+    using = router.db_for_write(CMSPlugin)
+    with _plugin_tree_transaction(using):
+        _lock_plugin_trees(using)
+        lookups = []
+        if parent_plugin_id:
+            target = CMSPlugin.objects.get(pk=parent_plugin_id)
+            root = roots.pop(0)
+            new_plugins[root.pk].parent = target
+            lft = target.lft + 1
+            rght = _set_tree_fields(root, new_plugins, children, target.tree_id, lft, target.level + 1)
+            # make space for the copies right after the left edge of the target
+            size = rght - lft + 1
+            CMSPlugin.objects.filter(tree_id=target.tree_id, rght__gt=target.lft).update(rght=F('rght') + size)
+            CMSPlugin.objects.filter(tree_id=target.tree_id, lft__gt=target.lft).update(lft=F('lft') + size)
+            lookups.append(Q(tree_id=target.tree_id, lft__gte=lft, lft__lte=rght))
+        if roots:
+            last_tree_id = _reserve_tree_ids(len(roots))
+            lookups.append(Q(tree_id__gt=last_tree_id, tree_id__lte=last_tree_id + len(roots)))
+            for root in roots:
+                last_tree_id += 1
+                _set_tree_fields(root, new_plugins, children, last_tree_id, 1, 0)
+        lookup = reduce(operator.or_, lookups)
+
+        _insert_plugins(plugins_ziplist, new_plugins, lookup)
+        _insert_instances(plugins_ziplist)
+    return plugins_ziplist
+
+
+def _post_copy(plugins_ziplist):
+    # this magic is needed for advanced plugins like Text Plugins that can have
     # nested plugins and need to update their content based on the new plugins.
     for new_plugin, old_plugin in plugins_ziplist:
         new_instance = new_plugin.get_plugin_instance()[0]
         if new_instance:
             new_instance.post_copy(old_plugin, plugins_ziplist)
-        # returns information about originals and copies
+
+
+def sync_plugins(plugin_list, target_plugin_list, placeholders, language, matches, set_lineage=False):
+    """
+    Makes the plugins of target_plugin_list a copy of the plugins of
+    plugin_list. Both lists hold base plugins in the given language, the
+    parents in plugin_list come before their children and target_plugin_list
+    holds all plugins of the target placeholders in the language.
+
+    Instead of deleting all target plugins and copying all plugins again, the
+    target plugins are compared to the plugins they were copied from: plugins
+    which didn't change are only moved to their new place in the tree, changed
+    plugins are updated and only new plugins are inserted. Changed plugins
+    with relations of their own are copied again.
+
+    :param placeholders: maps the pks of the placeholders of plugin_list to
+        the placeholders to copy their plugins to
+    :param matches: maps the pks of plugins to the pks of the target plugins
+        they were copied to before
+    :param set_lineage: stores the pk of the plugin each target plugin is a
+        copy of in its lineage_id
+    :returns: the list of (target plugin, plugin) pairs like copy_plugins_to
+    """
+    from cms.models import CMSPlugin
+
+    with _plugin_tree_transaction(router.db_for_write(CMSPlugin)):
+        return _sync_plugins(plugin_list, target_plugin_list, placeholders, language, matches, set_lineage)
+
+
+def _sync_plugins(plugin_list, target_plugin_list, placeholders, language, matches, set_lineage):
+    from cms.models import CMSPlugin
+    from cms.plugin_pool import plugin_pool
+    from cms.signals.plugins import mark_placeholder_changed
+
+    targets = dict((plugin.pk, plugin) for plugin in target_plugin_list)
+    plugins = list(_get_known_plugins(plugin_list))
+    new_plugins = {}
+    for plugin in plugins:
+        target = targets.get(matches.get(plugin.pk))
+        if target is not None and target.plugin_type == plugin.plugin_type:
+            new_plugins[plugin.pk] = targets.pop(target.pk)
+
+    # find out which of the plugins copied before changed since
+    updated = {}
+    plugins_by_model = defaultdict(list)
+    for plugin in plugins:
+        if plugin.pk in new_plugins:
+            model = plugin_pool.get_plugin(plugin.plugin_type).model
+            if model is not CMSPlugin:
+                plugins_by_model[model].append(plugin)
+    for model, model_plugins in plugins_by_model.items():
+        instances = _get_instances(model, model_plugins)
+        target_instances = _get_instances(model, [new_plugins[plugin.pk] for plugin in model_plugins])
+        has_relations = _has_relations(model)
+        relations = None
+        if has_relations:
+            relations = _get_relations(model, list(instances) + list(target_instances))
+        for plugin in model_plugins:
+            instance = instances.get(plugin.pk)
+            target_instance = target_instances.get(new_plugins[plugin.pk].pk)
+            if instance is None and target_instance is None:
+                continue
+            if instance is not None and target_instance is not None:
+                if not _has_changed(model, instance, target_instance, relations):
+                    continue
+                if not has_relations:
+                    updated[plugin.pk] = instance
+                    continue
+            # copy it again
+            target = new_plugins.pop(plugin.pk)
+            targets[target.pk] = target
+    old_values = dict((target.pk, _get_base_values(target)) for target in new_plugins.values())
+
+    plugins_ziplist = []
+    inserted = []
+    children = defaultdict(list)
+    roots = []
+    for plugin in plugins:
+        if plugin.pk not in new_plugins:
+            new_plugins[plugin.pk] = CMSPlugin(language=language, plugin_type=plugin.plugin_type)
+            inserted.append((new_plugins[plugin.pk], plugin))
+        if plugin.parent_id in new_plugins:
+            children[plugin.parent_id].append(plugin)
+        else:
+            roots.append(plugin)
+        plugins_ziplist.append((new_plugins[plugin.pk], plugin))
+
+    # the target trees take the shape of the source trees, roots which were
+    # roots before keep their tree
+    new_roots = []
+    for root in roots:
+        new_root = new_plugins[root.pk]
+        if new_root.pk and new_root.parent_id is None:
+            _set_tree_fields(root, new_plugins, children, new_root.tree_id, 1, 0)
+        else:
+            new_roots.append(root)
+    if new_roots:
+        _lock_plugin_trees(router.db_for_write(CMSPlugin))
+        last_tree_id = _reserve_tree_ids(len(new_roots))
+        for root in new_roots:
+            last_tree_id += 1
+            _set_tree_fields(root, new_plugins, children, last_tree_id, 1, 0)
+
+    changed_placeholders = set(target.placeholder_id for target in targets.values())
+    # the plugins whose children change, their cached output depends on them
+    changed_parents = set(target.parent_id for target in targets.values())
+    now = timezone.now()
+    for new_plugin, plugin in plugins_ziplist:
+        parent = new_plugins.get(plugin.parent_id)
+        new_plugin.placeholder = placeholders[plugin.placeholder_id]
+        # parents which are inserted below are set once they have a pk
+        new_plugin.parent_id = parent.pk if parent is not None else None
+        new_plugin.position = plugin.position
+        if set_lineage:
+            new_plugin.lineage_id = plugin.pk
+        if new_plugin.pk is None:
+            continue
+        values = _get_base_values(new_plugin)
+        if plugin.pk not in updated and values == old_values[new_plugin.pk]:
+            continue
+        values['changed_date'] = new_plugin.changed_date = now
+        _update_values(CMSPlugin, new_plugin.pk, values)
+        changed_placeholders.update((old_values[new_plugin.pk]['placeholder_id'], new_plugin.placeholder_id))
+        if values['parent_id'] != old_values[new_plugin.pk]['parent_id'] or \
+                values['position'] != old_values[new_plugin.pk]['position']:
+            changed_parents.update((old_values[new_plugin.pk]['parent_id'], values['parent_id']))
+
+    # the children of the plugins which are gone have been moved away
+    deleted = list(targets.values())
+    if deleted:
+        for target in deleted:
+            target._no_reorder = True
+        collector = Collector(using=router.db_for_write(CMSPlugin))
+        collector.collect(deleted)
+        collector.delete()
+
+    if inserted:
+        placeholder_ids = [placeholder.pk for placeholder in placeholders.values()]
+        _insert_plugins(inserted, new_plugins, Q(placeholder__in=placeholder_ids, language=language))
+        _insert_instances(inserted)
+        changed_placeholders.update(new_plugin.placeholder_id for new_plugin, plugin in inserted)
+        for new_plugin, plugin in plugins_ziplist:
+            parent = new_plugins.get(plugin.parent_id)
+            if parent is not None and new_plugin.parent_id is None:
+                new_plugin.parent = parent
+                new_plugin.changed_date = now
+                _update_values(CMSPlugin, new_plugin.pk, {'parent_id': parent.pk, 'changed_date': now})
+        changed_parents.update(new_plugin.parent_id for new_plugin, plugin in inserted)
+    changed_parents.difference_update([None] + [target.pk for target in deleted])
+    if changed_parents:
+        CMSPlugin.objects.filter(pk__in=changed_parents).update(changed_date=now)
+        for new_plugin in new_plugins.values():
+            if new_plugin.pk in changed_parents:
+                new_plugin.changed_date = now
+
+    for new_plugin, plugin in plugins_ziplist:
+        if plugin.pk in updated:
+            model = plugin_pool.get_plugin(plugin.plugin_type).model
+            new_instance = _copy_instance(model, updated[plugin.pk], new_plugin)
+            for concrete_model in _get_plugin_models(model):
+                values = dict((field.attname, getattr(new_instance, field.attname))
+                              for field in concrete_model._meta.local_fields if not field.primary_key)
+                _update_values(concrete_model, new_plugin.pk, values)
+            _set_saved(new_instance, new_plugin._state.db)
+            new_plugin._inst = new_instance
+
+    for placeholder in placeholders.values():
+        if placeholder.pk in changed_placeholders:
+            mark_placeholder_changed(placeholder, language)
+
+    # like copy_plugins_to, for the copies which changed only
+    for new_plugin, plugin in inserted + [pair for pair in plugins_ziplist if pair[1].pk in updated]:
+        new_instance = new_plugin.get_plugin_instance()[0]
+        if new_instance:
+            new_instance.post_copy(plugin, plugins_ziplist)
     return plugins_ziplist
+
+
+def share_tree_ids(lock, last_tree_id):
+    """
+    Makes processes which copy plugins at the same time reserve their plugin
+    tree ids through a multiprocessing lock and a shared integer value. The
+    database only knows a tree id once its plugins have been inserted.
+    """
+    global _tree_id_lock, _last_tree_id
+    _tree_id_lock, _last_tree_id = lock, last_tree_id
+
+
+@contextmanager
+def _plugin_tree_transaction(using):
+    """
+    Runs the block in a transaction unless it runs in one already, so the lock
+    taken by _lock_plugin_trees is held until the copies have been inserted.
+    """
+    if not DJANGO_1_5:
+        connection = transaction.get_connection(using)
+        if connection.in_atomic_block or connection.get_autocommit():
+            with transaction.atomic(using=using):
+                yield
+        else:
+            # in a transaction managed the old way, like commit_on_success
+            yield
+    elif transaction.is_managed(using=using):
+        yield
+    else:
+        with transaction.commit_on_success(using=using):
+            yield
+
+
+def _lock_plugin_trees(using):
+    """
+    Makes other processes wait with reserving plugin tree ids and copying
+    plugins into existing trees until the current transaction ends. Otherwise
+    two copies could get the same tree ids, and the pks of the copies, which
+    are looked up by tree_id and lft, could get mixed up.
+    """
+    from cms.models import CMSPlugin
+
+    connection = connections[using]
+    cursor = connection.cursor()
+    if connection.vendor == 'postgresql':
+        cursor.execute('SELECT pg_advisory_xact_lock(%s)', [TREE_LOCK_KEY])
+    elif connection.vendor == 'sqlite':
+        # any write takes the lock of the database until the transaction ends
+        table = connection.ops.quote_name(CMSPlugin._meta.db_table)
+        column = connection.ops.quote_name(CMSPlugin._meta.get_field('tree_id').column)
+        cursor.execute('UPDATE %s SET %s = %s WHERE 1 = 0' % (table, column, column))
+    else:
+        # locks the newest tree, and on MySQL the index gap after it
+        list(CMSPlugin.objects.using(using).select_for_update().order_by('-tree_id').values_list('pk', flat=True)[:1])
+
+
+def _reserve_tree_ids(count):
+    """
+    Returns the last plugin tree id in use, the count ids after it belong to
+    the caller. The caller has to hold the lock of _lock_plugin_trees.
+    """
+    from cms.models import CMSPlugin
+
+    if _tree_id_lock is None:
+        return CMSPlugin.objects.aggregate(Max('tree_id'))['tree_id__max'] or 0
+    with _tree_id_lock:
+        last_tree_id = max(_last_tree_id.value, CMSPlugin.objects.aggregate(Max('tree_id'))['tree_id__max'] or 0)
+        _last_tree_id.value = last_tree_id + count
+    return last_tree_id
+
+
+def _get_known_plugins(plugin_list):
+    """
+    Yields the plugins whose plugin type is still registered, skipping the
+    descendants of the other plugins.
+    """
+    from cms.plugin_pool import plugin_pool
+
+    skipped = set()
+    for plugin in plugin_list:
+        try:
+            plugin_pool.get_plugin(plugin.plugin_type)
+        except KeyError:  # plugin type not found anymore
+            skipped.add(plugin.pk)
+            continue
+        if plugin.parent_id in skipped:
+            skipped.add(plugin.pk)
+            continue
+        yield plugin
+
+
+def _get_base_values(plugin):
+    return dict((attname, getattr(plugin, attname)) for attname in (
+        'placeholder_id', 'parent_id', 'position', 'lineage_id', 'tree_id', 'lft', 'rght', 'level'))
+
+
+def _has_changed(model, instance, target_instance, relations=None):
+    """
+    Returns whether the plugin instance was saved after it was copied to the
+    target instance or its content differs from the content of the copy.
+    relations are the relations of both as returned by _get_relations.
+    """
+    if instance.changed_date > target_instance.changed_date:
+        return True
+    for concrete_model in _get_plugin_models(model):
+        for field in concrete_model._meta.local_fields:
+            if not field.primary_key and getattr(instance, field.attname) != getattr(target_instance, field.attname):
+                return True
+    if relations is not None and relations[instance.pk] != relations[target_instance.pk]:
+        return True
+    return False
+
+
+def _get_relations(model, pks):
+    """
+    Returns the many to many relations and the objects pointing to them with
+    a foreign key of the instances of model with the given pks, as a
+    dictionary mapping each pk to something comparable: the related objects
+    are reduced to their values, without their pks and their key pointing to
+    the instance. Takes one query per relation.
+    """
+    from cms.models import CMSPlugin
+
+    relations = dict((pk, []) for pk in pks)
+    for field in model._meta.many_to_many:
+        source_name, target_name = field.m2m_field_name(), field.m2m_reverse_field_name()
+        related = defaultdict(list)
+        for source_id, target_id in field.rel.through._default_manager.filter(
+                **{'%s__in' % source_name: pks}).values_list(source_name, target_name):
+            related[source_id].append(target_id)
+        for pk in pks:
+            relations[pk].append(sorted(related[pk]))
+    for related_object in model._meta.get_all_related_objects():
+        related_field = related_object.field
+        if related_field.rel.parent_link or issubclass(related_object.model, CMSPlugin):
+            continue
+        related = defaultdict(list)
+        for obj in related_object.model._base_manager.filter(**{'%s__in' % related_field.name: pks}):
+            values = [(field.attname, getattr(obj, field.attname)) for field in obj._meta.local_fields
+                      if not field.primary_key and field is not related_field]
+            related[getattr(obj, related_field.attname)].append(repr(values))
+        for pk in pks:
+            relations[pk].append(sorted(related[pk]))
+    return relations
+
+
+def _has_relations(model):
+    """
+    Returns whether the plugin model copies relations of its own. Those can't
+    be compared, so changed plugins of the model have to be copied again.
+    """
+    from cms.models import CMSPlugin
+
+    for name in ('copy_relations', 'copy_relations_bulk'):
+        method = getattr(model, name)
+        base_method = getattr(CMSPlugin, name)
+        if getattr(method, '__func__', method) is not getattr(base_method, '__func__', base_method):
+            return True
+    return False
+
+
+def _update_values(model, pk, values):
+    """
+    Updates the row of pk in the table of model only. Takes attnames, which
+    QuerySet.update doesn't accept for foreign keys.
+    """
+    names = dict((field.attname, field.name) for field in model._meta.fields)
+    values = dict((names[attname], value) for attname, value in values.items())
+    if values:
+        model._base_manager.filter(pk=pk).update(**values)
+
+
+def _insert_plugins(plugins_ziplist, new_plugins, lookup):
+    """
+    Inserts the base rows of the copies, which need their tree fields set.
+    Children need the pks of their parents, so the copies are inserted one
+    tree level after the other and their pks are looked up by (tree_id, lft)
+    among the plugins matching lookup.
+    """
+    from cms.models import CMSPlugin
+
+    levels = defaultdict(list)
+    for new_plugin, old_plugin in plugins_ziplist:
+        levels[new_plugin.level].append((new_plugin, old_plugin))
+    for level in sorted(levels):
+        copies = levels[level]
+        for new_plugin, old_plugin in copies:
+            if old_plugin.parent_id in new_plugins and new_plugin.parent_id is None:
+                new_plugin.parent = new_plugins[old_plugin.parent_id]
+        bulk_insert(CMSPlugin, [new_plugin for new_plugin, old_plugin in copies])
+        pks = dict(((tree_id, lft), pk) for pk, tree_id, lft in CMSPlugin.objects.filter(
+            lookup, level=level).values_list('pk', 'tree_id', 'lft'))
+        for new_plugin, old_plugin in copies:
+            new_plugin.pk = pks[(new_plugin.tree_id, new_plugin.lft)]
+
+
+def _get_instances(model, plugins):
+    """
+    Returns a dictionary mapping the pks of the given plugins to their
+    instances of model, fetching those which aren't instances already.
+    """
+    instances = model.objects.in_bulk([plugin.pk for plugin in plugins if not isinstance(plugin, model)])
+    for plugin in plugins:
+        if isinstance(plugin, model):
+            instances[plugin.pk] = plugin
+    return instances
+
+
+def _insert_instances(plugins_ziplist):
+    """
+    Inserts the rows of the plugin models of the copies, whose base rows have
+    been inserted already, and copies their relations.
+    """
+    from cms.models import CMSPlugin
+    from cms.plugin_pool import plugin_pool
+
+    plugins_by_model = defaultdict(list)
+    for new_plugin, old_plugin in plugins_ziplist:
+        model = plugin_pool.get_plugin(old_plugin.plugin_type).model
+        if model is CMSPlugin:
+            new_plugin._inst = new_plugin
+        else:
+            new_plugin._inst = None
+            plugins_by_model[model].append((new_plugin, old_plugin))
+    for model, copies in plugins_by_model.items():
+        old_instances = _get_instances(model, [old_plugin for new_plugin, old_plugin in copies])
+        instances_ziplist = []
+        for new_plugin, old_plugin in copies:
+            old_instance = old_instances.get(old_plugin.pk)
+            if old_instance is None:
+                # the plugin was never saved, copy the base plugin only
+                continue
+            new_instance = _copy_instance(model, old_instance, new_plugin)
+            new_plugin._inst = new_instance
+            instances_ziplist.append((new_instance, old_instance))
+        for concrete_model in _get_plugin_models(model):
+            bulk_insert(concrete_model, [new_instance for new_instance, old_instance in instances_ziplist])
+        model.copy_relations_bulk(instances_ziplist)
+
+
+def _set_tree_fields(old_plugin, new_plugins, children, tree_id, lft, level):
+    """
+    Sets the mptt fields of the copy of old_plugin and of the copies of its
+    descendants, returns the rght value of the copy.
+    """
+    new_plugin = new_plugins[old_plugin.pk]
+    new_plugin.tree_id = tree_id
+    new_plugin.lft = lft
+    new_plugin.level = level
+    rght = lft + 1
+    for child in children[old_plugin.pk]:
+        rght = _set_tree_fields(child, new_plugins, children, tree_id, rght, level + 1) + 1
+    new_plugin.rght = rght
+    return rght
+
+
+def _copy_instance(model, old_instance, new_plugin):
+    new_instance = model(**dict((field.attname, getattr(old_instance, field.attname)) for field in model._meta.fields))
+    new_plugin.set_base_attr(new_instance)
+    new_instance.id = new_plugin.pk
+    for field in model._meta.fields:
+        if isinstance(field, OneToOneField) and field.rel.parent_link:
+            setattr(new_instance, field.attname, new_plugin.pk)
+    return new_instance
+
+
+def _get_plugin_models(model):
+    """
+    Returns the models between CMSPlugin and the given plugin model which have
+    a table of their own, base models first.
+    """
+    from cms.models import CMSPlugin
+
+    models = []
+    while model._meta.proxy:
+        model = model._meta.proxy_for_model
+    while model is not CMSPlugin and model._meta.parents:
+        models.insert(0, model)
+        model = list(model._meta.parents)[0]
+    return models
+
+
+def bulk_insert(model, objs):
+    """
+    Inserts the rows of the table of model only, bulk_create refuses to do so
+    for models with parents and doesn't insert in batches before Django 1.5.
+    """
+    fields = [field for field in model._meta.local_fields if not isinstance(field, AutoField)]
+    using = router.db_for_write(model)
+    for start in range(0, len(objs), BATCH_SIZE):
+        model._base_manager._insert(objs[start:start + BATCH_SIZE], fields=fields, using=using)
+    if DJANGO_1_5:
+        # like Model.save does outside of managed transactions
+        transaction.commit_unless_managed(using=using)
+    for obj in objs:
+        _set_saved(obj, using)
+
+
+def _set_saved(obj, using):
+    obj._state.adding = False
+    obj._state.db = using
+    if hasattr(obj, '_mptt_meta'):
+        # the tree fields are final, mptt must not move the node on a later save
+        obj._mptt_saved = True
+        obj._mptt_meta.update_mptt_cached_fields(obj)
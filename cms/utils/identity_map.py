@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+from django.db.models import Q
+
+from cms.utils.compat.type_checks import string_types, int_types
+from cms.utils.moderator import use_draft
+
+# marks lookups which found no page
+DOES_NOT_EXIST = object()
+
+
+class PageIdentityMap(object):
+    """
+    The pages looked up by pk or reverse_id while handling a request, in the
+    version (draft or public) the request shows, each fetched once and
+    shared by every template tag asking for it.
+
+    Attached to the request by CurrentPageMiddleware, use get_identity_map
+    to get it.
+    """
+
+    def __init__(self, request):
+        self.request = request
+        # (draft, site id, pk or reverse_id) -> page, None or DOES_NOT_EXIST
+        self._pages_by_pk = {}
+        self._pages_by_reverse_id = {}
+        # pks of the pages titles were loaded for
+        self._titles_loaded = set()
+
+    def _get_current_page(self):
+        # only if it was looked up already, the lookup can be expensive
+        return getattr(self.request, '_current_page_cache', None)
+
+    def prefetch(self, lookups, site_id, titles=True):
+        """
+        Looks up the pages with the given pks (integers) and reverse_ids
+        (strings) which were not looked up yet, with one query for all pks,
+        one for all reverse_ids and, unless titles is False, one for their
+        titles. Other lookups are ignored.
+        """
+        from cms.models import Page
+        from cms.utils.page_resolver import get_page_queryset
+
+        draft = use_draft(self.request)
+        pks = set()
+        reverse_ids = set()
+        for lookup in lookups:
+            if isinstance(lookup, int_types):
+                if (draft, site_id, lookup) not in self._pages_by_pk:
+                    pks.add(lookup)
+            elif isinstance(lookup, string_types):
+                if (draft, site_id, lookup) not in self._pages_by_reverse_id:
+                    reverse_ids.add(lookup)
+        pages = []
+        if pks:
+            current_page = self._get_current_page()
+            found = {}
+            if current_page and current_page.pk in pks and current_page.publisher_is_draft == draft:
+                found[current_page.pk] = current_page
+                pks.discard(current_page.pk)
+            if pks:
+                # the draft pages with or published as the given pks
+                queryset = Page.objects.filter(Q(pk__in=pks) | Q(publisher_public__in=pks),
+                                               publisher_is_draft=True, site=site_id)
+                if not draft:
+                    queryset = queryset.select_related('publisher_public')
+                for page in queryset:
+                    target = page if draft else page.publisher_public
+                    for pk in (page.pk, page.publisher_public_id):
+                        if pk in pks:
+                            found[pk] = target
+                    if target is not None:
+                        pages.append(target)
+            for pk in pks:
+                self._pages_by_pk[(draft, site_id, pk)] = found.get(pk, DOES_NOT_EXIST)
+            for pk, page in found.items():
+                self._pages_by_pk[(draft, site_id, pk)] = page
+        if reverse_ids:
+            found = {}
+            for page in get_page_queryset(self.request).filter(reverse_id__in=reverse_ids, site=site_id):
+                found.setdefault(page.reverse_id, page)
+            for reverse_id in reverse_ids:
+                self._pages_by_reverse_id[(draft, site_id, reverse_id)] = found.get(reverse_id, DOES_NOT_EXIST)
+            pages.extend(found.values())
+        if titles:
+            self.load_titles(pages)
+
+    def _get(self, pages, lookup, site_id):
+        from cms.models import Page
+
+        key = (use_draft(self.request), site_id, lookup)
+        if key not in pages:
+            self.prefetch([lookup], site_id, titles=False)
+        page = pages[key]
+        if page is DOES_NOT_EXIST:
+            raise Page.DoesNotExist()
+        return page
+
+    def get_by_pk(self, pk, site_id):
+        """
+        Returns the page with the given pk, or the other version of it if
+        the request shows the other version, None if there is no other
+        version. Raises Page.DoesNotExist if there is no such page.
+        """
+        return self._get(self._pages_by_pk, pk, site_id)
+
+    def get_by_reverse_id(self, reverse_id, site_id):
+        """
+        Returns the page with the given reverse_id in the version the
+        request shows, raises Page.DoesNotExist if there is none.
+        """
+        return self._get(self._pages_by_reverse_id, reverse_id, site_id)
+
+    def load_titles(self, pages):
+        """
+        Loads the titles in all languages of those of the given pages this
+        was not done for yet, with one query for all of them. Titles already
+        in the title cache of a page are kept.
+        """
+        from cms.models import Title
+
+        pages = dict((page.pk, page) for page in pages if page.pk not in self._titles_loaded)
+        if not pages:
+            return
+        for page in pages.values():
+            if not hasattr(page, 'title_cache'):
+                page.title_cache = {}
+        for title in Title.objects.filter(page__in=list(pages)):
+            pages[title.page_id].title_cache.setdefault(title.language, title)
+        self._titles_loaded.update(pages)
+
+
+def get_identity_map(request):
+    """
+    Returns the page identity map of the request, attaching one if the
+    request has none (if it didn't pass through CurrentPageMiddleware).
+    """
+    identity_map = getattr(request, '_page_identity_map', None)
+    if identity_map is None:
+        identity_map = request._page_identity_map = PageIdentityMap(request)
+    return identity_map
@@ -8,15 +8,96 @@ from django.core.exceptions import ValidationError
 from django.core.urlresolvers import reverse
 from cms.utils.compat.dj import force_unicode
 from cms.utils.compat.urls import unquote
+from django.utils import timezone
 from django.utils.safestring import mark_safe
 from django.utils.translation import ugettext_lazy as _, ungettext_lazy
 
+from cms.cache.page import get_path_index_generation
 from cms.models.pagemodel import Page
+from cms.models.titlemodels import Title
 from cms.utils.urlutils import any_path_re
 
 ADMIN_PAGE_RE_PATTERN = r'cms/page/(\d+)'
 ADMIN_PAGE_RE = re.compile(ADMIN_PAGE_RE_PATTERN)
 
+# site id -> (generation, PagePathIndex), local to this process
+_path_indexes = {}
+
+
+class PagePathIndex(object):
+    """
+    The paths of all public pages of a site which have a published title,
+    mapped to the ids of their pages. Resolves paths the same way
+    ``get_page_queryset_from_path`` does for the public site, but without
+    touching the database.
+    """
+
+    def __init__(self, site_id):
+        pages = Page.objects.public().filter(site=site_id, title_set__published=True).distinct().values_list(
+            'pk', 'parent_id', 'is_home', 'publication_date', 'publication_end_date')
+        # page id -> (publication_date, publication_end_date)
+        self.dates = {}
+        self.roots = []
+        self.homes = []
+        for pk, parent_id, is_home, publication_date, publication_end_date in pages:
+            self.dates[pk] = (publication_date, publication_end_date)
+            if not parent_id:
+                self.roots.append(pk)
+            if is_home:
+                self.homes.append(pk)
+        self.paths = {}
+        titles = Title.objects.filter(page__site=site_id, page__publisher_is_draft=False).values_list(
+            'page_id', 'path')
+        for page_id, path in titles:
+            if page_id in self.dates:
+                page_ids = self.paths.setdefault(path, [])
+                if page_id not in page_ids:
+                    page_ids.append(page_id)
+
+    def is_published(self, page_id, now):
+        publication_date, publication_end_date = self.dates[page_id]
+        if publication_date and publication_date > now:
+            return False
+        return not publication_end_date or publication_end_date > now
+
+    def resolve(self, path):
+        """
+        Returns the ids of the pages currently published under the given path.
+        """
+        now = timezone.now()
+        if not any(self.is_published(pk, now) for pk in self.roots):
+            return []
+        if not path:
+            for pk in self.homes:
+                if self.is_published(pk, now):
+                    return [pk]
+        return [pk for pk in self.paths.get(path, []) if self.is_published(pk, now)]
+
+
+def get_path_index(site_id):
+    """
+    Returns the path index of the given site, rebuilding it if a page or title
+    changed since it was built. Returns None if the cache can't be used to
+    keep the indexes of all processes in sync.
+    """
+    generation = get_path_index_generation()
+    if generation is None:
+        return None
+    try:
+        index_generation, index = _path_indexes[site_id]
+    except KeyError:
+        index_generation = index = None
+    if index_generation != generation:
+        index = PagePathIndex(site_id)
+        _path_indexes[site_id] = (generation, index)
+    return index
+
+
+def get_admin_base():
+    if 'django.contrib.admin' in settings.INSTALLED_APPS:
+        return reverse('admin:index')
+    return None
+
 
 def get_page_queryset(request=None):
     if request and use_draft(request):
@@ -29,10 +110,7 @@ def get_page_queryset_from_path(path, preview=False, draft=False, site=None):
     """ Returns a queryset of pages corresponding to the path given
     In may returns None or a single page is no page is present or root path is given
     """
-    if 'django.contrib.admin' in settings.INSTALLED_APPS:
-        admin_base = reverse('admin:index')
-    else:
-        admin_base = None
+    admin_base = get_admin_base()
 
     # Check if this is called from an admin request
     if admin_base and path.startswith(admin_base):
@@ -83,6 +161,19 @@ def get_page_from_path(path, preview=False, draft=False):
     """ Resolves a url path to a single page object.
     Raises exceptions is page does not exist or multiple pages are found
     """
+    admin_base = get_admin_base()
+    if not preview and not draft and not (admin_base and path.startswith(admin_base)):
+        index = get_path_index(Site.objects.get_current().pk)
+        if index is not None:
+            page_ids = index.resolve(path)
+            if not page_ids:
+                return None
+            if len(page_ids) == 1:
+                try:
+                    return Page.objects.get(pk=page_ids[0])
+                except Page.DoesNotExist:
+                    pass
+            # let the query below deal with clashing paths and deleted pages
     page_qs = get_page_queryset_from_path(path, preview, draft)
     if page_qs is not None:
         if isinstance(page_qs, Page):
@@ -125,10 +216,7 @@ def get_page_from_request(request, use_path=None):
         path = request.path
         pages_root = unquote(reverse("pages-root"))
         # otherwise strip off the non-cms part of the URL
-        if 'django.contrib.admin' in settings.INSTALLED_APPS:
-            admin_base = reverse('admin:index')
-        else:
-            admin_base = None
+        admin_base = get_admin_base()
         if path.startswith(pages_root) and (not admin_base or not path.startswith(admin_base)):
             path = path[len(pages_root):]
             # and strip any final slash
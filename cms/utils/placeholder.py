@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 import operator
 from cms.utils import get_cms_setting
+from cms.utils.copy_plugins import copy_plugins_to
 from cms.utils.compat.type_checks import string_types
 from django.conf import settings
 from django.core.exceptions import ImproperlyConfigured
@@ -78,6 +79,19 @@ def get_placeholder_conf(setting, placeholder, template=None, default=None):
     return default
 
 
+def restore_sekizai_context(context, changes):
+    """
+    Adds the sekizai data collected while rendering cached content (see
+    sekizai.helpers.Watcher) back to the context.
+    """
+    from sekizai.helpers import get_varname
+    varname = get_varname()
+    for key, values in changes.items():
+        sekizai_namespace = context[varname][key]
+        for value in values:
+            sekizai_namespace.append(value)
+
+
 def get_page_from_placeholder_if_exists(placeholder):
     import warnings
 
@@ -121,11 +135,8 @@ class MLNGPlaceholderActions(PlaceholderNoAction):
         if not source_placeholder:
             return False
         plugins = source_placeholder.get_plugins_list()
-        cache = {}
-        new_plugins = []
-        for p in plugins:
-            new_plugins.append(p.copy_plugin(target_placeholder, target_language, cache))
-        return new_plugins
+        copied_plugins = copy_plugins_to(plugins, target_placeholder, target_language)
+        return [new_plugin for new_plugin, old_plugin in copied_plugins]
 
     def get_copy_languages(self, placeholder, model, fieldname, **kwargs):
         manager = model.objects
@@ -16,8 +16,6 @@ from django.template.loader_tags import ConstantIncludeNode, ExtendsNode, BlockN
 from django.utils.translation import ugettext as _
 from sekizai.helpers import is_variable_extend_node
 from collections import defaultdict
-from itertools import groupby
-import operator
 import warnings
 
 def get_page_from_plugin_or_404(cms_plugin):
@@ -192,45 +190,70 @@ def assign_plugins(request, placeholders, template, lang=None, no_fallback=False
     Fetch all plugins for the given ``placeholders`` and
     cast them down to the concrete instances in one query
     per type.
+
+    Placeholders without plugins in ``lang`` which have language fallback
+    enabled get the plugins of their first fallback language which has any,
+    looked up in a single query for all of them.
     """
     placeholders = list(placeholders)
     if not placeholders:
         return
     lang = lang or get_language_from_request(request)
-    request_lang = lang
-    qs = get_cmsplugin_queryset(request).filter(placeholder__in=placeholders, language=request_lang).order_by(
+    qs = get_cmsplugin_queryset(request).filter(placeholder__in=placeholders, language=lang).order_by(
         'placeholder', 'tree_id', 'level', 'position')
     plugins = list(qs)
+    count_plugin_queries(request)
     # If no plugin is present in the current placeholder we loop in the fallback languages
     # and get the first available set of plugins
-
     if not no_fallback:
-        for placeholder in placeholders:
-            found = False
-            for plugin in plugins:
-                if plugin.placeholder_id == placeholder.pk:
-                    found = True
-                    break
-            if found:
-                continue
-            elif placeholder and get_placeholder_conf("language_fallback", placeholder.slot, template, False):
-                fallbacks = get_fallback_languages(lang)
-                for fallback_language in fallbacks:
-                    assign_plugins(request, [placeholder], template, fallback_language, no_fallback=True)
-                    plugins = placeholder._plugins_cache
-                    if plugins:
-                        break
+        plugins += get_fallback_plugins(request, placeholders, plugins, template, lang)
     # If no plugin is present, create default plugins if enabled)
     if not plugins:
         plugins = create_default_plugins(request, placeholders, template, lang)
     plugin_list = downcast_plugins(plugins, placeholders)
+    count_plugin_queries(request, len(set(plugin.plugin_type for plugin in plugins)))
     # split the plugins up by placeholder
-    groups = dict((key, list(plugins)) for key, plugins in groupby(plugin_list, operator.attrgetter('placeholder_id')))
-
-    for group in groups:
-        groups[group] = build_plugin_tree(groups[group])
+    groups = defaultdict(list)
+    for plugin in plugin_list:
+        groups[plugin.placeholder_id].append(plugin)
     for placeholder in placeholders:
-        setattr(placeholder, '_plugins_cache', list(groups.get(placeholder.pk, [])))
+        setattr(placeholder, '_plugins_cache', build_plugin_tree(groups.get(placeholder.pk, [])))
+
+
+def get_fallback_plugins(request, placeholders, plugins, template, lang):
+    """
+    Returns the plugins of the first fallback language that has any for each
+    of the ``placeholders`` not found in ``plugins`` which allow language
+    fallback.
+    """
+    found = set(plugin.placeholder_id for plugin in plugins)
+    missing = [placeholder for placeholder in placeholders if placeholder.pk not in found and
+               get_placeholder_conf("language_fallback", placeholder.slot, template, False)]
+    fallbacks = get_fallback_languages(lang)
+    if not missing or not fallbacks:
+        return []
+    qs = get_cmsplugin_queryset(request).filter(placeholder__in=missing, language__in=fallbacks).order_by(
+        'placeholder', 'tree_id', 'level', 'position')
+    count_plugin_queries(request)
+    by_language = defaultdict(list)
+    for plugin in qs:
+        by_language[(plugin.placeholder_id, plugin.language)].append(plugin)
+    fallback_plugins = []
+    for placeholder in missing:
+        for fallback_language in fallbacks:
+            if (placeholder.pk, fallback_language) in by_language:
+                fallback_plugins += by_language[(placeholder.pk, fallback_language)]
+                break
+    return fallback_plugins
+
+
+def count_plugin_queries(request, count=1):
+    """
+    Keeps track of the number of queries issued to fetch plugins while
+    processing ``request``. The toolbar displays the total.
+    """
+    if request is not None:
+        request.plugin_query_count = getattr(request, 'plugin_query_count', 0) + count
 
 
 def create_default_plugins(request, placeholders, template, lang):
@@ -303,6 +326,7 @@ def build_plugin_tree(plugin_list):
 def downcast_plugins(queryset, placeholders=None, select_placeholder=False):
     plugin_types_map = defaultdict(list)
     plugin_lookup = {}
+    placeholder_lookup = dict((pl.pk, pl) for pl in placeholders or [])
 
     # make a map of plugin types, needed later for downcasting
     for plugin in queryset:
@@ -319,12 +343,11 @@ def downcast_plugins(queryset, placeholders=None, select_placeholder=False):
         for instance in plugin_qs:
             plugin_lookup[instance.pk] = instance
             # cache the placeholder
-            if placeholders:
-                for pl in placeholders:
-                    if instance.placeholder_id == pl.pk:
-                        instance.placeholder = pl
-                        if not cls.cache:
-                            pl.cache_placeholder = False
+            pl = placeholder_lookup.get(instance.placeholder_id)
+            if pl is not None:
+                instance.placeholder = pl
+                if not cls.cache:
+                    pl.cache_placeholder = False
             # make the equivalent list of qs, but with downcasted instances
     plugin_list = []
     for p in queryset:
@@ -374,3 +397,39 @@ def has_reached_plugin_limit(placeholder, plugin_type, language, template=None):
                     "This placeholder already has the maximum number (%(limit)s) of allowed %(plugin_name)s plugins.") \
                                          % {'limit': type_limit, 'plugin_name': plugin_name})
     return False
+
+
+def update_plugin_positions(positions, changed_date=None):
+    """
+    Writes the given {plugin id: position} dictionary with one UPDATE,
+    without saving the plugins or sending signals. The plugins also get
+    changed_date if given.
+    """
+    from django.db import connections, router, transaction
+    from cms.models import CMSPlugin
+    from cms.utils.compat import DJANGO_1_5
+
+    if not positions:
+        return
+    using = router.db_for_write(CMSPlugin)
+    connection = connections[using]
+    table = connection.ops.quote_name(CMSPlugin._meta.db_table)
+    column = connection.ops.quote_name(CMSPlugin._meta.get_field('position').column)
+    pk_column = connection.ops.quote_name(CMSPlugin._meta.pk.column)
+    params = []
+    for pk, position in positions.items():
+        params.extend([pk, position])
+    changed_date_column = ''
+    if changed_date is not None:
+        changed_date_field = CMSPlugin._meta.get_field('changed_date')
+        changed_date_column = ', %s = %%s' % connection.ops.quote_name(changed_date_field.column)
+        params.append(changed_date_field.get_db_prep_save(changed_date, connection=connection))
+    params.extend(positions.keys())
+    cursor = connection.cursor()
+    cursor.execute("UPDATE %s SET %s = CASE %s %s END%s WHERE %s IN (%s)" % (
+        table, column, pk_column, " ".join(["WHEN %s THEN %s"] * len(positions)), changed_date_column,
+        pk_column, ", ".join(["%s"] * len(positions))
+    ), params)
+    if DJANGO_1_5:
+        # like QuerySet.update does outside of managed transactions
+        transaction.commit_unless_managed(using=using)
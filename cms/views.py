@@ -1,12 +1,15 @@
 # -*- coding: utf-8 -*-
 from __future__ import with_statement
 import hashlib
+import time
 
 from django.utils.encoding import iri_to_uri, force_text
 from django.contrib.auth.views import redirect_to_login
 from django.template.response import TemplateResponse
 from cms.apphook_pool import apphook_pool
 from cms.appresolver import get_app_urls
+from cms.cache import get_deferred_invalidations
+from cms.cache.page import get_tag_versions, get_response_tags, incr_page_cache_stat
 from cms.models import Title, Page
 from cms.utils import get_template_from_request, get_language_from_request, get_cms_setting
 from cms.utils.i18n import get_fallback_languages, force_language, get_public_languages, get_redirect_on_fallback, \
@@ -35,8 +38,6 @@ def details(request, slug):
     The main view of the Django-CMS! Takes a request and a slug, renders the
     page.
     """
-    from django.core.cache import cache
-
     if get_cms_setting("PAGE_CACHE") and (
         not hasattr(request, 'toolbar') or (
             not request.toolbar.edit_mode and
@@ -44,14 +45,8 @@ def details(request, slug):
             not request.user.is_authenticated()
         )
     ):
-        cache_content = cache.get(
-            _get_cache_key(request),
-            version=_get_cache_version()
-        )
-        if not cache_content is None:
-            content, headers = cache_content
-            response = HttpResponse(content)
-            response._headers = headers
+        response = _get_cached_response(request)
+        if response is not None:
             return response
 
     # get the right model
@@ -199,6 +194,62 @@ def details(request, slug):
     return response
 
 
+def _get_cached_response(request):
+    """
+    Returns the cached response for this request, or None if the page has to
+    be rendered.
+
+    Only one process regenerates an expired or invalidated page, it holds a
+    lock for at most CMS_PAGE_CACHE_GRACE seconds. While the lock is held
+    all other processes get the previous version of the page.
+    """
+    from django.core.cache import cache
+
+    cache_key = _get_cache_key(request)
+    version = _get_cache_version()
+    grace = get_cms_setting('PAGE_CACHE_GRACE')
+    stale = None
+    cache_content = _check_cache_content(cache.get(cache_key, version=version))
+    if not cache_content is None:
+        content, headers, tag_versions, expires = cache_content
+        # the entry is only valid until it expires or anything it depends on
+        # gets invalidated
+        if expires > time.time() and get_tag_versions(tag_versions) == tag_versions:
+            incr_page_cache_stat('hit')
+            return _build_cached_response(content, headers)
+        stale = cache_content
+    elif version > 1:
+        # the whole page cache was just invalidated
+        stale = _check_cache_content(cache.get(cache_key, version=version - 1))
+    if not stale is None and grace:
+        lock_key = '%s:lock' % cache_key
+        if not cache.add(lock_key, 1, grace):
+            # somebody else is rendering this page already
+            incr_page_cache_stat('stale')
+            content, headers, tag_versions, expires = stale
+            return _build_cached_response(content, headers)
+        request._page_cache_lock = lock_key
+    incr_page_cache_stat('miss')
+    return None
+
+
+def _check_cache_content(cache_content):
+    """
+    Returns the cached entry if it is in the format _cache_page stores,
+    None otherwise. Entries stored by earlier versions (content and headers
+    only, or without the expiry time) are treated as a miss.
+    """
+    if not isinstance(cache_content, tuple) or len(cache_content) != 4:
+        return None
+    return cache_content
+
+
+def _build_cached_response(content, headers):
+    response = HttpResponse(content)
+    response._headers = headers
+    return response
+
+
 def _cache_page(response):
     from django.core.cache import cache
 
@@ -221,11 +272,14 @@ def _cache_page(response):
     if save_cache:
         version = _get_cache_version()
         ttl = get_cms_setting('CACHE_DURATIONS')['content']
+        tag_versions = get_tag_versions(get_response_tags(request, response.context_data.get('current_page')))
 
+        # keep the entry around for the grace period, so it can be served
+        # while a fresh version is rendered
         cache.set(
             _get_cache_key(request),
-            (response.content, response._headers),
-            ttl,
+            (response.content, response._headers, tag_versions, time.time() + ttl),
+            ttl + get_cms_setting('PAGE_CACHE_GRACE'),
             version=version
         )
         # See note in invalidate_cms_page_cache()
@@ -234,7 +288,9 @@ def _cache_page(response):
             version,
             ttl
         )
-    
+    if hasattr(request, '_page_cache_lock'):
+        cache.delete(request._page_cache_lock)
+
 
 def _get_cache_key(request):
     #md5 key of current path
@@ -277,6 +333,10 @@ def invalidate_cms_page_cache():
 
     '''
     Invalidates the CMS PAGE CACHE.
+
+    Only use this for changes which may affect every page (menus, urls), see
+    cms.cache.page.invalidate_tags for invalidating the pages depending on a
+    single page, placeholder, static placeholder or apphook.
     '''
 
     #
@@ -306,6 +366,10 @@ def invalidate_cms_page_cache():
     # will have also expired, so, it'd be pointless to try to access them
     # anyway.
     #
+    deferred = get_deferred_invalidations()
+    if deferred is not None:
+        deferred['page_cache'] = True
+        return
     try:
         cache.incr(CMS_PAGE_CACHE_VERSION_KEY)
     except ValueError:
@@ -26,6 +26,7 @@ used to change the user model in the same manner as the --user option.
 Usage:
     develop.py test [--parallel | --failfast] [--migrate] [--user=<user>] [<test-label>...] [--xvfb]
     develop.py timed test [test-label...] [--xvfb]
+    develop.py benchmark [<benchmark>...]
     develop.py isolated test [<test-label>...] [--parallel] [--migrate] [--xvfb]
     develop.py server [--port=<port>] [--bind=<bind>] [--migrate] [--user=<user>]
     develop.py shell
@@ -144,6 +145,16 @@ def test(test_labels, parallel=False, failfast=False):
     else:
         return _test_run_worker(test_labels, failfast)
 
+def benchmark(names):
+    from cms.test_utils import benchmarks
+    available = sorted(name[len('benchmark_'):] for name in dir(benchmarks) if name.startswith('benchmark_'))
+    for name in names or available:
+        if name not in available:
+            print("Unknown benchmark %r, available are: %s" % (name, ', '.join(available)))
+            return 1
+        getattr(benchmarks, 'benchmark_%s' % name)()
+    return 0
+
 def compilemessages():
     from django.core.management import call_command
     os.chdir('cms')
@@ -166,7 +177,7 @@ if __name__ == '__main__':
         'error', r"DateTimeField received a naive datetime",
         RuntimeWarning, r'django\.db\.models\.fields')
 
-    default_name = ':memory:' if args['test'] else 'local.sqlite'
+    default_name = ':memory:' if args['test'] or args['benchmark'] else 'local.sqlite'
 
     db_url = os.environ.get("DATABASE_URL", "sqlite://localhost/%s" % default_name)
     migrate = args.get('--migrate', False)
@@ -237,6 +248,8 @@ if __name__ == '__main__':
                     else:
                         num_failures = test(args['<test-label>'], args['--parallel'], args['--failfast'])
                     sys.exit(num_failures)
+            elif args['benchmark']:
+                sys.exit(benchmark(args['<benchmark>']))
             elif args['server']:
                 server(args['--bind'], args['--port'], migrate)
             elif args['shell']:
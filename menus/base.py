@@ -15,6 +15,19 @@ class Menu(object):
         should return a list of NavigationNode instances
         """ 
         raise NotImplementedError
+
+    def get_cache_vary(self, request):
+        """
+        The nodes of all menus are cached together per site and language,
+        and shared by all requests for which every menu returns the same
+        string here. By default the nodes are cached per authenticated user,
+        menus returning the same nodes for all users return an empty string
+        to share them.
+        """
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated():
+            return 'user:%s' % user.pk
+        return ''
     
 class Modifier(object):
     
@@ -64,3 +77,75 @@ class NavigationNode(object):
             nodes.append(self.parent)
             nodes += self.parent.get_ancestors()
         return nodes
+
+
+class NodeTree(object):
+    """
+    Compact representation of a built menu as it is stored in the cache.
+
+    Nodes are kept as a flat list of their attributes, the tree structure as
+    parent and child index arrays, so the structure can be pickled without
+    recursing through the tree. Fresh NavigationNode instances are created
+    for every request by get_nodes, the selected node being found through an
+    index on the node urls.
+    """
+    __slots__ = ('classes', 'states', 'parents', 'children', 'urls')
+
+    def __init__(self, nodes):
+        indexes = dict((id(node), index) for index, node in enumerate(nodes))
+        self.classes = []
+        self.states = []
+        self.parents = []
+        self.children = []
+        self.urls = {}
+        for index, node in enumerate(nodes):
+            state = node.__dict__.copy()
+            state.pop('parent', None)
+            state.pop('children', None)
+            state.update(selected=False, sibling=False, ancestor=False, descendant=False)
+            self.classes.append(node.__class__)
+            self.states.append(state)
+            if node.parent is None:
+                self.parents.append(None)
+            else:
+                self.parents.append(indexes[id(node.parent)])
+            self.children.append([indexes[id(child)] for child in node.children])
+            url = node.get_absolute_url()
+            if url is not None and url not in self.urls:
+                self.urls[url] = index
+
+    def __len__(self):
+        return len(self.states)
+
+    def get_selected(self, path):
+        """
+        Returns the index of the node with the longest url the path starts
+        with, or None.
+        """
+        for length in range(len(path), -1, -1):
+            index = self.urls.get(path[:length])
+            if index is not None:
+                return index
+        return None
+
+    def get_nodes(self, selected=None):
+        """
+        Returns a new list of NavigationNode instances, with the node at the
+        index ``selected`` marked as selected.
+        """
+        nodes = []
+        for cls, state in zip(self.classes, self.states):
+            node = cls.__new__(cls)
+            node.__dict__.update(state)
+            if 'attr' in state:
+                node.attr = dict(state['attr'])
+            nodes.append(node)
+        for node, parent, children in zip(nodes, self.parents, self.children):
+            if parent is None:
+                node.parent = None
+            else:
+                node.parent = nodes[parent]
+            node.children = [nodes[child] for child in children]
+        if selected is not None:
+            nodes[selected].selected = True
+        return nodes
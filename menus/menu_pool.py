@@ -1,18 +1,23 @@
 # -*- coding: utf-8 -*-
+from collections import defaultdict
+import hashlib
+import time
 from logging import getLogger
+from cms.cache import get_deferred_invalidations
 from cms.utils import get_cms_setting
-from cms.utils.django_load import load
+from cms.utils.compat.dj import force_unicode
+from cms.utils.django_load import load, load_object
 
 from django.conf import settings
 from django.contrib.sites.models import Site
 from django.core.cache import cache
 from django.core.urlresolvers import NoReverseMatch
 from django.utils.translation import get_language
+from menus.base import NodeTree
 from menus.exceptions import NamespaceAllreadyRegistered
 from menus.models import CacheKey
 from django.utils.translation import ugettext_lazy as _
 from django.contrib import messages
-import copy
 
 logger = getLogger('menus')
 
@@ -20,61 +25,137 @@ def _build_nodes_inner_for_one_menu(nodes, menu_class_name):
     '''
     This is an easier to test "inner loop" building the menu tree structure
     for one menu (one language, one site) 
+
+    Nodes are keyed on (namespace, id). A node whose parent was not seen yet
+    waits for it; when the parent gets added, the nodes waiting for it are
+    added right after it. Nodes whose parent never shows up (including
+    nodes in a parent cycle) are dropped. Every node is visited a constant
+    number of times, whatever the order of the nodes.
     '''
-    done_nodes = {} # Dict of node.id:Node
+    done_nodes = {} # Dict of (node.namespace, node.id):Node
+    waiting_nodes = defaultdict(list) # Dict of (node.namespace, node.parent_id):[Node, ...]
     final_nodes = []
-    
-    # This is to prevent infinite loops - we need to compare the number of 
-    # times we see a specific node to "something", and for the time being, 
-    # it's the total number of nodes
-    list_total_length = len(nodes)
-    
-    while nodes:
-        # For when the node has a parent_id but we haven't seen it yet. 
-        # We must not append it to the final list in this case!
-        should_add_to_final_list = True 
-        
-        node = nodes.pop(0)
-        
-        # Increment the "seen" counter for this specific node.
-        node._counter = getattr(node,'_counter',0) + 1  
-        
+
+    for node in nodes:
         # Implicit namespacing by menu.__name__
         if not node.namespace:
             node.namespace = menu_class_name
-        if node.namespace not in done_nodes:
-            # We need to create the namespace dict to avoid KeyErrors
-            done_nodes[node.namespace] = {} 
-        
-        # If we have seen the parent_id already...
-        if node.parent_id in done_nodes[node.namespace] :
-            # Implicit parent namespace by menu.__name__
-            if not node.parent_namespace:
-                node.parent_namespace = menu_class_name
-            parent = done_nodes[node.namespace][node.parent_id]
-            parent.children.append(node)
-            node.parent = parent
-        # If it has a parent_id but we haven't seen it yet...
-        elif node.parent_id:
-            # We check for infinite loops here, by comparing the number of 
-            # times we "saw" this node to the number of nodes in the list
-            if node._counter < list_total_length:
-                nodes.append(node)
-            # Never add this node to the final list until it has a real 
-            # parent (node.parent)
-            should_add_to_final_list = False
-            
-        if should_add_to_final_list:
+        # If it has a parent_id but we haven't seen it yet, wait for it.
+        # Never add this node to the final list until it has a real parent
+        # (node.parent)
+        if (node.namespace, node.parent_id) not in done_nodes and node.parent_id:
+            waiting_nodes[(node.namespace, node.parent_id)].append(node)
+            continue
+        # Add the node followed by all the nodes waiting for it (depth
+        # first, without recursion as trees can be deep)
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            # If we have seen the parent_id already...
+            if (node.namespace, node.parent_id) in done_nodes:
+                # Implicit parent namespace by menu.__name__
+                if not node.parent_namespace:
+                    node.parent_namespace = menu_class_name
+                parent = done_nodes[(node.namespace, node.parent_id)]
+                parent.children.append(node)
+                node.parent = parent
             final_nodes.append(node)
             # add it to the "seen" list
-            done_nodes[node.namespace][node.id] = node
+            done_nodes[(node.namespace, node.id)] = node
+            stack.extend(reversed(waiting_nodes.pop((node.namespace, node.id), [])))
     return final_nodes
 
+class CacheKeyRegistry(object):
+    """
+    Keeps track of the cache keys of the built menus, so they can be
+    invalidated per site and language. The registry in use is configured
+    with the CMS_MENU_CACHE_KEY_REGISTRY setting.
+    """
+    def get_key(self, key, site_id, language):
+        """
+        Returns the cache key the menu known as ``key`` is stored under.
+        """
+        return key
+
+    def add(self, key, site_id, language):
+        """
+        Called after a menu was stored in the cache under ``key``.
+        """
+        pass
+
+    def clear(self, site_id=None, language=None):
+        """
+        Invalidates the menus of the given site and language, of all sites
+        and languages if both are None.
+        """
+        raise NotImplementedError
+
+
+class DatabaseCacheKeyRegistry(CacheKeyRegistry):
+    """
+    Shares the cache keys of the menus between processes through the
+    database.
+    """
+    def add(self, key, site_id, language):
+        CacheKey.objects.get_or_create(key=key, language=language, site=site_id)
+
+    def clear(self, site_id=None, language=None):
+        cache_keys = CacheKey.objects.get_keys(site_id, language)
+        to_be_deleted = cache_keys.distinct().values_list('key', flat=True)
+        cache.delete_many(to_be_deleted)
+        cache_keys.delete()
+
+
+class GenerationCacheKeyRegistry(CacheKeyRegistry):
+    """
+    Versions the cache keys of the menus with generations stored in the
+    cache: one for all menus, one per site, one per language and one per
+    site and language. Clearing menus replaces a generation, the outdated
+    menus are never read again and expire. No database access involved.
+    """
+    def get_generation_key(self, site_id=None, language=None):
+        prefix = "%s:menu_generation" % get_cms_setting('CACHE_PREFIX')
+        if site_id and language:
+            return "%s:%s:%s" % (prefix, site_id, language)
+        elif site_id:
+            return "%s:site:%s" % (prefix, site_id)
+        elif language:
+            return "%s:language:%s" % (prefix, language)
+        return prefix
+
+    def get_key(self, key, site_id, language):
+        generation_keys = [
+            self.get_generation_key(),
+            self.get_generation_key(site_id=site_id),
+            self.get_generation_key(language=language),
+            self.get_generation_key(site_id, language),
+        ]
+        generations = cache.get_many(generation_keys)
+        missing = dict((generation_key, _new_generation()) for generation_key in generation_keys
+                       if generation_key not in generations)
+        if missing:
+            cache.set_many(missing, get_cms_setting('CACHE_DURATIONS')['menus'])
+            generations.update(missing)
+        return "%s_%s" % (key, '.'.join(str(generations[generation_key]) for generation_key in generation_keys))
+
+    def clear(self, site_id=None, language=None):
+        cache.set(self.get_generation_key(site_id, language), _new_generation(),
+                  get_cms_setting('CACHE_DURATIONS')['menus'])
+
+
+def _new_generation():
+    # Not a counter: if a generation gets evicted it must never come back with
+    # a value menus were stored under before.
+    return int(time.time() * 1000000)
+
+
 class MenuPool(object):
     def __init__(self):
         self.menus = {}
         self.modifiers = []
         self.discovered = False
+        self._registry = None
+        self._registry_path = None
         
     def discover_menus(self):
         if self.discovered:
@@ -88,13 +169,21 @@ class MenuPool(object):
         '''
         This invalidates the cache for a given menu (site_id and language)
         '''
+        deferred = get_deferred_invalidations()
+        if deferred is not None:
+            deferred['menus'].add((None, None) if all else (site_id, language))
+            return
         if all:
-            cache_keys = CacheKey.objects.get_keys()
+            self.get_cache_key_registry().clear()
         else:
-            cache_keys = CacheKey.objects.get_keys(site_id, language)        
-        to_be_deleted = cache_keys.distinct().values_list('key', flat=True)
-        cache.delete_many(to_be_deleted)
-        cache_keys.delete()
+            self.get_cache_key_registry().clear(site_id, language)
+
+    def get_cache_key_registry(self):
+        path = get_cms_setting('MENU_CACHE_KEY_REGISTRY')
+        if path != self._registry_path:
+            self._registry = load_object(path)()
+            self._registry_path = path
+        return self._registry
     
     def register_menu(self, menu):
         from menus.base import Menu
@@ -113,7 +202,7 @@ class MenuPool(object):
     def _build_nodes(self, request, site_id):
         """
         This is slow. Caching must be used. 
-        One menu is built per language and per site.
+        One menu is built per language and per site, and cached as a NodeTree.
         
         Namespaces: they are ID prefixes to avoid node ID clashes when plugging
         multiple trees together.
@@ -130,12 +219,12 @@ class MenuPool(object):
         # Cache key management
         lang = get_language()
         prefix = getattr(settings, "CMS_CACHE_PREFIX", "menu_cache_")
-        key = "%smenu_nodes_%s_%s" % (prefix, lang, site_id)
-        if request.user.is_authenticated():
-            key += "_%s_user" % request.user.pk
-        cached_nodes = cache.get(key, None)
-        if cached_nodes:
-            return cached_nodes
+        registry = self.get_cache_key_registry()
+        key = registry.get_key("%smenu_tree_%s_%s_%s" % (prefix, lang, site_id, self._get_cache_vary(request)),
+                               site_id, lang)
+        cached_tree = cache.get(key, None)
+        if cached_tree is not None:
+            return cached_tree
         
         final_nodes = []
         for menu_class_name in self.menus:
@@ -151,18 +240,28 @@ class MenuPool(object):
                     logger.error("Menu %s could not be loaded." % menu_class_name, exc_info=True)
             # nodes is a list of navigation nodes (page tree in cms + others)
             final_nodes += _build_nodes_inner_for_one_menu(nodes, menu_class_name)
-        cache.set(key, final_nodes, get_cms_setting('CACHE_DURATIONS')['menus'])
-        # We need to have a list of the cache keys for languages and sites that
-        # span several processes - so we follow the Django way and share through 
-        # the database. It's still cheaper than recomputing every time!
-        # This way we can selectively invalidate per-site and per-language, 
-        # since the cache shared but the keys aren't 
-        CacheKey.objects.get_or_create(key=key, language=lang, site=site_id)
-        return final_nodes
+        tree = NodeTree(final_nodes)
+        cache.set(key, tree, get_cms_setting('CACHE_DURATIONS')['menus'])
+        # The registry allows to selectively invalidate per-site and
+        # per-language, in all processes sharing the cache
+        registry.add(key, site_id, lang)
+        return tree
+
+    def _get_cache_vary(self, request):
+        """
+        Hashes what the menus vary on, so requests for which all menus
+        return the same nodes (e.g. users with the same permissions) share
+        the cached nodes.
+        """
+        vary = [self.menus[name].get_cache_vary(request) for name in sorted(self.menus)]
+        return hashlib.md5(force_unicode('\n'.join(vary)).encode('utf-8')).hexdigest()
 
     def apply_modifiers(self, nodes, request, namespace=None, root_id=None, post_cut=False, breadcrumb=False):
         if not post_cut:
             nodes = self._mark_selected(request, nodes)
+        return self._modify(nodes, request, namespace, root_id, post_cut, breadcrumb)
+
+    def _modify(self, nodes, request, namespace, root_id, post_cut, breadcrumb):
         for cls in self.modifiers:
             inst = cls()
             nodes = inst.modify(request, nodes, namespace, root_id, post_cut, breadcrumb)
@@ -172,9 +271,11 @@ class MenuPool(object):
         self.discover_menus()
         if not site_id:
             site_id = Site.objects.get_current().pk
-        nodes = self._build_nodes(request, site_id)
-        nodes = copy.deepcopy(nodes)
-        nodes = self.apply_modifiers(nodes, request, namespace, root_id, post_cut=False, breadcrumb=breadcrumb)
+        tree = self._build_nodes(request, site_id)
+        # the nodes are created from the cached tree for every call, with the
+        # selected node looked up in its url index instead of scanning them
+        nodes = tree.get_nodes(selected=tree.get_selected(request.path))
+        nodes = self._modify(nodes, request, namespace, root_id, post_cut=False, breadcrumb=breadcrumb)
         return nodes 
 
     def _mark_selected(self, request, nodes):
@@ -2,6 +2,7 @@
 from __future__ import with_statement
 from cms.utils import get_language_from_request
 from cms.utils.i18n import force_language, hide_untranslated
+from cms.utils.identity_map import get_identity_map
 from django.conf import settings
 import warnings
 from cms.models.titlemodels import Title
@@ -95,6 +96,8 @@ class DefaultLanguageChanger(object):
     def get_page_path(self, lang):
         page = getattr(self.request, 'current_page', None)
         if page:
+            # the titles in all languages, with one query
+            get_identity_map(self.request).load_titles([page])
             with force_language(lang):
                 try:
                     return page.get_absolute_url(language=lang, fallback=False)